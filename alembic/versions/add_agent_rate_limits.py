@@ -0,0 +1,25 @@
+"""add agent rate limits
+
+Revision ID: add_agent_rate_limits
+Revises: add_execution_batches
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_agent_rate_limits'
+down_revision = 'add_execution_batches'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('agents', sa.Column('llm_requests_per_minute', sa.Integer(), nullable=True))
+    op.add_column('agents', sa.Column('llm_tokens_per_minute', sa.Integer(), nullable=True))
+    op.add_column('agents', sa.Column('llm_max_concurrency', sa.Integer(), nullable=True))
+
+def downgrade():
+    op.drop_column('agents', 'llm_max_concurrency')
+    op.drop_column('agents', 'llm_tokens_per_minute')
+    op.drop_column('agents', 'llm_requests_per_minute')
@@ -0,0 +1,21 @@
+"""add agent tool output budget
+
+Revision ID: add_agent_tool_output_budget
+Revises: add_execution_queue
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_agent_tool_output_budget'
+down_revision = 'add_execution_queue'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('agents', sa.Column('tool_output_tokens', sa.Integer(), nullable=True))
+
+def downgrade():
+    op.drop_column('agents', 'tool_output_tokens')
@@ -0,0 +1,42 @@
+"""add execution batches
+
+Revision ID: add_execution_batches
+Revises: add_execution_rollups
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_execution_batches'
+down_revision = 'add_execution_rollups'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'execution_batches',
+        sa.Column('id', sa.String(), primary_key=True),
+        sa.Column('crew_id', sa.Integer(), sa.ForeignKey('crews.id')),
+        sa.Column('status', sa.String()),
+        sa.Column('total_items', sa.Integer(), default=0),
+        sa.Column('completed_items', sa.Integer(), default=0),
+        sa.Column('failed_items', sa.Integer(), default=0),
+        sa.Column('concurrency', sa.Integer(), default=4),
+        sa.Column('max_retries', sa.Integer(), default=1),
+        sa.Column('allowed_tools', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+    )
+    # SQLite cannot add a foreign key to an existing table, batch mode rebuilds the table there
+    with op.batch_alter_table('executions') as batch_op:
+        batch_op.add_column(sa.Column('batch_id', sa.String(), sa.ForeignKey('execution_batches.id', name='fk_executions_batch_id'), nullable=True))
+    op.add_column('executions', sa.Column('attempts', sa.Integer(), nullable=True))
+    op.create_index('ix_executions_batch_id', 'executions', ['batch_id'])
+
+def downgrade():
+    op.drop_index('ix_executions_batch_id', table_name='executions')
+    op.drop_column('executions', 'attempts')
+    op.drop_column('executions', 'batch_id')
+    op.drop_table('execution_batches')
@@ -0,0 +1,31 @@
+"""add execution budgets, heartbeats and cancellation
+
+Revision ID: add_execution_budgets
+Revises: add_execution_task_outputs
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_execution_budgets'
+down_revision = 'add_execution_task_outputs'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('crews', sa.Column('max_duration_seconds', sa.Integer(), nullable=True))
+    op.add_column('crews', sa.Column('max_tokens', sa.Integer(), nullable=True))
+    op.add_column('executions', sa.Column('worker_id', sa.String(), nullable=True))
+    op.add_column('executions', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+    op.add_column('executions', sa.Column('cancel_requested', sa.Boolean(), nullable=True, server_default=sa.false()))
+    op.create_index('ix_executions_status_heartbeat_at', 'executions', ['status', 'heartbeat_at'])
+
+def downgrade():
+    op.drop_index('ix_executions_status_heartbeat_at', table_name='executions')
+    op.drop_column('executions', 'cancel_requested')
+    op.drop_column('executions', 'heartbeat_at')
+    op.drop_column('executions', 'worker_id')
+    op.drop_column('crews', 'max_tokens')
+    op.drop_column('crews', 'max_duration_seconds')
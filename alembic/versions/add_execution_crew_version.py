@@ -0,0 +1,21 @@
+"""add execution crew version
+
+Revision ID: add_execution_crew_version
+Revises: add_execution_token_usage
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_execution_crew_version'
+down_revision = 'add_execution_token_usage'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('executions', sa.Column('crew_version', sa.Integer(), nullable=True))
+
+def downgrade():
+    op.drop_column('executions', 'crew_version')
@@ -0,0 +1,38 @@
+"""add execution idempotency keys and crew versions
+
+Revision ID: add_execution_idempotency
+Revises: add_execution_budgets
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_execution_idempotency'
+down_revision = 'add_execution_budgets'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('crews', sa.Column('version', sa.Integer(), nullable=True, server_default='1'))
+    op.add_column('executions', sa.Column('idempotency_key', sa.String(255), nullable=True))
+    op.add_column('executions', sa.Column('request_hash', sa.String(64), nullable=True))
+    op.create_index('ix_executions_crew_id_idempotency_key', 'executions', ['crew_id', 'idempotency_key'])
+    # Unique (crew_id, idempotency_key), kept apart because a partitioned executions table
+    # only allows unique constraints that include created_at
+    op.create_table(
+        'execution_idempotency_keys',
+        sa.Column('crew_id', sa.Integer(), sa.ForeignKey('crews.id'), nullable=False),
+        sa.Column('idempotency_key', sa.String(255), nullable=False),
+        sa.Column('execution_id', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('crew_id', 'idempotency_key'),
+    )
+
+def downgrade():
+    op.drop_table('execution_idempotency_keys')
+    op.drop_index('ix_executions_crew_id_idempotency_key', table_name='executions')
+    op.drop_column('executions', 'request_hash')
+    op.drop_column('executions', 'idempotency_key')
+    op.drop_column('crews', 'version')
@@ -0,0 +1,25 @@
+"""add execution queue columns
+
+Revision ID: add_execution_queue
+Revises: add_execution_idempotency
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_execution_queue'
+down_revision = 'add_execution_idempotency'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('executions', sa.Column('timeout_seconds', sa.Float(), nullable=True))
+    op.add_column('executions', sa.Column('max_tokens', sa.Integer(), nullable=True))
+    op.create_index('ix_executions_status_worker_id_created_at', 'executions', ['status', 'worker_id', 'created_at'])
+
+def downgrade():
+    op.drop_index('ix_executions_status_worker_id_created_at', table_name='executions')
+    op.drop_column('executions', 'max_tokens')
+    op.drop_column('executions', 'timeout_seconds')
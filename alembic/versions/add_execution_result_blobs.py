@@ -0,0 +1,76 @@
+"""add execution result blob columns
+
+Revision ID: add_execution_result_blobs
+Revises: update_crew_id_to_uuid
+Create Date: 2026-10-19
+
+Existing inline results get their digest, size and preview, so they are
+listed and served like new ones.
+
+"""
+import hashlib
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.blob_store import BLOB_PREVIEW_CHARS
+
+# revision identifiers, used by Alembic.
+revision = 'add_execution_result_blobs'
+down_revision = 'update_crew_id_to_uuid'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 500
+
+executions = sa.table(
+    'executions',
+    sa.column('id', sa.String),
+    sa.column('result', sa.Text),
+    sa.column('result_digest', sa.String),
+    sa.column('result_size', sa.Integer),
+    sa.column('result_preview', sa.Text),
+)
+
+def _describe_result(encoded: str) -> dict:
+    """Digest, size and preview of an inline result, as store_payload computes them"""
+    data = encoded.encode("utf-8")
+    try:
+        value = json.loads(encoded)
+    except ValueError:
+        value = encoded
+    preview = value if isinstance(value, str) else encoded
+    return {
+        "result_digest": hashlib.sha256(data).hexdigest(),
+        "result_size": len(data),
+        "result_preview": preview[:BLOB_PREVIEW_CHARS],
+    }
+
+def _backfill_result_digests():
+    connection = op.get_bind()
+    while True:
+        rows = connection.execute(
+            sa.select(executions.c.id, executions.c.result)
+            .where(executions.c.result.isnot(None), executions.c.result_digest.is_(None))
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            connection.execute(
+                executions.update().where(executions.c.id == row.id).values(**_describe_result(row.result))
+            )
+
+def upgrade():
+    op.add_column('executions', sa.Column('result_digest', sa.String(64), nullable=True))
+    op.add_column('executions', sa.Column('result_size', sa.Integer(), nullable=True))
+    op.add_column('executions', sa.Column('result_preview', sa.Text(), nullable=True))
+    op.add_column('executions', sa.Column('tasks_output_digest', sa.String(64), nullable=True))
+    _backfill_result_digests()
+
+def downgrade():
+    op.drop_column('executions', 'tasks_output_digest')
+    op.drop_column('executions', 'result_preview')
+    op.drop_column('executions', 'result_size')
+    op.drop_column('executions', 'result_digest')
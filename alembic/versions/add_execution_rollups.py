@@ -0,0 +1,37 @@
+"""add execution rollups
+
+Revision ID: add_execution_rollups
+Revises: partition_executions
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_execution_rollups'
+down_revision = 'partition_executions'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'execution_rollups',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('crew_id', sa.Integer(), sa.ForeignKey('crews.id')),
+        sa.Column('granularity', sa.String()),
+        sa.Column('bucket_start', sa.DateTime()),
+        sa.Column('runs', sa.Integer(), default=0),
+        sa.Column('completed', sa.Integer(), default=0),
+        sa.Column('failed', sa.Integer(), default=0),
+        sa.Column('total_duration_seconds', sa.Float(), default=0.0),
+        sa.Column('max_duration_seconds', sa.Float(), default=0.0),
+        sa.UniqueConstraint('crew_id', 'granularity', 'bucket_start', name='uq_execution_rollups_bucket'),
+    )
+    op.create_index('ix_execution_rollups_id', 'execution_rollups', ['id'])
+
+    # Existing executions are backfilled with: python -m app.rollups
+
+def downgrade():
+    op.drop_index('ix_execution_rollups_id', table_name='execution_rollups')
+    op.drop_table('execution_rollups')
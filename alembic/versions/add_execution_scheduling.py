@@ -0,0 +1,25 @@
+"""add execution scheduling columns
+
+Revision ID: add_execution_scheduling
+Revises: add_agent_rate_limits
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_execution_scheduling'
+down_revision = 'add_agent_rate_limits'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('executions', sa.Column('priority', sa.String(), nullable=True))
+    op.add_column('executions', sa.Column('owner', sa.String(), nullable=True))
+    op.add_column('executions', sa.Column('started_at', sa.DateTime(), nullable=True))
+
+def downgrade():
+    op.drop_column('executions', 'started_at')
+    op.drop_column('executions', 'owner')
+    op.drop_column('executions', 'priority')
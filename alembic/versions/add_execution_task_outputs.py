@@ -0,0 +1,38 @@
+"""add execution task outputs
+
+Revision ID: add_execution_task_outputs
+Revises: add_execution_scheduling
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_execution_task_outputs'
+down_revision = 'add_execution_scheduling'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'execution_task_outputs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('execution_id', sa.String()),
+        sa.Column('task_id', sa.Integer(), sa.ForeignKey('tasks.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('task_index', sa.Integer()),
+        sa.Column('agent_role', sa.String(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('output', sa.Text(), nullable=True),
+        sa.Column('output_digest', sa.String(64), nullable=True),
+        sa.Column('output_size', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime()),
+        sa.UniqueConstraint('execution_id', 'task_index', name='uq_execution_task_outputs_task'),
+    )
+    op.create_index('ix_execution_task_outputs_id', 'execution_task_outputs', ['id'])
+    op.create_index('ix_execution_task_outputs_execution_id', 'execution_task_outputs', ['execution_id'])
+
+def downgrade():
+    op.drop_index('ix_execution_task_outputs_execution_id', table_name='execution_task_outputs')
+    op.drop_index('ix_execution_task_outputs_id', table_name='execution_task_outputs')
+    op.drop_table('execution_task_outputs')
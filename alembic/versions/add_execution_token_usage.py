@@ -0,0 +1,25 @@
+"""add execution token usage
+
+Revision ID: add_execution_token_usage
+Revises: add_agent_tool_output_budget
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_execution_token_usage'
+down_revision = 'add_agent_tool_output_budget'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('executions', sa.Column('total_tokens', sa.Integer(), nullable=True))
+    op.add_column('executions', sa.Column('prompt_tokens', sa.Integer(), nullable=True))
+    op.add_column('executions', sa.Column('cached_prompt_tokens', sa.Integer(), nullable=True))
+
+def downgrade():
+    op.drop_column('executions', 'cached_prompt_tokens')
+    op.drop_column('executions', 'prompt_tokens')
+    op.drop_column('executions', 'total_tokens')
@@ -0,0 +1,85 @@
+"""partition executions by created_at
+
+Revision ID: partition_executions
+Revises: add_execution_result_blobs
+Create Date: 2026-10-19
+
+Adds created_at indexes to executions. On PostgreSQL with
+EXECUTIONS_PARTITIONED=true the table is rebuilt as a range-partitioned
+table with one partition per month.
+
+"""
+from datetime import datetime, UTC
+from alembic import op
+import sqlalchemy as sa
+
+from app.partitions import (
+    EXECUTIONS_PARTITIONED,
+    EXECUTION_PARTITIONS_AHEAD,
+    create_partition_sql,
+    month_start,
+    partition_range,
+)
+
+# revision identifiers, used by Alembic.
+revision = 'partition_executions'
+down_revision = 'add_execution_result_blobs'
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    "id, crew_id, status, result, result_digest, result_size, result_preview, tasks_output_digest, "
+    "error, input_variables, task_params, allowed_tools, created_at, completed_at"
+)
+
+def _partitioned() -> bool:
+    return EXECUTIONS_PARTITIONED and op.get_bind().dialect.name == "postgresql"
+
+def upgrade():
+    if not _partitioned():
+        op.create_index('ix_executions_created_at', 'executions', ['created_at'])
+        op.create_index('ix_executions_crew_id_created_at', 'executions', ['crew_id', 'created_at'])
+        return
+
+    connection = op.get_bind()
+    op.execute("UPDATE executions SET created_at = now() AT TIME ZONE 'utc' WHERE created_at IS NULL")
+    op.rename_table('executions', 'executions_unpartitioned')
+
+    # The partition key must be part of the primary key
+    op.execute("""
+        CREATE TABLE executions (
+            LIKE executions_unpartitioned INCLUDING DEFAULTS,
+            PRIMARY KEY (id, created_at),
+            FOREIGN KEY (crew_id) REFERENCES crews (id)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER TABLE executions ALTER COLUMN created_at SET NOT NULL")
+
+    oldest = connection.execute(sa.text("SELECT min(created_at) FROM executions_unpartitioned")).scalar()
+    today = datetime.now(UTC).date()
+    first = oldest.date() if oldest else today
+    for start in partition_range(first, month_start(today, EXECUTION_PARTITIONS_AHEAD)):
+        op.execute(create_partition_sql(start))
+
+    op.execute(f"INSERT INTO executions ({COLUMNS}) SELECT {COLUMNS} FROM executions_unpartitioned")
+    op.drop_table('executions_unpartitioned')
+
+    op.create_index('ix_executions_created_at', 'executions', ['created_at'])
+    op.create_index('ix_executions_crew_id_created_at', 'executions', ['crew_id', 'created_at'])
+
+def downgrade():
+    if not _partitioned():
+        op.drop_index('ix_executions_crew_id_created_at', table_name='executions')
+        op.drop_index('ix_executions_created_at', table_name='executions')
+        return
+
+    op.rename_table('executions', 'executions_partitioned')
+    op.execute("""
+        CREATE TABLE executions (
+            LIKE executions_partitioned INCLUDING DEFAULTS,
+            PRIMARY KEY (id),
+            FOREIGN KEY (crew_id) REFERENCES crews (id)
+        )
+    """)
+    op.execute(f"INSERT INTO executions ({COLUMNS}) SELECT {COLUMNS} FROM executions_partitioned")
+    op.execute("DROP TABLE executions_partitioned CASCADE")
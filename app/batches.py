@@ -0,0 +1,141 @@
+import asyncio
+import csv
+import io
+import json
+import os
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+from sqlalchemy import select, update
+
+from app.checkpoints import load_completed_tasks
+from app.database import AsyncSessionLocal, utcnow
+from app.execution import CrewDefinition, execute_run, complete_execution, fail_execution
+from app.models import Execution as DBExecution, ExecutionBatch as DBExecutionBatch
+from app.run_control import ExecutionStopped
+
+load_dotenv()
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+BATCH_RETRY_BACKOFF = float(os.getenv("BATCH_RETRY_BACKOFF", "2.0"))  # seconds, doubled on each retry
+
+# Keep references to running batches so they are not garbage collected
+_running_batches = set()
+
+def parse_batch_file(content: bytes, filename: str = "") -> List[Dict[str, Any]]:
+    """Parse an uploaded CSV (header row + one row per item) or NDJSON file into inputs dicts"""
+    text = content.decode("utf-8-sig")
+    if filename.lower().endswith(".csv"):
+        return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+
+    items = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e.msg}")
+        if not isinstance(item, dict):
+            raise ValueError(f"Line {line_number} is not a JSON object")
+        items.append(item)
+    return items
+
+def start_batch(batch_id: str, definition: CrewDefinition, concurrency: int, max_retries: int) -> None:
+    task = asyncio.create_task(run_batch(batch_id, definition, concurrency, max_retries))
+    _running_batches.add(task)
+    task.add_done_callback(_running_batches.discard)
+
+async def cancel_batches() -> None:
+    """Cancel the batches running in this process on shutdown, their rows are handed back by the caller"""
+    for task in list(_running_batches):
+        task.cancel()
+    if _running_batches:
+        await asyncio.wait(list(_running_batches))
+
+async def run_batch(batch_id: str, definition: CrewDefinition, concurrency: int, max_retries: int) -> None:
+    """Run every queued item of a batch with bounded concurrency"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(DBExecution.id)
+            .where(DBExecution.batch_id == batch_id)
+            .where(DBExecution.status == "queued")
+            .order_by(DBExecution.created_at)
+        )
+        execution_ids = result.scalars().all()
+        await session.execute(
+            update(DBExecutionBatch).where(DBExecutionBatch.id == batch_id).values(status="in_progress")
+        )
+        await session.commit()
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_item(execution_id: str):
+        async with semaphore:
+            try:
+                await run_batch_item(batch_id, definition, execution_id, max_retries)
+            except Exception as e:
+                print(f"Error running batch item {execution_id}: {str(e)}")
+
+    await asyncio.gather(*(run_item(execution_id) for execution_id in execution_ids))
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(DBExecutionBatch)
+            .where(DBExecutionBatch.id == batch_id)
+            .values(status="completed", completed_at=utcnow())
+        )
+        await session.commit()
+
+async def run_batch_item(batch_id: str, definition: CrewDefinition, execution_id: str, max_retries: int) -> None:
+    """Run one batch item, retrying failures with exponential backoff"""
+    async with AsyncSessionLocal() as session:
+        execution = await session.get(DBExecution, execution_id)
+        inputs = json.loads(execution.input_variables) if execution.input_variables else {}
+
+        task_ids = [task.id for task in definition.tasks]
+        counter = DBExecutionBatch.failed_items
+        if execution.cancel_requested:
+            # Items cancelled while waiting for their turn never start
+            await fail_execution(session, execution, "Cancelled by request", status="cancelled")
+        else:
+            error = None
+            for attempt in range(max_retries + 1):
+                try:
+                    # Retries, and items requeued after their worker died, pick up after
+                    # the last task checkpointed by the previous attempt
+                    resuming = attempt or execution.attempts
+                    completed_tasks = await load_completed_tasks(session, execution_id, task_ids) if resuming else []
+                    execution.attempts = (execution.attempts or 0) + 1
+
+                    # Each attempt waits for its own slot, so retry backoff never holds one
+                    result = await execute_run(session, execution, definition, inputs, completed_tasks)
+                    await complete_execution(session, execution, result, completed_tasks)
+                    counter = DBExecutionBatch.completed_items
+                    break
+                except ExecutionStopped as e:
+                    # Cancelled or over budget, retrying would not help
+                    await fail_execution(session, execution, e.reason, status=e.status)
+                    break
+                except Exception as e:
+                    error = str(e)
+                    if attempt < max_retries:
+                        await asyncio.sleep(BATCH_RETRY_BACKOFF * 2 ** attempt)
+            else:
+                await fail_execution(session, execution, error)
+
+        await session.execute(
+            update(DBExecutionBatch)
+            .where(DBExecutionBatch.id == batch_id)
+            .values({counter: counter + 1})
+        )
+        # Queue workers run items independently, so whichever finishes the last item closes the batch
+        await session.execute(
+            update(DBExecutionBatch)
+            .where(DBExecutionBatch.id == batch_id)
+            .where(DBExecutionBatch.status != "completed")
+            .where(DBExecutionBatch.completed_items + DBExecutionBatch.failed_items >= DBExecutionBatch.total_items)
+            .values(status="completed", completed_at=utcnow())
+        )
+        await session.commit()
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, UTC
+from typing import Any, Dict, Iterator, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Get blob store type from environment
+BLOB_STORE_TYPE = os.getenv("BLOB_STORE_TYPE", "local")  # local or s3
+BLOB_STORE_PATH = os.getenv(
+    "BLOB_STORE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "blobs"))
+)
+# Payloads up to this size stay inline in the database row
+BLOB_INLINE_MAX_BYTES = int(os.getenv("BLOB_INLINE_MAX_BYTES", "16384"))
+BLOB_PREVIEW_CHARS = int(os.getenv("BLOB_PREVIEW_CHARS", "500"))
+BLOB_CHUNK_SIZE = 64 * 1024
+# Namespace of the full outputs behind cut tool outputs, purged by app.retention
+TOOL_OUTPUT_NAMESPACE = "tool-outputs"
+
+class BlobStore(ABC):
+    """Content-addressed storage keyed by the SHA-256 digest of the data"""
+
+    def put(self, data: bytes, digest: Optional[str] = None) -> str:
+        """Store data and return its digest. Existing blobs are not rewritten."""
+        digest = digest or hashlib.sha256(data).hexdigest()
+        if not self.exists(digest):
+            self._write(digest, data)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        return b"".join(self.iter_chunks(digest))
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        ...
+
+    @abstractmethod
+    def iter_chunks(self, digest: str) -> Iterator[bytes]:
+        ...
+
+    @abstractmethod
+    def _write(self, digest: str, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def delete_older_than(self, max_age_seconds: float) -> int:
+        """Delete blobs first stored more than max_age_seconds ago and return how many were deleted"""
+        ...
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str = BLOB_STORE_PATH, namespace: str = ""):
+        self.root = os.path.join(root, namespace) if namespace else root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+
+    def iter_chunks(self, digest: str) -> Iterator[bytes]:
+        with open(self._path(digest), "rb") as f:
+            while chunk := f.read(BLOB_CHUNK_SIZE):
+                yield chunk
+
+    def _write(self, digest: str, data: bytes) -> None:
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete_older_than(self, max_age_seconds: float) -> int:
+        cutoff = time.time() - max_age_seconds
+        deleted = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        deleted += 1
+                except FileNotFoundError:
+                    pass
+        return deleted
+
+class S3BlobStore(BlobStore):
+    """S3-compatible store. Set BLOB_S3_ENDPOINT_URL to use MinIO or another local stand-in."""
+
+    def __init__(self, namespace: str = ""):
+        import boto3
+
+        self.bucket = os.getenv("BLOB_S3_BUCKET")
+        self.prefix = os.getenv("BLOB_S3_PREFIX", "blobs/") + (f"{namespace}/" if namespace else "")
+        if not self.bucket:
+            raise ValueError("Missing S3 configuration. Please set BLOB_S3_BUCKET")
+
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=os.getenv("BLOB_S3_ENDPOINT_URL"),
+            aws_access_key_id=os.getenv("BLOB_S3_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("BLOB_S3_SECRET_ACCESS_KEY"),
+            region_name=os.getenv("BLOB_S3_REGION"),
+        )
+
+    def _key(self, digest: str) -> str:
+        return f"{self.prefix}{digest}"
+
+    def exists(self, digest: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def iter_chunks(self, digest: str) -> Iterator[bytes]:
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(digest))
+        yield from response["Body"].iter_chunks(BLOB_CHUNK_SIZE)
+
+    def _write(self, digest: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(digest), Body=data)
+
+    def delete_older_than(self, max_age_seconds: float) -> int:
+        cutoff = datetime.now(UTC) - timedelta(seconds=max_age_seconds)
+        deleted = 0
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=self.prefix):
+            keys = [{"Key": item["Key"]} for item in page.get("Contents", []) if item["LastModified"] < cutoff]
+            # A listing page holds at most 1000 keys, the most one delete_objects call takes
+            if keys:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": keys, "Quiet": True})
+                deleted += len(keys)
+        return deleted
+
+_blob_stores: Dict[str, BlobStore] = {}
+
+def get_blob_store(namespace: str = "") -> BlobStore:
+    """
+    Return the configured blob store, creating it on first use. A namespace is kept apart
+    from the others, under its own directory or key prefix.
+    """
+    if namespace not in _blob_stores:
+        if BLOB_STORE_TYPE == "s3":
+            _blob_stores[namespace] = S3BlobStore(namespace)
+        else:
+            _blob_stores[namespace] = LocalBlobStore(namespace=namespace)
+    return _blob_stores[namespace]
+
+def store_payload(value: Any, inline_max_bytes: int = BLOB_INLINE_MAX_BYTES) -> dict:
+    """
+    JSON-encode a payload and offload it to the blob store when it is too large to keep inline.
+    Pass inline_max_bytes=0 to always offload.
+
+    Returns:
+        dict: inline (JSON text or None), digest, size (bytes) and preview
+    """
+    encoded = json.dumps(value)
+    data = encoded.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    inline = len(data) <= inline_max_bytes
+    if not inline:
+        get_blob_store().put(data, digest)
+
+    preview = value if isinstance(value, str) else encoded
+    return {
+        "inline": encoded if inline else None,
+        "digest": digest,
+        "size": len(data),
+        "preview": preview[:BLOB_PREVIEW_CHARS],
+    }
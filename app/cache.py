@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CREW_CACHE_ENABLED = os.getenv("CREW_CACHE_ENABLED", "true").lower() == "true"
+CREW_CACHE_TTL = int(os.getenv("CREW_CACHE_TTL", "300"))  # seconds
+CREW_CACHE_MAX_ENTRIES = int(os.getenv("CREW_CACHE_MAX_ENTRIES", "1024"))
+# Shared cache for several processes, e.g. redis://localhost:6379/0 (requires `redis`)
+CREW_CACHE_URL = os.getenv("CREW_CACHE_URL")
+CREW_CACHE_PREFIX = os.getenv("CREW_CACHE_PREFIX", "workforce:crew:")
+
+def make_entry(body: bytes) -> dict:
+    """Cache entry for a serialized response, with a strong ETag derived from the body"""
+    return {"etag": f'"{hashlib.sha256(body).hexdigest()[:32]}"', "body": body}
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """Whether an If-None-Match header lists the ETag, or is *. Compared weakly, as If-None-Match is."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in (candidate.removeprefix("W/") for candidate in candidates)
+
+class LocalCache:
+    """In-process LRU cache with expiry"""
+
+    def __init__(self, ttl: int = CREW_CACHE_TTL, max_entries: int = CREW_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    async def set(self, key: str, entry: dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+class RedisCache:
+    """Cache shared by every process through a Redis-compatible server"""
+
+    def __init__(self, url: str, ttl: int = CREW_CACHE_TTL, prefix: str = CREW_CACHE_PREFIX):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[dict]:
+        data = await self.client.get(self.prefix + key)
+        if data is None:
+            return None
+        entry = json.loads(data)
+        return {"etag": entry["etag"], "body": entry["body"].encode("utf-8")}
+
+    async def set(self, key: str, entry: dict) -> None:
+        data = json.dumps({"etag": entry["etag"], "body": entry["body"].decode("utf-8")})
+        await self.client.set(self.prefix + key, data, ex=self.ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+class CrewCache:
+    """
+    Read-through cache of serialized crews, keyed by crew id and version. Every write to a
+    crew bumps its version in the same transaction, so a reader that looked up the current
+    version never gets an older body, even one put back by a slow concurrent miss or kept
+    by another process.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(crew_id: int, version: Optional[int]) -> str:
+        return f"{crew_id}:{version or 1}"
+
+    async def get(self, crew_id: int, version: Optional[int]) -> Optional[dict]:
+        if self.backend is None:
+            return None
+        try:
+            entry = await self.backend.get(self._key(crew_id, version))
+        except Exception as e:
+            # A cache outage must never break reads
+            print(f"Error reading crew cache: {str(e)}")
+            entry = None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    async def set(self, crew_id: int, version: Optional[int], entry: dict) -> None:
+        if self.backend is None:
+            return
+        try:
+            await self.backend.set(self._key(crew_id, version), entry)
+        except Exception as e:
+            print(f"Error writing crew cache: {str(e)}")
+
+    async def invalidate(self, crew_id: int, version: Optional[int]) -> None:
+        """Drop one version early. Not needed for correctness, except for ids reused by SQLite."""
+        if self.backend is None:
+            return
+        try:
+            await self.backend.delete(self._key(crew_id, version))
+        except Exception as e:
+            print(f"Error invalidating crew cache: {str(e)}")
+
+def _create_backend():
+    if not CREW_CACHE_ENABLED:
+        return None
+    if CREW_CACHE_URL:
+        return RedisCache(CREW_CACHE_URL)
+    return LocalCache()
+
+crew_cache = CrewCache(_create_backend())
@@ -0,0 +1,191 @@
+"""
+Record and replay of LLM calls and tool traffic.
+
+With CASSETTE_MODE=record every LLM call and every HTTP request made by the tools is
+appended to a JSON Lines cassette. With CASSETTE_MODE=replay the same calls are answered
+from it, matched on a fingerprint of the normalized request, so crews run without network
+access, credentials or provider costs. A call missing from the cassette fails the run.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()  # off, record or replay
+CASSETTE_PATH = os.getenv(
+    "CASSETTE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "cassettes", "cassette.jsonl"))
+)
+# Replayed calls wait this fraction of their recorded latency (0 = answer at once, 1 = as recorded)
+CASSETTE_REPLAY_LATENCY = float(os.getenv("CASSETTE_REPLAY_LATENCY", "0"))
+# Text matching this regex is ignored when fingerprinting, e.g. dates or ids in prompts
+CASSETTE_IGNORE_PATTERN = os.getenv("CASSETTE_IGNORE_PATTERN")
+
+# Query parameters that carry credentials are never fingerprinted or recorded, nor are request headers
+SECRET_PARAMS = {"apikey", "api_key", "appid", "key", "token", "access_token", "password"}
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode for a call that was not recorded"""
+
+def cassette_enabled() -> bool:
+    return CASSETTE_MODE in ("record", "replay")
+
+def normalize_text(text: str) -> str:
+    if CASSETTE_IGNORE_PATTERN:
+        text = re.sub(CASSETTE_IGNORE_PATTERN, "<ignored>", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def fingerprint(kind: str, request: Any) -> str:
+    canonical = json.dumps(request, sort_keys=True, default=str)
+    return hashlib.sha256(f"{kind}:{normalize_text(canonical)}".encode()).hexdigest()
+
+class Cassette:
+    """
+    Interactions stored one JSON object per line. Repeated identical requests are replayed
+    in recording order, and the last recording is reused once they run out.
+    """
+
+    def __init__(self, path: str, mode: str):
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._recorded: Dict[str, deque] = {}
+        self._last: Dict[str, dict] = {}
+        if mode == "replay":
+            self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Cassette {self.path} not found, record it with CASSETTE_MODE=record")
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    interaction = json.loads(line)
+                    self._recorded.setdefault(interaction["fingerprint"], deque()).append(interaction)
+
+    def _append(self, interaction: dict) -> None:
+        line = json.dumps(interaction, default=str) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Appending keeps recordings from several processes, delete the file to start over
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def _next(self, key: str) -> Optional[dict]:
+        with self._lock:
+            recorded = self._recorded.get(key)
+            if recorded:
+                self._last[key] = recorded.popleft()
+            return self._last.get(key)
+
+    def call(self, kind: str, request: Any, fn: Callable[[], Any]) -> Any:
+        """Run fn, or answer from the cassette. fn must return something JSON-serializable."""
+        key = fingerprint(kind, request)
+        if self.mode == "replay":
+            interaction = self._next(key)
+            if interaction is None:
+                raise CassetteMiss(f"No recorded {kind} call matches {json.dumps(request, default=str)[:500]}")
+            if CASSETTE_REPLAY_LATENCY:
+                time.sleep(interaction["latency"] * CASSETTE_REPLAY_LATENCY)
+            return interaction["response"]
+
+        # Only successful calls are recorded, so a rate-limited call that was retried replays its retry
+        started = time.perf_counter()
+        response = fn()
+        self._append({
+            "fingerprint": key,
+            "kind": kind,
+            "request": request,
+            "response": response,
+            "latency": round(time.perf_counter() - started, 4),
+        })
+        return response
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+def get_cassette() -> Optional[Cassette]:
+    """The process-wide cassette, or None when CASSETTE_MODE is off"""
+    global _cassette
+    if not cassette_enabled():
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE)
+        return _cassette
+
+def cassette_call(kind: str, request: Any, fn: Callable[[], Any]) -> Any:
+    cassette = get_cassette()
+    return fn() if cassette is None else cassette.call(kind, request, fn)
+
+def _strip_secrets(url: str) -> str:
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SECRET_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+def _request_body(body: Any) -> Any:
+    if body is None:
+        return None
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    try:
+        return json.loads(body)
+    except (TypeError, ValueError):
+        return str(body)
+
+_http_installed = False
+
+def install_http_cassette() -> None:
+    """
+    Route the HTTP requests of the tools through the cassette. The tools and the Atlassian
+    client all use `requests`, so its transport adapter is the one place to hook in.
+    """
+    global _http_installed
+    if _http_installed or not cassette_enabled():
+        return
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.structures import CaseInsensitiveDict
+
+    send = HTTPAdapter.send
+
+    def cassette_send(adapter, request, *args, **kwargs):
+        def perform():
+            response = send(adapter, request, *args, **kwargs)
+            return {
+                "status_code": response.status_code,
+                "reason": response.reason,
+                "headers": dict(response.headers),
+                "content": base64.b64encode(response.content).decode("ascii"),
+                "encoding": response.encoding,
+            }
+
+        recorded = get_cassette().call(
+            "http",
+            {"method": request.method, "url": _strip_secrets(request.url), "body": _request_body(request.body)},
+            perform
+        )
+        response = requests.Response()
+        response.status_code = recorded["status_code"]
+        response.reason = recorded["reason"]
+        response.headers = CaseInsensitiveDict(recorded["headers"])
+        # The recorded content is already decoded, so it must not be decompressed again
+        response.headers.pop("Content-Encoding", None)
+        response._content = base64.b64decode(recorded["content"])
+        response.encoding = recorded["encoding"]
+        response.url = request.url
+        response.request = request
+        return response
+
+    HTTPAdapter.send = cassette_send
+    _http_installed = True
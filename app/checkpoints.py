@@ -0,0 +1,91 @@
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.blob_store import get_blob_store, store_payload
+from app.database import AsyncSessionLocal
+from app.models import ExecutionTaskOutput as DBExecutionTaskOutput
+
+@dataclass
+class CompletedTask:
+    """Output of a task that finished in an earlier attempt of the same execution"""
+    task_index: int
+    task_id: Optional[int]
+    agent_role: Optional[str]
+    description: Optional[str]
+    raw: str
+
+async def save_task_output(execution_id: str, task_index: int, task_id: Optional[int], task_output) -> None:
+    """Checkpoint one finished task in its own transaction, so it survives a failure later in the run"""
+    stored = await asyncio.to_thread(store_payload, task_output.raw)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(DBExecutionTaskOutput)
+            .where(DBExecutionTaskOutput.execution_id == execution_id)
+            .where(DBExecutionTaskOutput.task_index == task_index)
+        )
+        checkpoint = result.scalar_one_or_none()
+        if checkpoint is None:
+            checkpoint = DBExecutionTaskOutput(execution_id=execution_id, task_index=task_index)
+            session.add(checkpoint)
+        checkpoint.task_id = task_id
+        checkpoint.agent_role = task_output.agent
+        checkpoint.description = task_output.description
+        checkpoint.output = stored["inline"]
+        checkpoint.output_digest = stored["digest"]
+        checkpoint.output_size = stored["size"]
+        await session.commit()
+
+def task_checkpointer(execution_id: str, loop: asyncio.AbstractEventLoop) -> Callable[[int, Optional[int]], Callable]:
+    """
+    Build CrewAI task callbacks that checkpoint each task output.
+
+    CrewAI calls task callbacks from the worker thread running kickoff(), so the write is
+    scheduled on the event loop and the thread waits for it before starting the next task.
+    """
+    def for_task(task_index: int, task_id: Optional[int]) -> Callable:
+        def callback(task_output) -> None:
+            try:
+                asyncio.run_coroutine_threadsafe(
+                    save_task_output(execution_id, task_index, task_id, task_output), loop
+                ).result()
+            except Exception as e:
+                # A lost checkpoint only costs a re-run of this task on resume
+                print(f"Error checkpointing task {task_index} of execution {execution_id}: {str(e)}")
+        return callback
+    return for_task
+
+async def load_task_outputs(db: AsyncSession, execution_id: str) -> List[DBExecutionTaskOutput]:
+    result = await db.execute(
+        select(DBExecutionTaskOutput)
+        .where(DBExecutionTaskOutput.execution_id == execution_id)
+        .order_by(DBExecutionTaskOutput.task_index)
+    )
+    return result.scalars().all()
+
+def _checkpoint_raw(checkpoint: DBExecutionTaskOutput) -> str:
+    encoded = checkpoint.output if checkpoint.output is not None else get_blob_store().get(checkpoint.output_digest)
+    return json.loads(encoded)
+
+async def load_completed_tasks(db: AsyncSession, execution_id: str, task_ids: List[int]) -> List[CompletedTask]:
+    """
+    Return the checkpointed outputs a run can resume from: the leading tasks that finished,
+    as long as they still match the crew's current tasks.
+    """
+    completed = []
+    for checkpoint in await load_task_outputs(db, execution_id):
+        index = checkpoint.task_index
+        if index != len(completed) or index >= len(task_ids) or checkpoint.task_id != task_ids[index]:
+            break
+        completed.append(CompletedTask(
+            task_index=index,
+            task_id=checkpoint.task_id,
+            agent_role=checkpoint.agent_role,
+            description=checkpoint.description,
+            raw=await asyncio.to_thread(_checkpoint_raw, checkpoint),
+        ))
+    return completed
@@ -1,6 +1,8 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.pool import NullPool
+from datetime import datetime, UTC
 import os
 from dotenv import load_dotenv
 
@@ -8,6 +10,9 @@ load_dotenv()
 
 # Get database type from environment
 DATABASE_TYPE = os.getenv("DATABASE_TYPE", "postgresql")
+# Create missing tables when the application starts. Otherwise the schema is managed by
+# running `python -m app.migrate` once per deploy.
+DB_AUTO_CREATE = os.getenv("DB_AUTO_CREATE", "true" if DATABASE_TYPE == "sqlite" else "false").lower() == "true"
 
 # Get appropriate database URL based on type
 if DATABASE_TYPE == "sqlite":
@@ -17,7 +22,10 @@ if DATABASE_TYPE == "sqlite":
     # SQLite specific configuration
     engine_kwargs = {
         "echo": True,
-        "connect_args": {"check_same_thread": False}  # Required for SQLite
+        "connect_args": {
+            "check_same_thread": False,  # Required for SQLite
+            "timeout": 30  # seconds to wait for another process's write, e.g. a queue worker
+        }
     }
 else:
     DATABASE_URL = os.getenv("POSTGRES_URL")
@@ -33,6 +41,21 @@ engine = create_async_engine(
     **engine_kwargs
 )
 
+if DATABASE_TYPE == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def enable_wal(dbapi_connection, connection_record):
+        # Lets API and worker processes read while one of them writes
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
+def dispose_engine_after_fork() -> None:
+    # A forked process must not reuse the parent's pooled connections. close=False leaves
+    # them to the parent and gives the child a new, empty pool.
+    engine.sync_engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=dispose_engine_after_fork)
+
 # Create async session factory
 AsyncSessionLocal = sessionmaker(
     engine,
@@ -43,6 +66,16 @@ AsyncSessionLocal = sessionmaker(
 # Create base class for models
 Base = declarative_base()
 
+def utcnow() -> datetime:
+    """Current time as naive UTC, the way the DateTime columns store it"""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+def naive_utc(value: datetime) -> datetime:
+    """An aware datetime converted to naive UTC for comparison with the DateTime columns"""
+    if value.tzinfo is not None:
+        value = value.astimezone(UTC).replace(tzinfo=None)
+    return value
+
 # Dependency to get DB session
 async def get_db():
     async with AsyncSessionLocal() as session:
@@ -57,8 +90,13 @@ async def get_db():
 
 # Initialize database
 async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    """
+    Create or upgrade the schema at startup, the same way `python -m app.migrate` does. A plain
+    create_all would leave the tables of an existing database without the newer columns.
+    """
+    from app.migrate import migrate
+
+    print(f"Database schema {await migrate()}")
 
 # Reset database (drop and recreate all tables)
 async def reset_db():
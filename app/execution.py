@@ -0,0 +1,373 @@
+import asyncio
+import json
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.blob_store import store_payload
+from app.checkpoints import CompletedTask, task_checkpointer
+from app.database import utcnow
+from app.models import Execution as DBExecution
+from app.queries import CrewGraph, load_crew_graph
+from app.rollups import record_execution
+from app.run_control import ExecutionStopped, start_run_control, finish_run_control
+from app.scheduler import execution_scheduler
+from app.tools import TOOL_LOCATIONS, get_available_tools, get_tool
+
+if TYPE_CHECKING:
+    from crewai import Crew
+
+@dataclass
+class AgentDefinition:
+    role: str
+    goal: str
+    backstory: str
+    verbose: bool = True
+    llm_provider: str = "anthropic"
+    llm_model: Optional[str] = None
+    llm_base_url: Optional[str] = None
+    llm_api_key: Optional[str] = None
+    llm_api_version: Optional[str] = None
+    llm_requests_per_minute: Optional[int] = None
+    llm_tokens_per_minute: Optional[int] = None
+    llm_max_concurrency: Optional[int] = None
+    allowed_tools: List[str] = field(default_factory=list)
+    tool_output_tokens: Optional[int] = None
+
+@dataclass
+class TaskDefinition:
+    id: int
+    description: str
+    expected_output: Optional[str]
+    agent_role: str
+
+@dataclass
+class CrewDefinition:
+    """Plain snapshot of a crew, loaded once and reusable for any number of runs"""
+    crew_id: int
+    name: str
+    agents: List[AgentDefinition]
+    tasks: List[TaskDefinition]
+    max_duration_seconds: Optional[int] = None
+    max_tokens: Optional[int] = None
+    version: Optional[int] = None
+
+def _task_agent_role(graph: CrewGraph, task) -> str:
+    agent = graph.agent_for(task)
+    if agent is None:
+        raise ValueError(f"Agent of task {task.id} is not part of crew {graph.crew.name}")
+    return agent.role
+
+async def load_crew_definition(db: AsyncSession, crew_id: int) -> Optional[CrewDefinition]:
+    graph = await load_crew_graph(db, crew_id)
+    if not graph:
+        return None
+
+    crew = graph.crew
+    return CrewDefinition(
+        crew_id=crew.id,
+        name=crew.name,
+        max_duration_seconds=crew.max_duration_seconds,
+        max_tokens=crew.max_tokens,
+        version=crew.version,
+        agents=[
+            AgentDefinition(
+                role=agent.role,
+                goal=agent.goal,
+                backstory=agent.backstory,
+                verbose=agent.verbose,
+                llm_provider=agent.llm_provider,
+                llm_model=agent.llm_model,
+                llm_base_url=agent.llm_base_url,
+                llm_api_key=agent.llm_api_key,
+                llm_api_version=agent.llm_api_version,
+                llm_requests_per_minute=agent.llm_requests_per_minute,
+                llm_tokens_per_minute=agent.llm_tokens_per_minute,
+                llm_max_concurrency=agent.llm_max_concurrency,
+                allowed_tools=json.loads(agent.allowed_tools) if agent.allowed_tools else [],
+                tool_output_tokens=agent.tool_output_tokens
+            ) for agent in graph.agents
+        ],
+        tasks=[
+            TaskDefinition(
+                id=task.id,
+                description=task.description,
+                expected_output=task.expected_output,
+                agent_role=_task_agent_role(graph, task)
+            ) for task in graph.tasks
+        ]
+    )
+
+def preload_execution_modules(tool_names: Optional[List[str]] = None) -> None:
+    """
+    Import crewai, the managed LLM and the given tools (all when None).
+
+    They take seconds to import, so the API only imports them for its first run.
+    Worker processes call this at startup instead, so no run pays for it.
+    """
+    import crewai  # noqa: F401
+    import app.llm  # noqa: F401
+
+    for tool_name in tool_names if tool_names is not None else TOOL_LOCATIONS:
+        try:
+            get_tool(tool_name)
+        except Exception as e:
+            # A tool missing credentials fails again in the runs that use it
+            print(f"Error preloading tool {tool_name}: {str(e)}")
+
+def build_llm(agent: AgentDefinition, execution_id: Optional[str] = None):
+    """Configure the LLM based on provider, with calls admitted per provider/model/key"""
+    from app.llm import build_managed_llm
+
+    return build_managed_llm(
+        provider=agent.llm_provider,
+        model=agent.llm_model,
+        base_url=agent.llm_base_url,
+        api_key=agent.llm_api_key,
+        api_version=agent.llm_api_version,
+        execution_id=execution_id,
+        requests_per_minute=agent.llm_requests_per_minute,
+        tokens_per_minute=agent.llm_tokens_per_minute,
+        max_concurrency=agent.llm_max_concurrency
+    )
+
+def build_crew(
+    definition: CrewDefinition,
+    execution_id: Optional[str] = None,
+    completed_tasks: Optional[List[CompletedTask]] = None,
+    task_callback: Optional[Callable[[int, Optional[int]], Callable]] = None
+) -> "Crew":
+    """
+    Create a fresh CrewAI crew from a definition. CrewAI objects are not shared between runs.
+
+    When resuming, tasks in completed_tasks are skipped and their outputs are passed to the
+    remaining tasks as context, the same way a sequential run passes earlier outputs along.
+    """
+    from crewai import Crew, Agent, Task
+    from crewai.tasks.task_output import TaskOutput
+    from app.tools.budget import TOOL_OUTPUT_HANDLES, BudgetedTool, ReadToolOutputTool, budget_tool, resolve_budget
+
+    completed_tasks = completed_tasks or []
+    # Load only the tools the agents may use
+    tools_dict = get_available_tools(sorted({
+        tool_name for agent_definition in definition.agents for tool_name in agent_definition.allowed_tools
+    }))
+    # Tools that keep state between calls get an instance bound to this run
+    tools_dict = {
+        name: tool.for_execution(execution_id) if hasattr(tool, "for_execution") else tool
+        for name, tool in tools_dict.items()
+    }
+
+    # Create CrewAI agents, indexed by role for the tasks
+    crewai_agents = {}
+    for agent_definition in definition.agents:
+        # Filter tools based on allowed_tools, each kept within its output budget for this agent
+        agent_tools = [
+            budget_tool(tools_dict[tool_name], tool_name, agent_definition.tool_output_tokens)
+            for tool_name in agent_definition.allowed_tools if tool_name in tools_dict
+        ]
+        if TOOL_OUTPUT_HANDLES and any(isinstance(tool, BudgetedTool) for tool in agent_tools):
+            # Lets the agent page through the outputs that were cut
+            agent_tools.append(ReadToolOutputTool(
+                page_tokens=resolve_budget("ReadToolOutput", agent_definition.tool_output_tokens) or 2000
+            ))
+
+        # Create agent with tools and LLM
+        agent = Agent(
+            role=agent_definition.role,
+            goal=agent_definition.goal,
+            backstory=agent_definition.backstory,
+            verbose=agent_definition.verbose,
+            tools=agent_tools,  # Pass tools as a list
+            llm=build_llm(agent_definition, execution_id)  # Pass the configured LLM instance
+        )
+        crewai_agents[agent_definition.role] = agent
+
+    # Stand-in tasks carrying the checkpointed outputs of completed tasks
+    previous_tasks = []
+    for completed in completed_tasks:
+        task_definition = definition.tasks[completed.task_index]
+        task = Task(
+            description=task_definition.description,
+            agent=crewai_agents[task_definition.agent_role],
+            expected_output=task_definition.expected_output
+        )
+        task.output = TaskOutput(
+            description=task_definition.description,
+            agent=completed.agent_role or task_definition.agent_role,
+            raw=completed.raw
+        )
+        previous_tasks.append(task)
+
+    # Create CrewAI tasks
+    crewai_tasks = []
+    for index, task_definition in enumerate(definition.tasks[len(completed_tasks):], start=len(completed_tasks)):
+        task_kwargs = {}
+        if previous_tasks:
+            task_kwargs["context"] = previous_tasks + crewai_tasks
+        if task_callback:
+            task_kwargs["callback"] = task_callback(index, task_definition.id)
+        task = Task(
+            description=task_definition.description,
+            agent=crewai_agents[task_definition.agent_role],
+            expected_output=task_definition.expected_output,
+            **task_kwargs
+        )
+        crewai_tasks.append(task)
+
+    return Crew(
+        agents=list(crewai_agents.values()),
+        tasks=crewai_tasks,
+        verbose=True
+    )
+
+def prepare_inputs(inputs: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Flatten task input_parameters and crew-level input_variables to the top level for CrewAI"""
+    inputs = dict(inputs or {})
+
+    # Flatten all task input_parameters to the top-level for CrewAI
+    if "task_params" in inputs:
+        for task_id, params in inputs["task_params"].items():
+            if "input_parameters" in params:
+                for k, v in params["input_parameters"].items():
+                    if k not in inputs:
+                        inputs[k] = v
+
+    # Also flatten crew-level input_variables
+    if "input_variables" in inputs:
+        for k, v in inputs["input_variables"].items():
+            inputs[k] = v
+
+    return inputs
+
+@dataclass
+class ResumedOutput:
+    """Result of a resumed run whose tasks had all been checkpointed already"""
+    raw: str
+    tasks_output: List[Any] = field(default_factory=list)
+
+async def run_crew(
+    definition: CrewDefinition,
+    inputs: Optional[Dict[str, Any]],
+    execution_id: Optional[str] = None,
+    completed_tasks: Optional[List[CompletedTask]] = None
+):
+    """
+    Build the crew and run it in a worker thread so the event loop stays responsive.
+    With an execution_id, each task output is checkpointed as soon as the task finishes.
+    """
+    completed_tasks = completed_tasks or []
+    if definition.tasks and len(completed_tasks) == len(definition.tasks):
+        return ResumedOutput(raw=completed_tasks[-1].raw)
+
+    task_callback = task_checkpointer(execution_id, asyncio.get_running_loop()) if execution_id else None
+    crew = build_crew(definition, execution_id, completed_tasks, task_callback)
+    return await asyncio.to_thread(crew.kickoff, inputs=prepare_inputs(inputs))
+
+async def complete_execution(
+    db: AsyncSession,
+    execution: DBExecution,
+    result,
+    completed_tasks: Optional[List[CompletedTask]] = None
+) -> str:
+    """Store the crew output on the execution record and return the raw output"""
+    # CrewOutput object structure:
+    # - raw: str - The raw text output
+    # - pydantic: Optional[Any] - Pydantic model if output was structured
+    # - json_dict: Optional[Dict] - JSON representation if available
+    # - tasks_output: List[TaskOutput] - List of individual task outputs
+    #   - TaskOutput contains: description, name, expected_output, summary, raw, pydantic, json_dict, agent, output_format
+    # - token_usage: UsageMetrics - Token usage statistics
+    #   - UsageMetrics contains: total_tokens, prompt_tokens, cached_prompt_tokens, completion_tokens, successful_requests
+    raw_output = result.raw if hasattr(result, 'raw') else str(result)
+    tasks_output = [
+        {
+            "description": completed.description,
+            "agent": completed.agent_role,
+            "raw": completed.raw
+        } for completed in completed_tasks or []
+    ] + [
+        {
+            "description": task_output.description,
+            "agent": task_output.agent,
+            "raw": task_output.raw
+        } for task_output in getattr(result, 'tasks_output', None) or []
+    ]
+
+    # Large outputs go to the blob store, the row keeps the digest, size and preview
+    stored_result = await asyncio.to_thread(store_payload, raw_output)
+    stored_tasks = await asyncio.to_thread(store_payload, tasks_output, 0)
+
+    # Update execution record
+    execution.status = "completed"
+    execution.result = stored_result["inline"]
+    execution.result_digest = stored_result["digest"]
+    execution.result_size = stored_result["size"]
+    execution.result_preview = stored_result["preview"]
+    execution.tasks_output_digest = stored_tasks["digest"]
+    execution.completed_at = utcnow()
+    await record_execution(db, execution)
+    return raw_output
+
+async def fail_execution(db: AsyncSession, execution: DBExecution, error: str, status: str = "failed") -> None:
+    execution.status = status
+    execution.error = error
+    execution.completed_at = utcnow()
+    await record_execution(db, execution)
+
+async def execute_run(
+    db: AsyncSession,
+    execution: DBExecution,
+    definition: CrewDefinition,
+    inputs: Optional[Dict[str, Any]],
+    completed_tasks: Optional[List[CompletedTask]] = None,
+    timeout_seconds: Optional[float] = None,
+    max_tokens: Optional[int] = None
+):
+    """
+    Wait for a scheduler slot, then run the crew within its wall-clock and token budgets.
+
+    Budgets come from the run, then the crew, then the EXECUTION_* defaults. Raises
+    ExecutionStopped when the run is cancelled or over budget. Recording how the run
+    ended is left to the caller.
+    """
+    control = start_run_control(
+        execution.id,
+        timeout_seconds=timeout_seconds or definition.max_duration_seconds,
+        max_tokens=max_tokens or definition.max_tokens
+    )
+
+    async def run():
+        async with execution_scheduler.slot(definition.crew_id, execution.owner, execution.priority or "interactive"):
+            execution.status = "in_progress"
+            execution.started_at = utcnow()
+            await db.commit()
+
+            control.start_clock()
+            try:
+                return await asyncio.wait_for(
+                    run_crew(definition, inputs, execution.id, completed_tasks),
+                    control.remaining_seconds()
+                )
+            except asyncio.TimeoutError:
+                control.check()
+                raise
+
+    task = asyncio.create_task(run())
+    control.attach(task)
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if control.stopped is None or control.released:
+            # Cancelled from outside, e.g. on shutdown: the caller decides what happens to the row
+            control.release("Run abandoned")
+            raise
+        raise ExecutionStopped(control.stopped.reason, control.stopped.status)
+    finally:
+        finish_run_control(execution.id)
+        # Saved with the outcome by the caller, retries and resumes add to the earlier attempts.
+        # A released run's usage is saved when its row is handed back, see _abandon_executions.
+        execution.total_tokens = (execution.total_tokens or 0) + control.tokens_used
+        execution.prompt_tokens = (execution.prompt_tokens or 0) + control.prompt_tokens
+        execution.cached_prompt_tokens = (execution.cached_prompt_tokens or 0) + control.cached_prompt_tokens
@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.blob_store import get_blob_store
+from app.database import utcnow
+from app.models import Execution as DBExecution, ExecutionIdempotencyKey
+from app.run_control import ACTIVE_STATUSES
+
+load_dotenv()
+
+# How long an Idempotency-Key keeps pointing at its execution
+IDEMPOTENCY_WINDOW_SECONDS = int(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", "86400"))
+# How often to check on a keyed execution that is running in another process
+IDEMPOTENCY_POLL_INTERVAL = float(os.getenv("IDEMPOTENCY_POLL_INTERVAL", "1.0"))
+# Share one run between identical concurrent requests even without an Idempotency-Key
+EXECUTION_COALESCE = os.getenv("EXECUTION_COALESCE", "true").lower() == "true"
+
+def request_fingerprint(crew_id: int, version: Optional[int], inputs: Optional[Dict[str, Any]], allowed_tools: Optional[list]) -> str:
+    """Hash of everything that determines what a run does"""
+    payload = json.dumps(
+        {"crew_id": crew_id, "version": version, "inputs": inputs or {}, "allowed_tools": allowed_tools or []},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class FlightAbandoned(Exception):
+    """Outcome of a shared call whose leading request was cancelled. The run itself may go on."""
+
+class SingleFlight:
+    """Runs one call per key at a time. Callers arriving while it is in flight share its outcome."""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]],
+                 fallback: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """
+        Run fn, or share the outcome of the call in flight. When the leading request is cancelled,
+        the followers run fallback instead, which can look for the run in the database.
+        """
+        if key in self._calls:
+            self.coalesced += 1
+            try:
+                # Shielded so a follower that goes away does not cancel the shared call
+                return await asyncio.shield(self._calls[key])
+            except FlightAbandoned:
+                if fallback is None:
+                    raise
+                return await fallback()
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark the outcome as retrieved even when nobody else was waiting for it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Only the leader's request went away, the followers must not be cancelled with it
+            future.set_exception(FlightAbandoned(key))
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+execution_flights = SingleFlight()
+
+async def _execution_by_id(db: AsyncSession, execution_id: str) -> Optional[DBExecution]:
+    # Selected rather than db.get, the primary key of a partitioned table includes created_at
+    result = await db.execute(select(DBExecution).where(DBExecution.id == execution_id))
+    return result.scalar_one_or_none()
+
+async def find_idempotent_execution(db: AsyncSession, crew_id: int, idempotency_key: str) -> Tuple[Optional[str], Optional[DBExecution]]:
+    """
+    The execution id the key points at, and that execution when it was started within the
+    idempotency window. The id is passed to claim_idempotency_key to take the key over.
+    """
+    key = await db.get(ExecutionIdempotencyKey, (crew_id, idempotency_key))
+    if key is None:
+        return None, None
+    since = utcnow() - timedelta(seconds=IDEMPOTENCY_WINDOW_SECONDS)
+    if key.created_at is None or key.created_at < since:
+        return key.execution_id, None
+    return key.execution_id, await _execution_by_id(db, key.execution_id)
+
+async def claim_idempotency_key(db: AsyncSession, crew_id: int, idempotency_key: str,
+                                execution_id: str, held_by: Optional[str]) -> bool:
+    """
+    Point the key at a new execution in the current transaction. held_by is the execution it
+    pointed at when it was looked up, so only one of several processes racing for a free, failed
+    or expired key wins. On False the transaction was rolled back.
+    """
+    if held_by is None:
+        db.add(ExecutionIdempotencyKey(
+            crew_id=crew_id, idempotency_key=idempotency_key, execution_id=execution_id, created_at=utcnow()
+        ))
+        try:
+            await db.flush()
+        except IntegrityError:
+            await db.rollback()
+            return False
+        return True
+
+    result = await db.execute(
+        update(ExecutionIdempotencyKey)
+        .where(ExecutionIdempotencyKey.crew_id == crew_id)
+        .where(ExecutionIdempotencyKey.idempotency_key == idempotency_key)
+        .where(ExecutionIdempotencyKey.execution_id == held_by)
+        .values(execution_id=execution_id, created_at=utcnow())
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        return False
+    return True
+
+async def find_coalesced_execution(db: AsyncSession, crew_id: int, request_hash: str,
+                                   since: datetime) -> Optional[DBExecution]:
+    """Latest run of an identical request that is still running or finished after since"""
+    result = await db.execute(
+        select(DBExecution)
+        .where(DBExecution.crew_id == crew_id)
+        .where(DBExecution.request_hash == request_hash)
+        .where(or_(DBExecution.status.in_(ACTIVE_STATUSES), DBExecution.completed_at >= since))
+        .order_by(DBExecution.created_at.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+async def wait_for_execution(db: AsyncSession, execution: DBExecution) -> DBExecution:
+    """Poll an execution owned by another process until it finishes"""
+    while execution.status in ("queued", "in_progress"):
+        await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL)
+        await db.refresh(execution)
+    return execution
+
+async def load_execution_result(execution: DBExecution) -> str:
+    """Raw output of a completed execution, read back from the row or the blob store"""
+    if execution.result is not None:
+        return json.loads(execution.result)
+    data = await asyncio.to_thread(get_blob_store().get, execution.result_digest)
+    return json.loads(data)
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from crewai import LLM
+from dotenv import load_dotenv
+
+from app.cassette import cassette_call
+from app.rate_limit import (
+    LLM_RATE_LIMIT_RETRIES,
+    admission_controller,
+    estimate_tokens,
+    is_rate_limit_error,
+    limiter_key,
+    resolve_limits,
+    retry_after_seconds,
+)
+from app.run_control import get_run_control
+
+load_dotenv()
+
+# Mark the static start of every prompt as cacheable for providers with explicit cache controls
+LLM_PROMPT_CACHING = os.getenv("LLM_PROMPT_CACHING", "true").lower() == "true"
+# OpenAI caches long prompt prefixes without being asked, so it only needs the static part first
+CACHE_CONTROL_PROVIDERS = ("anthropic", "stub")
+STUB_PROMPT_CACHE_TTL = 300  # seconds, as Anthropic's ephemeral cache
+
+# LiteLLM model prefixes for each provider
+PROVIDER_PREFIXES = {
+    "anthropic": "anthropic",
+    "openai": "openai",
+    "openai_compatible": "openai",
+    "stub": "stub",  # answered locally, for tests and benchmarks without a provider
+}
+
+class UsageRecorder:
+    """
+    Per-call callback that captures the token usage of the completion response. LLM.call hands
+    the response's usage to every callback it was given, in the calling thread, so the recorder
+    never sees another call's usage. It is kept out of LiteLLM's global callbacks, see
+    ManagedLLM.set_callbacks.
+    """
+
+    def __init__(self):
+        self.usage = None
+
+    def log_success_event(self, kwargs, response_obj, start_time, end_time):
+        self.usage = response_obj.get("usage") if isinstance(response_obj, dict) else getattr(response_obj, "usage", None)
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, list):
+        return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+    return str(content or "")
+
+def _messages_text(messages: Union[str, List[Dict[str, Any]]]) -> str:
+    if isinstance(messages, str):
+        return messages
+    return "".join(_content_text(message.get("content")) for message in messages)
+
+def _usage_value(usage: Any, name: str) -> Any:
+    if usage is None:
+        return None
+    return usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+
+def cached_prompt_tokens(usage: Any) -> int:
+    """Prompt tokens read from the provider's prompt cache, as LiteLLM reports them for OpenAI and Anthropic"""
+    cached = _usage_value(_usage_value(usage, "prompt_tokens_details"), "cached_tokens")
+    if cached is None:
+        cached = _usage_value(usage, "cache_read_input_tokens")
+    return cached or 0
+
+def mark_cacheable_prefix(messages: Union[str, List[Dict[str, Any]]]) -> Union[str, List[Dict[str, Any]]]:
+    """
+    Copy of the messages with the system prompt marked as a cacheable prefix.
+
+    CrewAI puts the agent's role, goal, backstory and tool descriptions in the system prompt,
+    ahead of the task, so it is the same on every call of the agent in every run of the crew.
+    """
+    if isinstance(messages, str):
+        return messages
+    system = [index for index, message in enumerate(messages) if message.get("role") == "system"]
+    if not system:
+        return messages
+    marked = list(messages)
+    message = dict(marked[system[-1]])
+    if isinstance(message.get("content"), str):
+        message["content"] = [{"type": "text", "text": message["content"], "cache_control": {"type": "ephemeral"}}]
+    marked[system[-1]] = message
+    return marked
+
+class StubPromptCache:
+    """Prefixes seen in the last STUB_PROMPT_CACHE_TTL seconds, standing in for a provider's prompt cache"""
+
+    def __init__(self, ttl: float = STUB_PROMPT_CACHE_TTL):
+        self.ttl = ttl
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str) -> bool:
+        """Whether the prefix is cached. Either way it is cached for another ttl afterwards."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._expires.get(key, 0) > now
+            self._expires[key] = now + self.ttl
+            return cached
+
+stub_prompt_cache = StubPromptCache()
+
+def stub_completion(messages: Union[str, List[Dict[str, Any]]]) -> Tuple[str, SimpleNamespace]:
+    """
+    Answer of the stub provider: a deterministic final answer in CrewAI's format, and usage as
+    a provider reports it that caches the messages up to the last cache_control mark.
+    """
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    marks = [
+        index for index, message in enumerate(messages)
+        if isinstance(message.get("content"), list)
+        and any(isinstance(block, dict) and "cache_control" in block for block in message["content"])
+    ]
+    cached = 0
+    if marks:
+        prefix = messages[:marks[-1] + 1]
+        key = hashlib.sha256(json.dumps(prefix, sort_keys=True, default=str).encode()).hexdigest()
+        if stub_prompt_cache.hit(key):
+            cached = estimate_tokens(_messages_text(prefix))
+
+    answer = f"Thought: I now can give a great answer\nFinal Answer: Stub answer to: {_content_text(messages[-1].get('content'))[:200]}"
+    prompt_tokens = estimate_tokens(_messages_text(messages))
+    completion_tokens = estimate_tokens(answer)
+    return answer, SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=cached),
+    )
+
+class ManagedLLM(LLM):
+    """
+    CrewAI LLM whose calls pass through the admission controller.
+
+    Every call waits for its provider/model/key limiter, which spreads calls fairly across
+    executions, and rate-limited calls are retried after an adaptive backoff.
+    """
+
+    def __init__(self, *args, provider: str = "anthropic", execution_id: Optional[str] = None,
+                 requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None,
+                 max_concurrency: Optional[int] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.provider = provider
+        self.execution_id = execution_id or "default"
+        # Kept even after the run finishes, so a thread left behind by a cancelled run still stops
+        self.control = get_run_control(execution_id)
+        provider_model = self.model.split("/", 1)[-1]
+        self.limiter = admission_controller.limiter(
+            limiter_key(provider, provider_model, kwargs.get("api_key")),
+            resolve_limits(provider, provider_model, requests_per_minute, tokens_per_minute, max_concurrency),
+        )
+
+    def set_callbacks(self, callbacks: List[Any]):
+        """
+        LLM.call calls the callbacks it is given itself. CrewAI also assigns them to the
+        process-wide litellm.callbacks, where concurrent runs would replace each other's and
+        LiteLLM would report every call to every run's callbacks, so that is skipped.
+        """
+
+    def _call(self, messages, tools, callbacks, available_functions):
+        """Call the provider once, returning the result and the total tokens it reported"""
+        if self.control is not None:
+            self.control.check()
+            remaining = self.control.remaining_seconds()
+            if remaining is not None:
+                # Never wait on the provider past the run's deadline
+                self.timeout = max(remaining, 1.0)
+
+        def call_provider():
+            prompt = messages
+            if LLM_PROMPT_CACHING and self.provider in CACHE_CONTROL_PROVIDERS:
+                prompt = mark_cacheable_prefix(messages)
+            if self.provider == "stub":
+                result, usage = stub_completion(prompt)
+            else:
+                recorder = UsageRecorder()
+                result = LLM.call(
+                    self,
+                    prompt,
+                    tools=tools,
+                    callbacks=list(callbacks or []) + [recorder],
+                    available_functions=available_functions,
+                )
+                usage = recorder.usage
+            return {
+                "result": result,
+                "total_tokens": _usage_value(usage, "total_tokens"),
+                "prompt_tokens": _usage_value(usage, "prompt_tokens"),
+                "cached_prompt_tokens": cached_prompt_tokens(usage),
+            }
+
+        # Recorded and replayed calls keep their token counts, so budgets behave the same
+        response = cassette_call(
+            "llm",
+            {"model": self.model, "messages": messages, "tools": tools, "temperature": self.temperature, "stop": self.stop},
+            call_provider
+        )
+        result, total_tokens = response["result"], response["total_tokens"]
+        if self.control is not None:
+            self.control.add_tokens(total_tokens)
+            self.control.add_prompt_usage(response.get("prompt_tokens"), response.get("cached_prompt_tokens"))
+            self.control.check()
+        return result, total_tokens
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None):
+        if self.limiter is None:
+            return self._call(messages, tools, callbacks, available_functions)[0]
+
+        estimated = estimate_tokens(_messages_text(messages)) + (self.max_tokens or 0)
+        for attempt in range(LLM_RATE_LIMIT_RETRIES + 1):
+            # A cancelled or timed-out run stops waiting for the limiter too
+            self.limiter.acquire(self.execution_id, estimated, self.control.check if self.control is not None else None)
+            try:
+                result, total_tokens = self._call(messages, tools, callbacks, available_functions)
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                backoff = self.limiter.release(estimated, rate_limited=rate_limited, retry_after=retry_after_seconds(e))
+                if not rate_limited or attempt == LLM_RATE_LIMIT_RETRIES:
+                    raise
+                # The limiter holds back every caller until the backoff has passed
+                print(f"Rate limited by {self.model}, retrying in {backoff:.1f}s")
+                continue
+
+            self.limiter.release(estimated, actual_tokens=total_tokens)
+            return result
+
+def build_managed_llm(
+    provider: str,
+    model: str,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    api_version: Optional[str] = None,
+    execution_id: Optional[str] = None,
+    requests_per_minute: Optional[int] = None,
+    tokens_per_minute: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+) -> ManagedLLM:
+    """Configure the LLM for an agent. API keys are passed per client instead of via os.environ."""
+    prefix = PROVIDER_PREFIXES.get(provider, provider)
+    kwargs = {"model": f"{prefix}/{model}"}
+    if api_key:
+        kwargs["api_key"] = api_key
+    if provider == "openai_compatible" and base_url:
+        kwargs["base_url"] = base_url
+    if provider in ("openai", "openai_compatible") and api_version:
+        kwargs["api_version"] = api_version
+
+    return ManagedLLM(
+        provider=provider,
+        execution_id=execution_id,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        max_concurrency=max_concurrency,
+        **kwargs,
+    )
@@ -1,12 +1,31 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import crews  # Remove agents and tasks imports for now
-from app.database import init_db
+from fastapi.middleware.gzip import GZipMiddleware
+from dotenv import load_dotenv
+from app.routers import crews, executions  # Remove agents and tasks imports for now
+from app.database import DB_AUTO_CREATE, init_db
+from app.responses import FastJSONResponse
+from app.partitions import partitioning_enabled, partition_maintenance_loop
+from app.retention import retention_enabled, retention_loop
+from app.batches import cancel_batches
+from app.run_control import execution_supervisor_loop, release_owned_executions, release_run_controls
+from app.tools.confluence_mirror import mirror_enabled as confluence_mirror_enabled, confluence_mirror_loop
+from app.tools.jira_mirror import mirror_enabled as jira_mirror_enabled, jira_mirror_loop
+import asyncio
+import os
+
+load_dotenv()
+
+# "gzip", "br" (requires brotli-asgi, falls back to gzip for clients without Brotli) or "off"
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "gzip").lower()
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024"))  # bytes
+RESPONSE_COMPRESSION_LEVEL = int(os.getenv("RESPONSE_COMPRESSION_LEVEL", "5"))  # gzip 1-9, Brotli quality 0-11
 
 app = FastAPI(
     title="CrewAI API",
     description="API for managing and interacting with CrewAI agents and crews",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # Configure CORS
@@ -18,15 +37,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses above the size threshold, including streamed listings and results
+if RESPONSE_COMPRESSION == "br":
+    try:
+        from brotli_asgi import BrotliMiddleware
+        app.add_middleware(
+            BrotliMiddleware,
+            quality=RESPONSE_COMPRESSION_LEVEL,
+            minimum_size=RESPONSE_COMPRESSION_MIN_SIZE,
+            gzip_fallback=True
+        )
+    except ImportError:
+        print("brotli-asgi is not installed, falling back to gzip compression")
+        RESPONSE_COMPRESSION = "gzip"
+if RESPONSE_COMPRESSION == "gzip":
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=RESPONSE_COMPRESSION_MIN_SIZE,
+        compresslevel=min(RESPONSE_COMPRESSION_LEVEL, 9)
+    )
+
 # Include routers
 app.include_router(crews.router, prefix="/api/crews", tags=["crews"])
+app.include_router(executions.router, prefix="/api/executions", tags=["executions"])
 # Remove the other routers for now
 # app.include_router(agents.router, prefix="/api/agents", tags=["agents"])
 # app.include_router(tasks.router, prefix="/api/tasks", tags=["tasks"])
 
 @app.on_event("startup")
 async def startup_event():
-    await init_db()
+    # app.serve migrates once before forking its workers
+    if DB_AUTO_CREATE and not getattr(app.state, "schema_ready", False):
+        await init_db()
+    app.state.supervisor_task = asyncio.create_task(execution_supervisor_loop())
+    # app.serve runs the maintenance jobs in one of its workers only
+    if not getattr(app.state, "background_jobs", True):
+        return
+    if partitioning_enabled():
+        app.state.partition_task = asyncio.create_task(partition_maintenance_loop())
+    if retention_enabled():
+        app.state.retention_task = asyncio.create_task(retention_loop())
+    if confluence_mirror_enabled():
+        app.state.confluence_mirror_task = asyncio.create_task(confluence_mirror_loop())
+    if jira_mirror_enabled():
+        app.state.jira_mirror_task = asyncio.create_task(jira_mirror_loop())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Runs still going once the server stopped waiting for requests are handed back
+    release_run_controls()
+    await cancel_batches()
+    await release_owned_executions()
 
 @app.get("/")
 async def root():
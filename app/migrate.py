@@ -0,0 +1,89 @@
+"""
+Bring the database schema up to date. Run once per deploy, before starting API or worker processes:
+
+    python -m app.migrate
+"""
+import asyncio
+import os
+
+from sqlalchemy import inspect
+
+from app.database import Base, engine
+from app.models import Execution as DBExecution  # also registers the other tables on Base.metadata
+from app.partitions import partitioning_enabled
+
+ALEMBIC_INI = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "alembic.ini"))
+ALEMBIC_SCRIPTS = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "alembic"))
+# Schema that earlier versions created at startup without tracking it in alembic_version
+BASELINE_REVISION = "update_crew_id_to_uuid"
+
+def _alembic(connection, action: str, revision: str = "head") -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", ALEMBIC_SCRIPTS)
+    config.attributes["connection"] = connection
+    getattr(command, action)(config, revision)
+
+def _partition_executions(connection) -> None:
+    """
+    Rebuild the plain executions table made by create_all as a partitioned table, with the
+    partition_executions revision that converts existing databases, then restore its indexes.
+    """
+    from alembic.config import Config
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+    from alembic.script import ScriptDirectory
+
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", ALEMBIC_SCRIPTS)
+    revision = ScriptDirectory.from_config(config).get_revision("partition_executions")
+    with Operations.context(MigrationContext.configure(connection)):
+        revision.module.upgrade()
+
+    # The rebuilt table only gets the created_at indexes of that revision
+    existing = {index["name"] for index in inspect(connection).get_indexes("executions")}
+    for index in DBExecution.__table__.indexes:
+        if index.name not in existing:
+            index.create(connection)
+
+def _has_current_columns(connection, tables) -> bool:
+    """Whether every existing table already has all the columns of the models"""
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        if table.name in tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            if not {column.name for column in table.columns} <= existing:
+                return False
+    return True
+
+def _migrate(connection) -> str:
+    tables = set(inspect(connection).get_table_names())
+    if "alembic_version" in tables:
+        _alembic(connection, "upgrade")
+        return "upgraded to head"
+    if not tables:
+        # A new database gets the current schema and is marked as up to date
+        Base.metadata.create_all(connection)
+        if partitioning_enabled() and connection.dialect.name == "postgresql":
+            _partition_executions(connection)
+        _alembic(connection, "stamp")
+        return "created and stamped at head"
+    if _has_current_columns(connection, tables):
+        # Created at startup by this version, only tracking is missing
+        Base.metadata.create_all(connection)
+        _alembic(connection, "stamp")
+        return "stamped at head"
+    # Databases created by earlier versions at startup have the baseline schema. create_all
+    # would not add the columns of later revisions to their tables, so they are upgraded.
+    _alembic(connection, "stamp", BASELINE_REVISION)
+    _alembic(connection, "upgrade")
+    return f"stamped at {BASELINE_REVISION} and upgraded to head"
+
+async def migrate() -> str:
+    async with engine.begin() as conn:
+        return await conn.run_sync(_migrate)
+
+if __name__ == "__main__":
+    print(f"Database schema {asyncio.run(migrate())}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Table, Boolean, Text, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Table, Boolean, Text, DateTime, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -20,10 +20,13 @@ class Crew(Base):
     description = Column(Text)
     input_variables = Column(Text, nullable=True)  # JSON string of input variables
     output_variables = Column(Text, nullable=True)  # JSON string of output variables
+    max_duration_seconds = Column(Integer, nullable=True)  # wall-clock budget per run
+    max_tokens = Column(Integer, nullable=True)  # LLM token budget per run
+    version = Column(Integer, default=1)  # bumped on every update
     
     # Relationships
     agents = relationship("Agent", secondary=crew_agent_association, back_populates="crews")
-    tasks = relationship("Task", back_populates="crew")
+    tasks = relationship("Task", back_populates="crew", order_by="Task.id")  # run in creation order
     executions = relationship("Execution", back_populates="crew")
 
 class Agent(Base):
@@ -34,11 +37,15 @@ class Agent(Base):
     goal = Column(Text)
     backstory = Column(Text)
     verbose = Column(Boolean, default=True)
-    llm_provider = Column(String, default="anthropic")  # anthropic, openai, or openai_compatible
+    llm_provider = Column(String, default="anthropic")  # anthropic, openai, openai_compatible, or stub
     llm_model = Column(String, default="claude-3-haiku-20240307")  # model name/version
     llm_base_url = Column(String, nullable=True)  # for OpenAI-compatible APIs
     llm_api_key = Column(String, nullable=True)  # for custom API keys
     llm_api_version = Column(String, nullable=True)  # for OpenAI API version
+    llm_requests_per_minute = Column(Integer, nullable=True)  # admission limits for this agent's LLM
+    llm_tokens_per_minute = Column(Integer, nullable=True)
+    llm_max_concurrency = Column(Integer, nullable=True)
+    tool_output_tokens = Column(Integer, nullable=True)  # caps the output budget of every tool this agent uses
     allowed_tools = Column(Text, nullable=True)  # JSON string of allowed tools
     
     # Relationships
@@ -64,19 +71,115 @@ class Task(Base):
     crew = relationship("Crew", back_populates="tasks")
     agent = relationship("Agent", back_populates="tasks")
 
+class ExecutionBatch(Base):
+    __tablename__ = "execution_batches"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    crew_id = Column(Integer, ForeignKey("crews.id"))
+    status = Column(String)  # "queued", "in_progress", "completed"
+    total_items = Column(Integer, default=0)
+    completed_items = Column(Integer, default=0)
+    failed_items = Column(Integer, default=0)
+    concurrency = Column(Integer, default=4)
+    max_retries = Column(Integer, default=1)
+    allowed_tools = Column(Text, nullable=True)  # JSON string of allowed tools
+    created_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+
+    # Relationships
+    executions = relationship("Execution", back_populates="batch")
+
 class Execution(Base):
     __tablename__ = "executions"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     crew_id = Column(Integer, ForeignKey("crews.id"))
-    status = Column(String)  # "completed", "failed", "in_progress"
-    result = Column(Text, nullable=True)
+    crew_version = Column(Integer, nullable=True)  # version of the crew the run was started with
+    batch_id = Column(String, ForeignKey("execution_batches.id"), nullable=True, index=True)
+    attempts = Column(Integer, default=0)  # number of times the run was started
+    status = Column(String)  # "queued", "in_progress", "completed", "failed"
+    priority = Column(String, nullable=True)  # scheduler lane: "interactive", "normal" or "batch"
+    owner = Column(String, nullable=True)  # tenant/owner key used for fair scheduling
+    result = Column(Text, nullable=True)  # JSON string of the raw output, only when small enough to keep inline
+    result_digest = Column(String(64), nullable=True)  # SHA-256 of the JSON-encoded result in the blob store
+    result_size = Column(Integer, nullable=True)  # size of the JSON-encoded result in bytes
+    result_preview = Column(Text, nullable=True)  # first characters of the raw output
+    tasks_output_digest = Column(String(64), nullable=True)  # blob digest of the per-task outputs
     error = Column(Text, nullable=True)
     input_variables = Column(Text, nullable=True)  # JSON string of input variables
     task_params = Column(Text, nullable=True)  # JSON string of task parameters
     allowed_tools = Column(Text, nullable=True)  # JSON string of allowed tools
-    created_at = Column(DateTime, default=datetime.utcnow)
+    timeout_seconds = Column(Float, nullable=True)  # per-run budget overrides, read by queue workers
+    max_tokens = Column(Integer, nullable=True)
+    total_tokens = Column(Integer, nullable=True)  # LLM usage over every attempt of the run
+    prompt_tokens = Column(Integer, nullable=True)
+    cached_prompt_tokens = Column(Integer, nullable=True)  # prompt tokens served from the provider's prompt cache
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # partition key when EXECUTIONS_PARTITIONED
+    started_at = Column(DateTime, nullable=True)  # when the scheduler granted the run a slot
+    worker_id = Column(String, nullable=True)  # process that owns the run, unset while waiting in the queue
+    heartbeat_at = Column(DateTime, nullable=True)  # last sign of life from the owning process
+    cancel_requested = Column(Boolean, default=False)
+    idempotency_key = Column(String(255), nullable=True)
+    request_hash = Column(String(64), nullable=True)  # fingerprint of the crew version, inputs and tools
     completed_at = Column(DateTime, nullable=True)
     
     # Relationships
-    crew = relationship("Crew", back_populates="executions") 
\ No newline at end of file
+    crew = relationship("Crew", back_populates="executions")
+    batch = relationship("ExecutionBatch", back_populates="executions")
+
+    __table_args__ = (
+        Index("ix_executions_crew_id_created_at", "crew_id", "created_at"),
+        Index("ix_executions_status_heartbeat_at", "status", "heartbeat_at"),
+        Index("ix_executions_crew_id_idempotency_key", "crew_id", "idempotency_key"),
+        Index("ix_executions_status_worker_id_created_at", "status", "worker_id", "created_at"),
+    ) 
+
+class ExecutionTaskOutput(Base):
+    """Checkpoint of one finished task, written as soon as the task completes"""
+    __tablename__ = "execution_task_outputs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # No foreign key: a partitioned executions table cannot be referenced by id alone
+    execution_id = Column(String, index=True)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="SET NULL"), nullable=True)
+    task_index = Column(Integer)  # position of the task in the crew
+    agent_role = Column(String, nullable=True)
+    description = Column(Text, nullable=True)
+    output = Column(Text, nullable=True)  # JSON string of the raw output, only when small enough to keep inline
+    output_digest = Column(String(64), nullable=True)  # SHA-256 of the JSON-encoded output in the blob store
+    output_size = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("execution_id", "task_index", name="uq_execution_task_outputs_task"),
+    )
+
+class ExecutionIdempotencyKey(Base):
+    """
+    The execution an Idempotency-Key points at. The primary key keeps a key unique per crew
+    across processes, which a partitioned executions table cannot do on its own.
+    """
+    __tablename__ = "execution_idempotency_keys"
+
+    crew_id = Column(Integer, ForeignKey("crews.id"), primary_key=True)
+    idempotency_key = Column(String(255), primary_key=True)
+    # No foreign key: a partitioned executions table cannot be referenced by id alone
+    execution_id = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)  # when the key was last pointed at a new run
+
+class ExecutionRollup(Base):
+    __tablename__ = "execution_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    crew_id = Column(Integer, ForeignKey("crews.id"))
+    granularity = Column(String)  # "hour" or "day"
+    bucket_start = Column(DateTime)
+    runs = Column(Integer, default=0)
+    completed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    total_duration_seconds = Column(Float, default=0.0)
+    max_duration_seconds = Column(Float, default=0.0)
+
+    __table_args__ = (
+        UniqueConstraint("crew_id", "granularity", "bucket_start", name="uq_execution_rollups_bucket"),
+    )
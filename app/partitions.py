@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+from datetime import date, datetime, UTC
+from typing import List
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from app.database import DATABASE_TYPE, engine
+
+load_dotenv()
+
+# Monthly range partitioning of the executions table (PostgreSQL only)
+EXECUTIONS_PARTITIONED = os.getenv("EXECUTIONS_PARTITIONED", "false").lower() == "true"
+EXECUTION_PARTITIONS_AHEAD = int(os.getenv("EXECUTION_PARTITIONS_AHEAD", "3"))
+EXECUTION_PARTITION_CHECK_INTERVAL = int(os.getenv("EXECUTION_PARTITION_CHECK_INTERVAL", "86400"))
+
+def partitioning_enabled() -> bool:
+    return EXECUTIONS_PARTITIONED and DATABASE_TYPE != "sqlite"
+
+def month_start(value: date, offset: int = 0) -> date:
+    """Return the first day of the month `offset` months after the month of `value`"""
+    index = value.year * 12 + value.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(start: date) -> str:
+    start = month_start(start)
+    return f"executions_y{start.year:04d}m{start.month:02d}"
+
+def create_partition_sql(start: date) -> str:
+    start = month_start(start)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF executions "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{month_start(start, 1).isoformat()}')"
+    )
+
+def partition_range(first: date, last: date) -> List[date]:
+    """Return the start of every month from `first` to `last`, inclusive"""
+    months = []
+    current = month_start(first)
+    while current <= last:
+        months.append(current)
+        current = month_start(current, 1)
+    return months
+
+async def ensure_execution_partitions(months_ahead: int = EXECUTION_PARTITIONS_AHEAD) -> List[str]:
+    """Create the partitions for the current month and the next `months_ahead` months"""
+    today = datetime.now(UTC).date()
+    months = partition_range(today, month_start(today, months_ahead))
+    async with engine.begin() as conn:
+        for start in months:
+            await conn.execute(text(create_partition_sql(start)))
+    return [partition_name(start) for start in months]
+
+async def detach_execution_partition(year: int, month: int) -> str:
+    """Detach a monthly partition. The detached table can then be archived or dropped."""
+    name = partition_name(date(year, month, 1))
+    async with engine.begin() as conn:
+        await conn.execute(text(f"ALTER TABLE executions DETACH PARTITION {name}"))
+    return name
+
+async def partition_maintenance_loop():
+    """Background job keeping future partitions created ahead of time"""
+    while True:
+        try:
+            await ensure_execution_partitions()
+        except Exception as e:
+            print(f"Error creating execution partitions: {str(e)}")
+        await asyncio.sleep(EXECUTION_PARTITION_CHECK_INTERVAL)
+
+if __name__ == "__main__":
+    # python -m app.partitions ensure
+    # python -m app.partitions detach 2024-01
+    command = sys.argv[1] if len(sys.argv) > 1 else "ensure"
+    if command == "ensure":
+        print(asyncio.run(ensure_execution_partitions()))
+    elif command == "detach" and len(sys.argv) > 2:
+        year, month = sys.argv[2].split("-")
+        print(asyncio.run(detach_execution_partition(int(year), int(month))))
+    else:
+        print("Usage: python -m app.partitions [ensure | detach YYYY-MM]")
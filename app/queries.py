@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.models import Crew as DBCrew, Agent as DBAgent, Task as DBTask
+
+@dataclass
+class CrewGraph:
+    """A crew with its agents and tasks, with agents indexed for constant-time lookups"""
+    crew: DBCrew
+    agents_by_id: Dict[int, DBAgent]
+
+    @property
+    def agents(self) -> List[DBAgent]:
+        return self.crew.agents
+
+    @property
+    def tasks(self) -> List[DBTask]:
+        return self.crew.tasks
+
+    def agent_for(self, task: DBTask) -> Optional[DBAgent]:
+        # Looked up by foreign key, task.agent would lazy load inside an async session
+        return self.agents_by_id.get(task.agent_id)
+
+def crew_graph_options() -> tuple:
+    """Loader options that fetch a crew's agents and tasks in one query each, whatever their number"""
+    return (selectinload(DBCrew.agents), selectinload(DBCrew.tasks))
+
+def index_crew_graph(crew: DBCrew) -> CrewGraph:
+    """Index a crew loaded with crew_graph_options()"""
+    return CrewGraph(
+        crew=crew,
+        agents_by_id={agent.id: agent for agent in crew.agents},
+    )
+
+async def load_crew_graph(db: AsyncSession, crew_id: int) -> Optional[CrewGraph]:
+    """Load a crew with its agents and tasks in three queries"""
+    result = await db.execute(
+        select(DBCrew)
+        .where(DBCrew.id == crew_id)
+        .options(*crew_graph_options())
+    )
+    crew = result.scalar_one_or_none()
+    return index_crew_graph(crew) if crew else None
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Per provider or provider/model limits, e.g.
+# LLM_RATE_LIMITS={"anthropic": {"rpm": 50, "tpm": 40000}, "openai/gpt-4o": {"rpm": 500, "concurrency": 20}}
+LLM_RATE_LIMITS = json.loads(os.getenv("LLM_RATE_LIMITS", "{}"))
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60.0"))
+
+@dataclass
+class RateLimits:
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+    max_concurrency: Optional[int] = None
+
+def resolve_limits(
+    provider: str,
+    model: Optional[str],
+    requests_per_minute: Optional[int] = None,
+    tokens_per_minute: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+) -> RateLimits:
+    """Combine LLM_RATE_LIMITS (provider, then provider/model) with limits set on the agent's LLMConfig"""
+    merged = {}
+    for key in (provider, f"{provider}/{model}"):
+        merged.update(LLM_RATE_LIMITS.get(key, {}))
+    return RateLimits(
+        requests_per_minute=requests_per_minute or merged.get("rpm"),
+        tokens_per_minute=tokens_per_minute or merged.get("tpm"),
+        max_concurrency=max_concurrency or merged.get("concurrency"),
+    )
+
+def limiter_key(provider: str, model: Optional[str], api_key: Optional[str]) -> str:
+    """Limits are tracked per provider, model and API key. The key itself is never kept."""
+    key_id = hashlib.sha256(api_key.encode()).hexdigest()[:12] if api_key else "default"
+    return f"{provider}/{model}/{key_id}"
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def resized(self, per_minute: int) -> "TokenBucket":
+        """A bucket with another capacity, as full as this one in proportion"""
+        bucket = TokenBucket(per_minute)
+        bucket.tokens = bucket.capacity * self.tokens / self.capacity
+        bucket.updated = self.updated
+        return bucket
+
+    def refill(self, now: float, scale: float = 1.0) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate * scale)
+        self.updated = now
+
+    def wait_time(self, amount: float, scale: float = 1.0) -> float:
+        # Requests larger than the bucket are let through once it is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / (self.rate * scale)
+
+class ProviderLimiter:
+    """
+    Token buckets for one provider/model/key, shared by every execution.
+
+    Waiting calls are granted round-robin across executions so one busy execution cannot
+    starve the others. A 429 blocks the limiter for the retry-after period and halves the
+    effective rate, which then recovers gradually on success.
+    """
+
+    def __init__(self, limits: RateLimits):
+        self.limits = limits
+        self.requests = TokenBucket(limits.requests_per_minute) if limits.requests_per_minute else None
+        self.tokens = TokenBucket(limits.tokens_per_minute) if limits.tokens_per_minute else None
+        self.condition = threading.Condition()
+        self.waiting: "OrderedDict[str, deque]" = OrderedDict()
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.scale = 1.0
+        self.consecutive_rate_limits = 0
+        self.granted = 0
+        self.rate_limited = 0
+
+    @staticmethod
+    def _bucket(current: Optional[TokenBucket], per_minute: Optional[int]) -> Optional[TokenBucket]:
+        if not per_minute:
+            return None
+        return current.resized(per_minute) if current else TokenBucket(per_minute)
+
+    def update(self, limits: RateLimits) -> None:
+        """
+        Apply changed limits without dropping waiting calls. Buckets keep their level in
+        proportion, so agents with different limits on one key do not refill them on every call.
+        """
+        with self.condition:
+            self.limits = limits
+            self.requests = self._bucket(self.requests, limits.requests_per_minute)
+            self.tokens = self._bucket(self.tokens, limits.tokens_per_minute)
+            self.condition.notify_all()
+
+    def _is_next(self, execution_id: str, ticket: object) -> bool:
+        first = next(iter(self.waiting))
+        return first == execution_id and self.waiting[execution_id][0] is ticket
+
+    def _wait_time(self, now: float, estimated_tokens: int) -> float:
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.limits.max_concurrency and self.in_flight >= self.limits.max_concurrency:
+            return 1.0  # woken up early by release()
+        waits = [0.0]
+        if self.requests:
+            self.requests.refill(now, self.scale)
+            waits.append(self.requests.wait_time(1, self.scale))
+        if self.tokens:
+            self.tokens.refill(now, self.scale)
+            waits.append(self.tokens.wait_time(estimated_tokens, self.scale))
+        return max(waits)
+
+    def _leave(self, execution_id: str, ticket: object) -> None:
+        queue = self.waiting[execution_id]
+        queue.remove(ticket)
+        if not queue:
+            del self.waiting[execution_id]
+        self.condition.notify_all()
+
+    def acquire(self, execution_id: str, estimated_tokens: int, check: Optional[Callable[[], None]] = None) -> None:
+        """
+        Wait for the limits to admit a call. check is called about once a second while waiting,
+        and whatever it raises, e.g. when the run is cancelled, gives up the place in the queue.
+        """
+        ticket = object()
+        with self.condition:
+            self.waiting.setdefault(execution_id, deque()).append(ticket)
+            while True:
+                if check is not None:
+                    try:
+                        check()
+                    except BaseException:
+                        self._leave(execution_id, ticket)
+                        raise
+                timeout = 1.0
+                if self._is_next(execution_id, ticket):
+                    timeout = self._wait_time(time.monotonic(), estimated_tokens)
+                    if timeout <= 0:
+                        break
+                self.condition.wait(timeout=min(timeout, 1.0))
+
+            if self.requests:
+                self.requests.tokens -= 1
+            if self.tokens:
+                self.tokens.tokens -= min(estimated_tokens, self.tokens.capacity)
+            self.in_flight += 1
+            self.granted += 1
+
+            # Rotate so the next grant goes to another execution
+            queue = self.waiting[execution_id]
+            queue.popleft()
+            if queue:
+                self.waiting.move_to_end(execution_id)
+            else:
+                del self.waiting[execution_id]
+            self.condition.notify_all()
+
+    def release(self, estimated_tokens: int, actual_tokens: Optional[int] = None, rate_limited: bool = False,
+                retry_after: Optional[float] = None) -> Optional[float]:
+        """Finish a call. Returns the backoff to apply before retrying when the call was rate limited."""
+        with self.condition:
+            self.in_flight -= 1
+            backoff = None
+            if rate_limited:
+                self.rate_limited += 1
+                self.consecutive_rate_limits += 1
+                backoff = retry_after or min(
+                    LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** (self.consecutive_rate_limits - 1)
+                )
+                self.blocked_until = max(self.blocked_until, time.monotonic() + backoff)
+                self.scale = max(0.1, self.scale / 2)
+            else:
+                self.consecutive_rate_limits = 0
+                self.scale = min(1.0, self.scale + 0.05)
+                if self.tokens and actual_tokens is not None:
+                    # Correct the estimate taken at admission with the provider's count
+                    self.tokens.tokens -= actual_tokens - min(estimated_tokens, self.tokens.capacity)
+            self.condition.notify_all()
+            return backoff
+
+    def snapshot(self) -> dict:
+        with self.condition:
+            return {
+                "requests_per_minute": self.limits.requests_per_minute,
+                "tokens_per_minute": self.limits.tokens_per_minute,
+                "max_concurrency": self.limits.max_concurrency,
+                "in_flight": self.in_flight,
+                "waiting": sum(len(queue) for queue in self.waiting.values()),
+                "waiting_executions": len(self.waiting),
+                "rate_scale": round(self.scale, 3),
+                "blocked_for_seconds": max(0.0, round(self.blocked_until - time.monotonic(), 3)),
+                "granted": self.granted,
+                "rate_limited": self.rate_limited,
+            }
+
+class AdmissionController:
+    """Process-wide registry of provider limiters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        self.processes = 1
+
+    def split(self, processes: int) -> None:
+        """Keep this process to its share of every limit, when that many processes call the same providers"""
+        with self._lock:
+            self.processes = max(1, processes)
+            self._limiters.clear()
+
+    def _share(self, limits: RateLimits) -> RateLimits:
+        if self.processes == 1:
+            return limits
+        share = lambda limit: max(1, limit // self.processes) if limit else limit
+        return RateLimits(
+            requests_per_minute=share(limits.requests_per_minute),
+            tokens_per_minute=share(limits.tokens_per_minute),
+            max_concurrency=share(limits.max_concurrency),
+        )
+
+    def limiter(self, key: str, limits: RateLimits) -> Optional[ProviderLimiter]:
+        if not (limits.requests_per_minute or limits.tokens_per_minute or limits.max_concurrency):
+            return None
+        with self._lock:
+            limits = self._share(limits)
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = ProviderLimiter(limits)
+            elif limiter.limits != limits:
+                limiter.update(limits)
+            return limiter
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {key: limiter.snapshot() for key, limiter in limiters.items()}
+
+admission_controller = AdmissionController()
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after")) if headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,26 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder is used without it
+    orjson = None
+
+def dumps(content: Any) -> bytes:
+    """Encode JSON-compatible content to bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """
+    Default response class of the API.
+
+    Endpoints that return one directly skip FastAPI's jsonable_encoder pass as well, so
+    large listings are encoded once, straight from plain dicts.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select, delete
+
+from app.blob_store import TOOL_OUTPUT_NAMESPACE, get_blob_store, store_payload
+from app.database import AsyncSessionLocal, utcnow
+from app.models import Execution as DBExecution, ExecutionIdempotencyKey, ExecutionTaskOutput as DBExecutionTaskOutput
+
+load_dotenv()
+
+def _days(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+# Executions older than this are moved to archive files and deleted (unset = keep forever)
+EXECUTION_RETENTION_DAYS = _days("EXECUTION_RETENTION_DAYS")
+# Executions older than this have their bulky payloads moved out of the row (unset = never)
+EXECUTION_COMPACT_AFTER_DAYS = _days("EXECUTION_COMPACT_AFTER_DAYS")
+# Full outputs behind cut tool outputs are deleted this long after they were stored (0 = keep)
+TOOL_OUTPUT_RETENTION_HOURS = float(os.getenv("TOOL_OUTPUT_RETENTION_HOURS", "24"))
+EXECUTION_ARCHIVE_PATH = os.getenv(
+    "EXECUTION_ARCHIVE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "archive"))
+)
+EXECUTION_ARCHIVE_FORMAT = os.getenv("EXECUTION_ARCHIVE_FORMAT", "jsonl")  # jsonl (gzip) or parquet (requires pyarrow)
+EXECUTION_COMPACTION_BATCH_SIZE = int(os.getenv("EXECUTION_COMPACTION_BATCH_SIZE", "500"))
+EXECUTION_COMPACTION_INTERVAL = int(os.getenv("EXECUTION_COMPACTION_INTERVAL", "3600"))
+
+# Columns written to archive files. Large payloads stay in the blob store, referenced by digest.
+ARCHIVE_COLUMNS = [
+    "id", "crew_id", "batch_id", "status", "priority", "owner", "error",
+    "input_variables", "task_params", "allowed_tools",
+    "result", "result_digest", "result_size", "result_preview", "tasks_output_digest",
+    "total_tokens", "prompt_tokens", "cached_prompt_tokens",
+    "created_at", "completed_at",
+]
+
+def retention_enabled() -> bool:
+    return EXECUTION_RETENTION_DAYS is not None or EXECUTION_COMPACT_AFTER_DAYS is not None or bool(TOOL_OUTPUT_RETENTION_HOURS)
+
+def _cutoff(days: int) -> datetime:
+    return utcnow() - timedelta(days=days)
+
+async def compact_batch(cutoff: datetime, batch_size: int = EXECUTION_COMPACTION_BATCH_SIZE) -> int:
+    """Move inline results of old executions to the blob store and drop task parameters"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(DBExecution)
+            .where(DBExecution.created_at < cutoff)
+            .where((DBExecution.result.is_not(None)) | (DBExecution.task_params.is_not(None)))
+            .order_by(DBExecution.created_at)
+            .limit(batch_size)
+        )
+        executions = result.scalars().all()
+
+        for execution in executions:
+            if execution.result is not None:
+                stored = await asyncio.to_thread(store_payload, json.loads(execution.result), 0)
+                execution.result_digest = stored["digest"]
+                execution.result_size = stored["size"]
+                execution.result_preview = execution.result_preview or stored["preview"]
+                execution.result = None
+            execution.task_params = None
+
+        await session.commit()
+        return len(executions)
+
+def _write_archive(rows: List[dict]) -> List[str]:
+    """Write rows into one file per month partition and return the written paths"""
+    import pandas as pd
+
+    df = pd.DataFrame(rows, columns=ARCHIVE_COLUMNS)
+    df["partition"] = pd.to_datetime(df["created_at"]).dt.strftime("%Y-%m")
+
+    paths = []
+    for partition, part in df.groupby("partition"):
+        directory = os.path.join(EXECUTION_ARCHIVE_PATH, "executions", f"month={partition}")
+        os.makedirs(directory, exist_ok=True)
+        part = part.drop(columns=["partition"])
+        if EXECUTION_ARCHIVE_FORMAT == "parquet":
+            path = os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet")
+            part.to_parquet(path, index=False, compression="zstd")
+        else:
+            path = os.path.join(directory, f"part-{uuid.uuid4().hex}.jsonl.gz")
+            part.to_json(path, orient="records", lines=True, date_format="iso", compression="gzip")
+        paths.append(path)
+    return paths
+
+async def archive_batch(cutoff: datetime, batch_size: int = EXECUTION_COMPACTION_BATCH_SIZE) -> int:
+    """Write a batch of expired executions to archive files, then delete them from the table"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(DBExecution)
+            .where(DBExecution.created_at < cutoff)
+            .where(DBExecution.completed_at.is_not(None))
+            .order_by(DBExecution.created_at)
+            .limit(batch_size)
+        )
+        executions = result.scalars().all()
+        if not executions:
+            return 0
+
+        rows = [{column: getattr(execution, column) for column in ARCHIVE_COLUMNS} for execution in executions]
+        # Rows are only deleted once the archive files are safely written
+        paths = await asyncio.to_thread(_write_archive, rows)
+
+        execution_ids = [execution.id for execution in executions]
+        await session.execute(
+            delete(DBExecutionTaskOutput).where(DBExecutionTaskOutput.execution_id.in_(execution_ids))
+        )
+        await session.execute(
+            delete(ExecutionIdempotencyKey).where(ExecutionIdempotencyKey.execution_id.in_(execution_ids))
+        )
+        await session.execute(delete(DBExecution).where(DBExecution.id.in_(execution_ids)))
+        await session.commit()
+        print(f"Archived {len(executions)} executions to {', '.join(paths)}")
+        return len(executions)
+
+async def run_retention_pass(max_batches: Optional[int] = None) -> dict:
+    """Run compaction and archival in small batches until nothing is left to do, then purge old tool outputs"""
+    stats = {"compacted": 0, "archived": 0, "tool_outputs_deleted": 0}
+
+    if EXECUTION_COMPACT_AFTER_DAYS is not None:
+        cutoff = _cutoff(EXECUTION_COMPACT_AFTER_DAYS)
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            count = await compact_batch(cutoff)
+            stats["compacted"] += count
+            batches += 1
+            if count < EXECUTION_COMPACTION_BATCH_SIZE:
+                break
+            await asyncio.sleep(0)
+
+    if EXECUTION_RETENTION_DAYS is not None:
+        cutoff = _cutoff(EXECUTION_RETENTION_DAYS)
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            count = await archive_batch(cutoff)
+            stats["archived"] += count
+            batches += 1
+            if count < EXECUTION_COMPACTION_BATCH_SIZE:
+                break
+            await asyncio.sleep(0)
+
+    if TOOL_OUTPUT_RETENTION_HOURS:
+        stats["tool_outputs_deleted"] = await asyncio.to_thread(
+            get_blob_store(TOOL_OUTPUT_NAMESPACE).delete_older_than, TOOL_OUTPUT_RETENTION_HOURS * 3600
+        )
+
+    return stats
+
+async def retention_loop():
+    """Background job started by the application when a retention policy is configured"""
+    while True:
+        try:
+            stats = await run_retention_pass()
+            if any(stats.values()):
+                print(f"Retention pass: {stats}")
+        except Exception as e:
+            print(f"Error running retention pass: {str(e)}")
+        await asyncio.sleep(EXECUTION_COMPACTION_INTERVAL)
+
+if __name__ == "__main__":
+    print(asyncio.run(run_retention_pass()))
@@ -0,0 +1,181 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, func, delete, update, tuple_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from app.database import AsyncSessionLocal, naive_utc
+from app.models import Execution as DBExecution, ExecutionRollup as DBExecutionRollup
+
+GRANULARITIES = ("hour", "day")
+
+def bucket_start(value: datetime, granularity: str) -> datetime:
+    value = naive_utc(value)
+    if granularity == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def execution_duration(execution: DBExecution) -> float:
+    """Running time, from when the run got a slot. Time spent queued is not counted, runs that never started take 0."""
+    if not execution.started_at or not execution.completed_at:
+        return 0.0
+    return max((naive_utc(execution.completed_at) - naive_utc(execution.started_at)).total_seconds(), 0.0)
+
+async def record_execution(db: AsyncSession, execution: DBExecution) -> None:
+    """Add a finished execution to its hourly and daily rollup buckets in the current transaction"""
+    dialect = db.bind.dialect.name
+    insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+    greatest = func.greatest if dialect == "postgresql" else func.max
+    duration = execution_duration(execution)
+    completed = 1 if execution.status == "completed" else 0
+
+    for granularity in GRANULARITIES:
+        statement = insert(DBExecutionRollup).values(
+            crew_id=execution.crew_id,
+            granularity=granularity,
+            bucket_start=bucket_start(execution.created_at, granularity),
+            runs=1,
+            completed=completed,
+            failed=1 - completed,
+            total_duration_seconds=duration,
+            max_duration_seconds=duration,
+        )
+        # Increment in place so concurrent completions never lose updates
+        statement = statement.on_conflict_do_update(
+            index_elements=["crew_id", "granularity", "bucket_start"],
+            set_={
+                "runs": DBExecutionRollup.runs + 1,
+                "completed": DBExecutionRollup.completed + completed,
+                "failed": DBExecutionRollup.failed + (1 - completed),
+                "total_duration_seconds": DBExecutionRollup.total_duration_seconds + duration,
+                "max_duration_seconds": greatest(DBExecutionRollup.max_duration_seconds, duration),
+            },
+        )
+        await db.execute(statement)
+
+async def unrecord_execution(db: AsyncSession, execution: DBExecution) -> None:
+    """
+    Take a finished execution back out of its rollup buckets before it runs again, so a resumed
+    run is counted once, with its final outcome. The maximum duration is kept: the resumed run
+    ends later than the attempt it replaces, so it can only raise it.
+    """
+    if execution.completed_at is None:
+        return
+    duration = execution_duration(execution)
+    completed = 1 if execution.status == "completed" else 0
+
+    for granularity in GRANULARITIES:
+        await db.execute(
+            update(DBExecutionRollup)
+            .where(DBExecutionRollup.crew_id == execution.crew_id)
+            .where(DBExecutionRollup.granularity == granularity)
+            .where(DBExecutionRollup.bucket_start == bucket_start(execution.created_at, granularity))
+            .values(
+                runs=DBExecutionRollup.runs - 1,
+                completed=DBExecutionRollup.completed - completed,
+                failed=DBExecutionRollup.failed - (1 - completed),
+                total_duration_seconds=DBExecutionRollup.total_duration_seconds - duration,
+            )
+        )
+
+def _summarize(runs: int, completed: int, failed: int, total_duration: float) -> dict:
+    finished = completed + failed
+    return {
+        "runs": runs,
+        "completed": completed,
+        "failed": failed,
+        "success_rate": completed / finished if finished else None,
+        "average_duration_seconds": total_duration / runs if runs else None,
+    }
+
+async def get_execution_stats(
+    db: AsyncSession,
+    granularity: str = "day",
+    crew_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> dict:
+    """Aggregate rollup buckets. Cost depends on the number of buckets, not the number of executions."""
+    query = select(DBExecutionRollup).where(DBExecutionRollup.granularity == granularity)
+    if crew_id is not None:
+        query = query.where(DBExecutionRollup.crew_id == crew_id)
+    if since is not None:
+        query = query.where(DBExecutionRollup.bucket_start >= bucket_start(since, granularity))
+    if until is not None:
+        query = query.where(DBExecutionRollup.bucket_start < naive_utc(until))
+    query = query.order_by(DBExecutionRollup.bucket_start)
+
+    result = await db.execute(query)
+    rollups = result.scalars().all()
+
+    crews = {}
+    buckets = []
+    for rollup in rollups:
+        totals = crews.setdefault(rollup.crew_id, {"runs": 0, "completed": 0, "failed": 0, "total": 0.0, "max": 0.0})
+        totals["runs"] += rollup.runs
+        totals["completed"] += rollup.completed
+        totals["failed"] += rollup.failed
+        totals["total"] += rollup.total_duration_seconds
+        totals["max"] = max(totals["max"], rollup.max_duration_seconds)
+        buckets.append({
+            "crew_id": rollup.crew_id,
+            "bucket_start": rollup.bucket_start.isoformat(),
+            **_summarize(rollup.runs, rollup.completed, rollup.failed, rollup.total_duration_seconds),
+            "max_duration_seconds": rollup.max_duration_seconds,
+        })
+
+    overall = {"runs": 0, "completed": 0, "failed": 0, "total": 0.0}
+    for totals in crews.values():
+        for key in overall:
+            overall[key] += totals[key]
+
+    return {
+        "granularity": granularity,
+        "totals": _summarize(overall["runs"], overall["completed"], overall["failed"], overall["total"]),
+        "crews": [
+            {
+                "crew_id": crew,
+                **_summarize(totals["runs"], totals["completed"], totals["failed"], totals["total"]),
+                "max_duration_seconds": totals["max"],
+            } for crew, totals in crews.items()
+        ],
+        "buckets": buckets,
+    }
+
+async def rebuild_rollups(batch_size: int = 1000) -> int:
+    """Recompute all rollups from the finished executions still in the table"""
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(DBExecutionRollup))
+        count = 0
+        last = None
+        while True:
+            query = (
+                select(DBExecution)
+                .where(DBExecution.completed_at.is_not(None))
+                .options(load_only(
+                    DBExecution.crew_id, DBExecution.status, DBExecution.created_at,
+                    DBExecution.started_at, DBExecution.completed_at
+                ))
+                .order_by(DBExecution.created_at, DBExecution.id)
+                .limit(batch_size)
+            )
+            # Keyset pagination, each batch starts where the previous one ended instead of skipping rows
+            if last is not None:
+                query = query.where(tuple_(DBExecution.created_at, DBExecution.id) > last)
+            result = await session.execute(query)
+            executions = result.scalars().all()
+            for execution in executions:
+                await record_execution(session, execution)
+            count += len(executions)
+            if len(executions) < batch_size:
+                break
+            last = (executions[-1].created_at, executions[-1].id)
+        await session.commit()
+        return count
+
+if __name__ == "__main__":
+    print(f"Rebuilt rollups from {asyncio.run(rebuild_rollups())} executions")
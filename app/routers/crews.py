@@ -1,27 +1,56 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
-from typing import List, Optional, Dict, Any
-from crewai import Crew, Agent, Task
-from pydantic import BaseModel, Field
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, text, func
+from typing import List, Literal, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy.orm import defer
 import os
 import json
 import uuid
-from datetime import datetime, UTC
-
-from app.database import get_db
-from app.models import Crew as DBCrew, Agent as DBAgent, Task as DBTask, Execution as DBExecution
-from app.tools import get_available_tools, TOOL_DESCRIPTIONS
+from datetime import datetime, timedelta
+
+from app.blob_store import get_blob_store
+from app.cache import crew_cache, etag_matches, make_entry
+from app.checkpoints import CompletedTask, load_completed_tasks, load_task_outputs
+from app.batches import BATCH_MAX_CONCURRENCY, BATCH_MAX_ITEMS, parse_batch_file, start_batch
+from app.database import AsyncSessionLocal, get_db, naive_utc, utcnow
+from app.idempotency import (
+    EXECUTION_COALESCE,
+    claim_idempotency_key,
+    execution_flights,
+    find_coalesced_execution,
+    find_idempotent_execution,
+    load_execution_result,
+    request_fingerprint,
+    wait_for_execution,
+)
+from app.execution import CrewDefinition, load_crew_definition, execute_run, complete_execution, fail_execution
+from app.models import Crew as DBCrew, Agent as DBAgent, Task as DBTask, Execution as DBExecution, ExecutionBatch as DBExecutionBatch
+from app.queries import crew_graph_options, index_crew_graph, load_crew_graph
+from app.responses import FastJSONResponse, dumps
+from app.rollups import unrecord_execution
+from app.run_control import ACTIVE_STATUSES, ExecutionStopped, cancel_run, current_worker_id
+from app.work_queue import initial_worker_id, work_queue_enabled
 
 router = APIRouter()
 
+# Default window of the execution listings, 0 for no limit
+EXECUTION_LIST_WINDOW_DAYS = int(os.getenv("EXECUTION_LIST_WINDOW_DAYS", "90"))
+CREW_IMPORT_BATCH_SIZE = int(os.getenv("CREW_IMPORT_BATCH_SIZE", "100"))
+CREW_EXPORT_BATCH_SIZE = int(os.getenv("CREW_EXPORT_BATCH_SIZE", "100"))
+# Rows fetched from the server-side cursor per chunk of a streamed execution listing
+EXECUTION_LIST_STREAM_BATCH_SIZE = int(os.getenv("EXECUTION_LIST_STREAM_BATCH_SIZE", "200"))
+
 class LLMConfig(BaseModel):
-    provider: str = "anthropic"  # anthropic, openai, or openai_compatible
+    provider: str = "anthropic"  # anthropic, openai, openai_compatible, or stub
     model: str = "claude-3-5-haiku-20241022"
     base_url: Optional[str] = None  # for OpenAI-compatible APIs
     api_key: Optional[str] = None
     api_version: Optional[str] = None  # for OpenAI API version
+    requests_per_minute: Optional[int] = None  # overrides LLM_RATE_LIMITS for this provider/model/key
+    tokens_per_minute: Optional[int] = None
+    max_concurrency: Optional[int] = None
 
 class AgentConfig(BaseModel):
     role: str
@@ -30,6 +59,7 @@ class AgentConfig(BaseModel):
     verbose: bool = True
     llm_config: Optional[LLMConfig] = None
     allowed_tools: Optional[List[str]] = None
+    tool_output_tokens: Optional[int] = None  # caps TOOL_OUTPUT_MAX_TOKENS / TOOL_OUTPUT_BUDGETS for this agent
 
 class ParameterDefinition(BaseModel):
     name: str
@@ -52,6 +82,8 @@ class CrewConfig(BaseModel):
     description: Optional[str] = None
     input_variables: Optional[Dict[str, Dict[str, Any]]] = None
     output_variables: Optional[Dict[str, Dict[str, Any]]] = None
+    max_duration_seconds: Optional[int] = Field(None, gt=0)  # wall-clock budget per run
+    max_tokens: Optional[int] = Field(None, gt=0)  # LLM token budget per run
     agents: List[AgentConfig]
     tasks: List[TaskConfig]
 
@@ -62,136 +94,134 @@ class TaskExecutionParams(BaseModel):
 class CrewExecutionParams(BaseModel):
     inputs: Optional[Dict[str, Any]] = None
     allowed_tools: Optional[List[str]] = None
+    priority: Literal["interactive", "normal", "batch"] = "interactive"
+    owner: Optional[str] = None  # tenant/owner key, runs are shared fairly between owners
+    timeout_seconds: Optional[float] = Field(None, gt=0)  # overrides the crew's max_duration_seconds
+    max_tokens: Optional[int] = Field(None, gt=0)  # overrides the crew's max_tokens
 
-@router.post("/")
-async def create_crew(crew_config: CrewConfig, db: AsyncSession = Depends(get_db)):
-
-    from pprint import pprint
-    pprint(crew_config)
-    try:
-        print(f"Creating crew: {crew_config.name}")
-        # Check if crew name already exists
-        result = await db.execute(select(DBCrew).where(DBCrew.name == crew_config.name))
-        if result.scalar_one_or_none():
-            raise HTTPException(status_code=400, detail="Crew name already exists")
+class BatchExecutionParams(BaseModel):
+    items: List[Dict[str, Any]]  # one inputs dict per run
+    allowed_tools: Optional[List[str]] = None
+    concurrency: int = Field(4, ge=1, le=BATCH_MAX_CONCURRENCY)
+    max_retries: int = Field(1, ge=0, le=5)
+    priority: Literal["interactive", "normal", "batch"] = "batch"
+    owner: Optional[str] = None
+
+# Response models. Endpoints using them return FastJSONResponse directly, so the models
+# document the responses without a validation and encoding pass over every item.
+class CrewSummary(BaseModel):
+    id: int
+    name: str
 
-        # Create crew
-        db_crew = DBCrew(
-            name=crew_config.name,
-            description=crew_config.description
-        )
-        db.add(db_crew)
-        await db.flush()
-        print(f"Created crew with ID: {db_crew.id}")
+class CrewList(BaseModel):
+    crews: List[CrewSummary]
+
+class TaskDetail(TaskConfig):
+    id: int
+    agent_role: Optional[str] = None
+
+class CrewDetail(CrewConfig):
+    version: Optional[int] = None
+    tasks: List[TaskDetail]
+
+class ExecutionSummary(BaseModel):
+    id: str
+    crew_id: int
+    crew_name: Optional[str] = None
+    status: str
+    priority: Optional[str] = None
+    owner: Optional[str] = None
+    batch_id: Optional[str] = None
+    result_preview: Optional[str] = None
+    result_size: Optional[int] = None
+    result_digest: Optional[str] = None
+    error: Optional[str] = None
+    input_variables: Optional[Dict[str, Any]] = None
+    task_params: Optional[Any] = None
+    total_tokens: Optional[int] = None
+    prompt_tokens: Optional[int] = None
+    cached_prompt_tokens: Optional[int] = None
+    created_at: str
+    started_at: Optional[str] = None
+    completed_at: Optional[str] = None
+
+class ExecutionList(BaseModel):
+    since: Optional[datetime] = None  # start of the listing, the default window if none was given
+    executions: List[ExecutionSummary]
+
+def serialize_execution(execution: DBExecution, crew_name: str) -> dict:
+    """Summarize an execution for listings. The full result is fetched from /executions/{id}/result."""
+    return {
+        "id": execution.id,
+        "crew_id": execution.crew_id,
+        "crew_name": crew_name,
+        "status": execution.status,
+        "priority": execution.priority,
+        "owner": execution.owner,
+        "batch_id": execution.batch_id,
+        "result_preview": execution.result_preview,
+        "result_size": execution.result_size,
+        "result_digest": execution.result_digest,
+        "error": execution.error,
+        "input_variables": json.loads(execution.input_variables) if execution.input_variables else None,
+        "task_params": json.loads(execution.task_params) if execution.task_params else None,
+        "total_tokens": execution.total_tokens,
+        "prompt_tokens": execution.prompt_tokens,
+        "cached_prompt_tokens": execution.cached_prompt_tokens,
+        "created_at": execution.created_at.isoformat(),
+        "started_at": execution.started_at.isoformat() if execution.started_at else None,
+        "completed_at": execution.completed_at.isoformat() if execution.completed_at else None
+    }
 
-        # Create agents
-        agents = {}
-        for agent_config in crew_config.agents:
-            print(f"Creating agent with role: {agent_config.role}")
-            llm_config = agent_config.llm_config or LLMConfig()
-            db_agent = DBAgent(
-                role=agent_config.role,
-                goal=agent_config.goal,
-                backstory=agent_config.backstory,
-                verbose=agent_config.verbose,
-                llm_provider=llm_config.provider,
-                llm_model=llm_config.model,
-                llm_base_url=llm_config.base_url,
-                llm_api_key=llm_config.api_key,
-                llm_api_version=llm_config.api_version,
-                allowed_tools=json.dumps(agent_config.allowed_tools) if agent_config.allowed_tools else None
-            )
-            db.add(db_agent)
-            await db.flush()
-            print(f"Created agent with ID: {db_agent.id}")
-            agents[agent_config.role] = db_agent
-
-        # Create tasks
-        task_map = {}  # Map to store task IDs for dependency resolution
-        for task_config in crew_config.tasks:
-            print(f"Creating task for agent role: {task_config.agent_role}")
-            if task_config.agent_role not in agents:
-                raise HTTPException(status_code=400, detail=f"Agent role {task_config.agent_role} not found")
-            
-            db_task = DBTask(
-                description=task_config.description,
-                expected_output=task_config.expected_output,
-                input_parameters=json.dumps(task_config.input_parameters) if task_config.input_parameters else None,
-                context_variables=json.dumps(task_config.context_variables) if task_config.context_variables else None,
-                output_variables=json.dumps(task_config.output_variables) if task_config.output_variables else None,
-                dependencies=json.dumps(task_config.dependencies) if task_config.dependencies else None,
-                crew_id=db_crew.id,
-                agent_id=agents[task_config.agent_role].id
-            )
-            db.add(db_task)
-            await db.flush()
-            task_map[task_config.description] = db_task.id
-            print(f"Created task for agent {agents[task_config.agent_role].id}")
-
-        # Add agents to crew using the association table directly
-        for agent in agents.values():
-            await db.execute(
-                text("INSERT INTO crew_agent_association (crew_id, agent_id) VALUES (:crew_id, :agent_id)"),
-                {"crew_id": db_crew.id, "agent_id": agent.id}
-            )
-            print(f"Added agent {agent.id} to crew {db_crew.id}")
+async def run_execution(
+    db: AsyncSession,
+    execution: DBExecution,
+    definition: CrewDefinition,
+    inputs: Optional[Dict[str, Any]],
+    completed_tasks: Optional[List[CompletedTask]] = None,
+    timeout_seconds: Optional[float] = None,
+    max_tokens: Optional[int] = None
+) -> str:
+    """
+    Run a queued execution and record its outcome, turning failures into HTTP errors.
+    With the database work queue, wait for a worker to run it instead.
+    """
+    if work_queue_enabled():
+        execution = await wait_for_execution(db, execution)
+        if execution.status == "completed":
+            return await load_execution_result(execution)
+        raise HTTPException(status_code=409 if execution.status == "cancelled" else 500, detail=execution.error)
 
+    execution.attempts = (execution.attempts or 0) + 1
+    try:
+        result = await execute_run(db, execution, definition, inputs, completed_tasks, timeout_seconds, max_tokens)
+    except ExecutionStopped as e:
+        await fail_execution(db, execution, e.reason, status=e.status)
         await db.commit()
-        print("Successfully committed all changes")
-        return {"message": f"Crew {crew_config.name} created successfully"}
-
+        raise HTTPException(status_code=409 if e.status == "cancelled" else 504, detail=e.reason)
     except Exception as e:
-        print(f"Error creating crew: {str(e)}")
-        await db.rollback()
+        await fail_execution(db, execution, str(e))
+        await db.commit()
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/")
-async def list_crews(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(DBCrew))
-    crews = result.scalars().all()
-    return {"crews": [{"id": crew.id, "name": crew.name} for crew in crews]}
-
-@router.get("/executions")
-async def list_all_executions(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(DBExecution, DBCrew.name.label('crew_name'))
-        .join(DBCrew, DBExecution.crew_id == DBCrew.id)
-        .order_by(DBExecution.created_at.desc())
-    )
-    executions = result.all()
-    
-    return {
-        "executions": [
-            {
-                "id": execution.Execution.id,
-                "crew_id": execution.Execution.crew_id,
-                "crew_name": execution.crew_name,
-                "status": execution.Execution.status,
-                "result": json.loads(execution.Execution.result) if execution.Execution.result else None,
-                "error": execution.Execution.error,
-                "input_variables": json.loads(execution.Execution.input_variables) if execution.Execution.input_variables else None,
-                "task_params": json.loads(execution.Execution.task_params) if execution.Execution.task_params else None,
-                "created_at": execution.Execution.created_at.isoformat(),
-                "completed_at": execution.Execution.completed_at.isoformat() if execution.Execution.completed_at else None
-            } for execution in executions
-        ]
-    }
-
-@router.get("/{crew_id}")
-async def get_crew(crew_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(DBCrew)
-        .where(DBCrew.id == crew_id)
-        .options(
-            selectinload(DBCrew.agents),
-            selectinload(DBCrew.tasks)
-        )
-    )
-    crew = result.scalar_one_or_none()
-    
-    if not crew:
-        raise HTTPException(status_code=404, detail="Crew not found")
-    
+    raw_output = await complete_execution(db, execution, result, completed_tasks)
+    await db.commit()
+    return raw_output
+
+async def iter_ndjson_lines(request: Request):
+    """Yield the lines of a streamed request body without buffering the whole body"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8")
+    if buffer:
+        yield buffer.decode("utf-8")
+
+def serialize_crew(crew: DBCrew, include_api_keys: bool = True) -> dict:
+    """Serialize a crew loaded with crew_graph_options(). Without include_api_keys, agent API keys are left out."""
+    graph = index_crew_graph(crew)
     # Parse input and output variables from JSON strings
     input_variables = json.loads(crew.input_variables) if crew.input_variables else {}
     output_variables = json.loads(crew.output_variables) if crew.output_variables else {}
@@ -201,6 +231,9 @@ async def get_crew(crew_id: int, db: AsyncSession = Depends(get_db)):
         "description": crew.description,
         "input_variables": input_variables,
         "output_variables": output_variables,
+        "max_duration_seconds": crew.max_duration_seconds,
+        "max_tokens": crew.max_tokens,
+        "version": crew.version,
         "agents": [
             {
                 "role": agent.role,
@@ -211,17 +244,21 @@ async def get_crew(crew_id: int, db: AsyncSession = Depends(get_db)):
                     "provider": agent.llm_provider,
                     "model": agent.llm_model,
                     "base_url": agent.llm_base_url,
-                    "api_key": agent.llm_api_key,
-                    "api_version": agent.llm_api_version
+                    "api_key": agent.llm_api_key if include_api_keys else None,
+                    "api_version": agent.llm_api_version,
+                    "requests_per_minute": agent.llm_requests_per_minute,
+                    "tokens_per_minute": agent.llm_tokens_per_minute,
+                    "max_concurrency": agent.llm_max_concurrency
                 },
-                "allowed_tools": json.loads(agent.allowed_tools) if agent.allowed_tools else []
+                "allowed_tools": json.loads(agent.allowed_tools) if agent.allowed_tools else [],
+                "tool_output_tokens": agent.tool_output_tokens
             } for agent in crew.agents
         ],
         "tasks": [
             {
                 "id": task.id,
                 "description": task.description,
-                "agent_role": task.agent.role,
+                "agent_role": getattr(graph.agent_for(task), "role", None),
                 "expected_output": task.expected_output,
                 "input_parameters": json.loads(task.input_parameters) if task.input_parameters else {},
                 "context_variables": json.loads(task.context_variables) if task.context_variables else {},
@@ -231,171 +268,587 @@ async def get_crew(crew_id: int, db: AsyncSession = Depends(get_db)):
         ]
     }
 
-@router.post("/{crew_id}/execute")
-async def execute_crew(
-    crew_id: int,
-    execution_params: CrewExecutionParams,
-    db: AsyncSession = Depends(get_db)
+def listing_since(since: Optional[datetime]) -> Optional[datetime]:
+    """
+    Start of an execution listing: `since`, or the last EXECUTION_LIST_WINDOW_DAYS (0 for
+    no limit). The start used is returned with the listing.
+    """
+    if since is None and EXECUTION_LIST_WINDOW_DAYS:
+        return utcnow() - timedelta(days=EXECUTION_LIST_WINDOW_DAYS)
+    return since
+
+def execution_listing_query(
+    crew_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: Optional[int] = None
 ):
-    result = await db.execute(
-        select(DBCrew)
-        .where(DBCrew.id == crew_id)
-        .options(
-            selectinload(DBCrew.agents),
-            selectinload(DBCrew.tasks)
-        )
-    )
-    crew = result.scalar_one_or_none()
-    
-    if not crew:
-        raise HTTPException(status_code=404, detail="Crew not found")
-    
-    # Create execution record
-    execution = DBExecution(
-        crew_id=crew_id,
-        status="in_progress",
-        input_variables=json.dumps(execution_params.inputs) if execution_params.inputs else None,
-        task_params=json.dumps(execution_params.allowed_tools) if execution_params.allowed_tools else None
+    """
+    Build the query behind the execution listings.
+
+    Filtering on created_at lets PostgreSQL prune partitions. Aware bounds are converted
+    to UTC, naive ones are taken as UTC.
+    """
+    query = (
+        select(DBExecution, DBCrew.name.label('crew_name'))
+        .join(DBCrew, DBExecution.crew_id == DBCrew.id)
+        .options(defer(DBExecution.result))
+        .order_by(DBExecution.created_at.desc())
     )
-    db.add(execution)
+    if crew_id is not None:
+        query = query.where(DBExecution.crew_id == crew_id)
+    if since is not None:
+        query = query.where(DBExecution.created_at >= naive_utc(since))
+    if until is not None:
+        query = query.where(DBExecution.created_at < naive_utc(until))
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+def stream_execution_listing(query, since: Optional[datetime] = None) -> StreamingResponse:
+    """
+    Stream an execution listing as {"since": ..., "executions": [...]} from a server-side
+    cursor, so memory stays flat however many rows match.
+    """
+    async def generate():
+        # The request session is closed before streaming starts, so use a dedicated one
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(query.execution_options(yield_per=EXECUTION_LIST_STREAM_BATCH_SIZE))
+            yield b'{"since":' + dumps(naive_utc(since).isoformat() if since else None) + b',"executions":['
+            separator = b""
+            async for rows in result.partitions():
+                yield separator + b",".join(dumps(serialize_execution(row.Execution, row.crew_name)) for row in rows)
+                separator = b","
+            yield b"]}"
+
+    return StreamingResponse(generate(), media_type="application/json")
+
+async def add_crew_records(db: AsyncSession, crew_config: CrewConfig, db_crew: Optional[DBCrew] = None) -> DBCrew:
+    """
+    Insert a crew with its agents and tasks in the current transaction. Given an existing
+    crew whose agents and tasks were deleted, update it and insert its new ones.
+    """
+    roles = {agent_config.role for agent_config in crew_config.agents}
+    for task_config in crew_config.tasks:
+        if task_config.agent_role not in roles:
+            raise HTTPException(status_code=400, detail=f"Agent role {task_config.agent_role} not found")
+
+    if db_crew is None:
+        db_crew = DBCrew()
+        db.add(db_crew)
+    db_crew.name = crew_config.name
+    db_crew.description = crew_config.description
+    db_crew.input_variables = json.dumps(crew_config.input_variables) if crew_config.input_variables else None
+    db_crew.output_variables = json.dumps(crew_config.output_variables) if crew_config.output_variables else None
+    db_crew.max_duration_seconds = crew_config.max_duration_seconds
+    db_crew.max_tokens = crew_config.max_tokens
+
+    # Create agents
+    agents = {}
+    for agent_config in crew_config.agents:
+        llm_config = agent_config.llm_config or LLMConfig()
+        db_agent = DBAgent(
+            role=agent_config.role,
+            goal=agent_config.goal,
+            backstory=agent_config.backstory,
+            verbose=agent_config.verbose,
+            llm_provider=llm_config.provider,
+            llm_model=llm_config.model,
+            llm_base_url=llm_config.base_url,
+            llm_api_key=llm_config.api_key,
+            llm_api_version=llm_config.api_version,
+            llm_requests_per_minute=llm_config.requests_per_minute,
+            llm_tokens_per_minute=llm_config.tokens_per_minute,
+            llm_max_concurrency=llm_config.max_concurrency,
+            allowed_tools=json.dumps(agent_config.allowed_tools) if agent_config.allowed_tools else None,
+            tool_output_tokens=agent_config.tool_output_tokens
+        )
+        db.add(db_agent)
+        agents[agent_config.role] = db_agent
+
+    # One flush assigns the crew and agent IDs
     await db.flush()
 
-    # Get all available tools
-    tools_dict = get_available_tools()
-
-    # Create CrewAI agents
-    crewai_agents = []
-    for db_agent in crew.agents:
-        # Configure LLM based on provider
-        if db_agent.llm_provider == "anthropic":
-            if db_agent.llm_api_key:
-                os.environ["ANTHROPIC_API_KEY"] = db_agent.llm_api_key
-            from langchain_anthropic import ChatAnthropic
-            llm = ChatAnthropic(model=db_agent.llm_model)
-        elif db_agent.llm_provider == "openai":
-            if db_agent.llm_api_key:
-                os.environ["OPENAI_API_KEY"] = db_agent.llm_api_key
-            from langchain_openai import ChatOpenAI
-            llm = ChatOpenAI(
-                model=db_agent.llm_model,
-                api_version=db_agent.llm_api_version
-            )
-        elif db_agent.llm_provider == "openai_compatible":
-            from langchain_openai import ChatOpenAI
-            llm = ChatOpenAI(
-                model=db_agent.llm_model,
-                base_url=db_agent.llm_base_url,
-                api_key=db_agent.llm_api_key,
-                api_version=db_agent.llm_api_version
+    # Create tasks
+    for task_config in crew_config.tasks:
+        db.add(DBTask(
+            description=task_config.description,
+            expected_output=task_config.expected_output,
+            input_parameters=json.dumps(task_config.input_parameters) if task_config.input_parameters else None,
+            context_variables=json.dumps(task_config.context_variables) if task_config.context_variables else None,
+            output_variables=json.dumps(task_config.output_variables) if task_config.output_variables else None,
+            dependencies=json.dumps(task_config.dependencies) if task_config.dependencies else None,
+            crew_id=db_crew.id,
+            agent_id=agents[task_config.agent_role].id
+        ))
+
+    # Add agents to crew using the association table directly
+    if agents:
+        await db.execute(
+            text("INSERT INTO crew_agent_association (crew_id, agent_id) VALUES (:crew_id, :agent_id)"),
+            [{"crew_id": db_crew.id, "agent_id": agent.id} for agent in agents.values()]
+        )
+    await db.flush()
+    return db_crew
+
+@router.post("/")
+async def create_crew(crew_config: CrewConfig, db: AsyncSession = Depends(get_db)):
+    try:
+        print(f"Creating crew: {crew_config.name}")
+        # Check if crew name already exists
+        result = await db.execute(select(DBCrew).where(DBCrew.name == crew_config.name))
+        if result.scalar_one_or_none():
+            raise HTTPException(status_code=400, detail="Crew name already exists")
+
+        db_crew = await add_crew_records(db, crew_config)
+        print(f"Created crew with ID: {db_crew.id}")
+
+        await db.commit()
+        # The ID may have belonged to a deleted crew
+        await crew_cache.invalidate(db_crew.id, db_crew.version)
+        print("Successfully committed all changes")
+        return {"message": f"Crew {crew_config.name} created successfully"}
+
+    except Exception as e:
+        print(f"Error creating crew: {str(e)}")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/import")
+async def import_crews(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Import crews from an NDJSON body, one CrewConfig per line.
+
+    Records are validated and inserted in batches of CREW_IMPORT_BATCH_SIZE, one transaction
+    per batch. A failing record is rolled back on its own and reported with its line number.
+    """
+    imported = 0
+    errors = []
+    batch = []
+    imported_crews = []
+
+    async def flush_batch():
+        nonlocal imported
+        names = [crew_config.name for _, crew_config in batch]
+        result = await db.execute(select(DBCrew.name).where(DBCrew.name.in_(names)))
+        existing = set(result.scalars().all())
+
+        for line_number, crew_config in batch:
+            if crew_config.name in existing:
+                errors.append({"line": line_number, "name": crew_config.name, "error": "Crew name already exists"})
+                continue
+            try:
+                async with db.begin_nested():
+                    db_crew = await add_crew_records(db, crew_config)
+                imported_crews.append(db_crew)
+                existing.add(crew_config.name)
+                imported += 1
+            except Exception as e:
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                errors.append({"line": line_number, "name": crew_config.name, "error": detail})
+        await db.commit()
+        for db_crew in imported_crews:
+            await crew_cache.invalidate(db_crew.id, db_crew.version)
+        imported_crews.clear()
+        batch.clear()
+
+    line_number = 0
+    async for line in iter_ndjson_lines(request):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            batch.append((line_number, CrewConfig.model_validate_json(line)))
+        except ValidationError as e:
+            errors.append({"line": line_number, "error": e.errors(include_url=False, include_input=False)})
+            continue
+        if len(batch) >= CREW_IMPORT_BATCH_SIZE:
+            await flush_batch()
+    if batch:
+        await flush_batch()
+
+    return {"imported": imported, "failed": len(errors), "errors": errors}
+
+@router.get("/export")
+async def export_crews(include_api_keys: bool = False):
+    """
+    Stream every crew with its agents and tasks as NDJSON, in the format accepted by /import.
+    Agent API keys are only exported with include_api_keys=true.
+    """
+    async def generate():
+        # The request session is closed before streaming starts, so use a dedicated one
+        async with AsyncSessionLocal() as session:
+            crews = await session.stream_scalars(
+                select(DBCrew)
+                .options(*crew_graph_options())
+                .order_by(DBCrew.id)
+                .execution_options(yield_per=CREW_EXPORT_BATCH_SIZE)
             )
+            async for crew in crews:
+                yield dumps(serialize_crew(crew, include_api_keys)) + b"\n"
 
-        # Filter tools based on allowed_tools
-        agent_tools = []
-        if db_agent.allowed_tools:
-            allowed_tools = json.loads(db_agent.allowed_tools)
-            for tool_name in allowed_tools:
-                if tool_name in tools_dict:
-                    agent_tools.append(tools_dict[tool_name])
-
-        # Create agent with tools and LLM
-        agent = Agent(
-            role=db_agent.role,
-            goal=db_agent.goal,
-            backstory=db_agent.backstory,
-            verbose=db_agent.verbose,
-            tools=agent_tools,  # Pass tools as a list
-            llm=llm  # Pass the configured LLM instance
-        )
-        crewai_agents.append(agent)
-
-    # Create CrewAI tasks
-    crewai_tasks = []
-    for db_task in crew.tasks:
-        task = Task(
-            description=db_task.description,
-            agent=next(agent for agent in crewai_agents if agent.role == db_task.agent.role),
-            expected_output=db_task.expected_output
-        )
-        crewai_tasks.append(task)
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
-    # Create and execute crew
-    crew = Crew(
-        agents=crewai_agents,
-        tasks=crewai_tasks,
-        verbose=True
+@router.get("/", response_model=CrewList)
+async def list_crews(db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(DBCrew.id, DBCrew.name))
+    return FastJSONResponse({"crews": [{"id": crew.id, "name": crew.name} for crew in result.all()]})
+
+@router.get("/executions", response_model=ExecutionList)
+async def list_all_executions(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    since = listing_since(since)
+    return stream_execution_listing(execution_listing_query(since=since, until=until, limit=limit), since)
+
+@router.get("/executions/{execution_id}/result")
+async def get_execution_result(execution_id: str, db: AsyncSession = Depends(get_db)):
+    execution = await db.get(DBExecution, execution_id)
+    if not execution:
+        raise HTTPException(status_code=404, detail="Execution not found")
+
+    headers = {"ETag": f'"{execution.result_digest}"'} if execution.result_digest else {}
+    if execution.result is not None:
+        return Response(content=execution.result, media_type="application/json", headers=headers)
+    if not execution.result_digest:
+        raise HTTPException(status_code=404, detail="Execution has no result")
+
+    return StreamingResponse(
+        get_blob_store().iter_chunks(execution.result_digest),
+        media_type="application/json",
+        headers=headers
     )
 
-    # Execute crew with input variables
-    inputs = execution_params.inputs or {}
-
-    # Flatten all task input_parameters to the top-level for CrewAI
-    if "task_params" in inputs:
-        for task_id, params in inputs["task_params"].items():
-            if "input_parameters" in params:
-                for k, v in params["input_parameters"].items():
-                    if k not in inputs:
-                        inputs[k] = v
-
-    # Also flatten crew-level input_variables
-    if "input_variables" in inputs:
-        for k, v in inputs["input_variables"].items():
-            inputs[k] = v
-
-    result = crew.kickoff(inputs=inputs)
-
-    # CrewOutput object structure:
-    # - raw: str - The raw text output
-    # - pydantic: Optional[Any] - Pydantic model if output was structured
-    # - json_dict: Optional[Dict] - JSON representation if available
-    # - tasks_output: List[TaskOutput] - List of individual task outputs
-    #   - TaskOutput contains: description, name, expected_output, summary, raw, pydantic, json_dict, agent, output_format
-    # - token_usage: UsageMetrics - Token usage statistics
-    #   - UsageMetrics contains: total_tokens, prompt_tokens, cached_prompt_tokens, completion_tokens, successful_requests
-    raw_output = result.raw if hasattr(result, 'raw') else str(result)
-
-    # Update execution record
-    execution.status = "completed"
-    execution.result = json.dumps(raw_output)
-    execution.completed_at = datetime.now(UTC)
+@router.get("/executions/{execution_id}/result/tasks")
+async def get_execution_tasks_output(execution_id: str, db: AsyncSession = Depends(get_db)):
+    execution = await db.get(DBExecution, execution_id)
+    if not execution:
+        raise HTTPException(status_code=404, detail="Execution not found")
+    if not execution.tasks_output_digest:
+        raise HTTPException(status_code=404, detail="Execution has no task outputs")
+
+    return StreamingResponse(
+        get_blob_store().iter_chunks(execution.tasks_output_digest),
+        media_type="application/json",
+        headers={"ETag": f'"{execution.tasks_output_digest}"'}
+    )
+
+@router.post("/executions/{execution_id}/resume")
+async def resume_execution(execution_id: str, db: AsyncSession = Depends(get_db)):
+    """Restart an unfinished execution from its first incomplete task, reusing checkpointed task outputs"""
+    execution = await db.get(DBExecution, execution_id)
+    if not execution:
+        raise HTTPException(status_code=404, detail="Execution not found")
+    if execution.status not in ("failed", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Only failed or cancelled executions can be resumed, this one is {execution.status}")
+
+    definition = await load_crew_definition(db, execution.crew_id)
+    if not definition:
+        raise HTTPException(status_code=404, detail="Crew not found")
+    if execution.crew_version is not None and execution.crew_version != definition.version:
+        raise HTTPException(
+            status_code=409,
+            detail=f"The crew was updated to version {definition.version} since this execution ran version {execution.crew_version}, start a new execution instead"
+        )
+
+    completed_tasks = await load_completed_tasks(db, execution.id, [task.id for task in definition.tasks])
+    inputs = json.loads(execution.input_variables) if execution.input_variables else None
+
+    # The failed attempt was already counted, the resumed run is counted when it ends
+    await unrecord_execution(db, execution)
+    execution.status = "queued"
+    execution.error = None
+    execution.completed_at = None
+    execution.cancel_requested = False
+    execution.worker_id = initial_worker_id(current_worker_id())
+    execution.heartbeat_at = utcnow()
+    await db.commit()
+
+    raw_output = await run_execution(
+        db, execution, definition, inputs, completed_tasks,
+        timeout_seconds=execution.timeout_seconds,
+        max_tokens=execution.max_tokens
+    )
+    return {"result": raw_output, "resumed_from_task": len(completed_tasks)}
+
+@router.post("/executions/{execution_id}/cancel", status_code=202)
+async def cancel_execution(execution_id: str, db: AsyncSession = Depends(get_db)):
+    """Stop a queued or running execution. Runs owned by another worker stop at its next heartbeat."""
+    execution = await db.get(DBExecution, execution_id)
+    if not execution:
+        raise HTTPException(status_code=404, detail="Execution not found")
+    if execution.status not in ACTIVE_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Execution is already {execution.status}")
+
+    execution.cancel_requested = True
     await db.commit()
+    cancel_run(execution_id)
+
+    return {"id": execution.id, "status": "cancelling"}
+
+@router.get("/executions/{execution_id}/tasks")
+async def get_execution_task_checkpoints(execution_id: str, db: AsyncSession = Depends(get_db)):
+    """List the task checkpoints of an execution. Outputs are previews, the full text is in the result."""
+    checkpoints = await load_task_outputs(db, execution_id)
+    return [
+        {
+            "task_index": checkpoint.task_index,
+            "task_id": checkpoint.task_id,
+            "agent_role": checkpoint.agent_role,
+            "description": checkpoint.description,
+            "output_size": checkpoint.output_size,
+            "output_digest": checkpoint.output_digest,
+            "created_at": checkpoint.created_at.isoformat() if checkpoint.created_at else None
+        } for checkpoint in checkpoints
+    ]
+
+@router.get("/batches/{batch_id}")
+async def get_batch(batch_id: str, include_items: bool = False, db: AsyncSession = Depends(get_db)):
+    batch = await db.get(DBExecutionBatch, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    result = await db.execute(
+        select(DBExecution.status, func.count())
+        .where(DBExecution.batch_id == batch_id)
+        .group_by(DBExecution.status)
+    )
+    status_counts = {status: count for status, count in result.all()}
+
+    response = {
+        "id": batch.id,
+        "crew_id": batch.crew_id,
+        "status": batch.status,
+        "total_items": batch.total_items,
+        "completed_items": batch.completed_items,
+        "failed_items": batch.failed_items,
+        "status_counts": status_counts,
+        "progress": (batch.completed_items + batch.failed_items) / batch.total_items if batch.total_items else 1.0,
+        "concurrency": batch.concurrency,
+        "max_retries": batch.max_retries,
+        "created_at": batch.created_at.isoformat(),
+        "completed_at": batch.completed_at.isoformat() if batch.completed_at else None
+    }
+
+    if include_items:
+        result = await db.execute(
+            select(DBExecution, DBCrew.name.label('crew_name'))
+            .join(DBCrew, DBExecution.crew_id == DBCrew.id)
+            .where(DBExecution.batch_id == batch_id)
+            .options(defer(DBExecution.result))
+            .order_by(DBExecution.created_at)
+        )
+        response["items"] = [serialize_execution(row.Execution, row.crew_name) for row in result.all()]
+
+    return response
+
+@router.get("/{crew_id}", response_model=CrewDetail)
+async def get_crew(crew_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    """Serve a crew from the read-through cache. Clients can revalidate with If-None-Match."""
+    result = await db.execute(select(DBCrew.version).where(DBCrew.id == crew_id))
+    version = result.scalar_one_or_none()
+    entry = await crew_cache.get(crew_id, version) if version is not None else None
+    if entry is None:
+        graph = await load_crew_graph(db, crew_id)
+        
+        if not graph:
+            raise HTTPException(status_code=404, detail="Crew not found")
+        
+        entry = make_entry(dumps(serialize_crew(graph.crew)))
+        # Keyed by the version that was read, which may already be newer than the one looked up
+        await crew_cache.set(crew_id, graph.crew.version, entry)
 
-    return {"result": raw_output}
+    # Clients must revalidate, so edits show up at once while unchanged crews cost a 304
+    headers = {"ETag": entry["etag"], "Cache-Control": "no-cache"}
+    if etag_matches(entry["etag"], request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
 
+@router.post("/{crew_id}/execute")
+async def execute_crew(
+    crew_id: int,
+    execution_params: CrewExecutionParams,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    except Exception as e:
-        execution.status = "failed"
-        execution.error = str(e)
-        execution.completed_at = datetime.now(UTC)
+    Run a crew and return its result.
+
+    A repeated Idempotency-Key returns the execution it started within IDEMPOTENCY_WINDOW_SECONDS
+    instead of running the crew again. Identical requests that arrive while a run is in flight
+    share that run's result.
+    """
+    definition = await load_crew_definition(db, crew_id)
+    
+    if not definition:
+        raise HTTPException(status_code=404, detail="Crew not found")
+
+    fingerprint = request_fingerprint(crew_id, definition.version, execution_params.inputs, execution_params.allowed_tools)
+    flight_key = f"{crew_id}:{idempotency_key}:{fingerprint}" if idempotency_key else fingerprint
+    joined_at = utcnow()
+
+    async def shared_result(execution: DBExecution):
+        """Outcome of a run started by another request"""
+        if execution.request_hash != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        execution = await wait_for_execution(db, execution)
+        if execution.status == "completed":
+            return {"result": await load_execution_result(execution), "execution_id": execution.id}
+        raise HTTPException(status_code=409 if execution.status == "cancelled" else 500, detail=execution.error)
+
+    held_by = None
+    if idempotency_key and not execution_flights.in_flight(flight_key):
+        held_by, existing = await find_idempotent_execution(db, crew_id, idempotency_key)
+        if existing and existing.request_hash != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if existing and existing.status in ACTIVE_STATUSES:
+            # Started by another process, wait for it to finish
+            existing = await wait_for_execution(db, existing)
+        if existing and existing.status == "completed":
+            return {"result": await load_execution_result(existing), "execution_id": existing.id}
+        # Failed and cancelled runs do not hold on to the key, the request runs again
+
+    async def run():
+        # Create execution record, visible as queued until the scheduler grants a slot
+        execution = DBExecution(
+            id=str(uuid.uuid4()),
+            crew_id=crew_id,
+            crew_version=definition.version,
+            status="queued",
+            attempts=0,
+            priority=execution_params.priority,
+            owner=execution_params.owner,
+            worker_id=initial_worker_id(current_worker_id()),
+            heartbeat_at=utcnow(),
+            idempotency_key=idempotency_key,
+            request_hash=fingerprint,
+            input_variables=json.dumps(execution_params.inputs) if execution_params.inputs else None,
+            task_params=json.dumps(execution_params.allowed_tools) if execution_params.allowed_tools else None,
+            timeout_seconds=execution_params.timeout_seconds,
+            max_tokens=execution_params.max_tokens
+        )
+        # The key and the execution are committed together, so only one process runs a key
+        if idempotency_key and not await claim_idempotency_key(db, crew_id, idempotency_key, execution.id, held_by):
+            _, winner = await find_idempotent_execution(db, crew_id, idempotency_key)
+            if winner is None:
+                raise HTTPException(status_code=409, detail="Idempotency-Key is in use by a concurrent request")
+            return await shared_result(winner)
+        db.add(execution)
         await db.commit()
-        raise HTTPException(status_code=500, detail=str(e))
+
+        # Execute crew with input variables
+        raw_output = await run_execution(
+            db,
+            execution,
+            definition,
+            execution_params.inputs,
+            timeout_seconds=execution_params.timeout_seconds,
+            max_tokens=execution_params.max_tokens
+        )
+        return {"result": raw_output, "execution_id": execution.id}
+
+    async def follow():
+        """The request that started the shared run went away, wait on the run itself"""
+        nonlocal held_by
+        if idempotency_key:
+            held_by, existing = await find_idempotent_execution(db, crew_id, idempotency_key)
+        else:
+            existing = await find_coalesced_execution(db, crew_id, fingerprint, joined_at)
+        if existing is None:
+            # Cancelled before its run was created, so start one
+            return await execution_flights.do(flight_key, run, follow)
+        return await shared_result(existing)
+
+    if not idempotency_key and not EXECUTION_COALESCE:
+        return await run()
+    return await execution_flights.do(flight_key, run, follow)
+
+@router.post("/{crew_id}/execute/batch", status_code=202)
+async def execute_crew_batch(crew_id: int, request: Request, db: AsyncSession = Depends(get_db)):
     """
+    Run a crew once per inputs dict.
 
-@router.get("/{crew_id}/executions")
-async def list_crew_executions(crew_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(DBExecution, DBCrew.name.label('crew_name'))
-        .join(DBCrew, DBExecution.crew_id == DBCrew.id)
-        .where(DBExecution.crew_id == crew_id)
-        .order_by(DBExecution.created_at.desc())
+    Accepts a JSON BatchExecutionParams body, an NDJSON body with one inputs dict per line,
+    or a multipart upload of a CSV or NDJSON `file` (with optional concurrency, max_retries,
+    priority and owner form fields). The crew definition is loaded once for the whole batch.
+    """
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None:
+                raise HTTPException(status_code=400, detail="Missing file upload")
+            params = BatchExecutionParams(
+                items=parse_batch_file(await upload.read(), upload.filename or ""),
+                allowed_tools=form.getlist("allowed_tools") or None,
+                concurrency=form.get("concurrency", 4),
+                max_retries=form.get("max_retries", 1),
+                priority=form.get("priority", "batch"),
+                owner=form.get("owner")
+            )
+        elif content_type.startswith("application/x-ndjson"):
+            params = BatchExecutionParams(items=parse_batch_file(await request.body()), **request.query_params)
+        else:
+            params = BatchExecutionParams.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_input=False))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not params.items:
+        raise HTTPException(status_code=400, detail="Batch has no items")
+    if len(params.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {BATCH_MAX_ITEMS} items")
+
+    definition = await load_crew_definition(db, crew_id)
+    if not definition:
+        raise HTTPException(status_code=404, detail="Crew not found")
+
+    batch = DBExecutionBatch(
+        crew_id=crew_id,
+        status="queued",
+        total_items=len(params.items),
+        completed_items=0,
+        failed_items=0,
+        concurrency=params.concurrency,
+        max_retries=params.max_retries,
+        allowed_tools=json.dumps(params.allowed_tools) if params.allowed_tools else None
     )
-    executions = result.all()
-    
-    return {
-        "executions": [
-            {
-                "id": execution.Execution.id,
-                "crew_id": execution.Execution.crew_id,
-                "crew_name": execution.crew_name,
-                "status": execution.Execution.status,
-                "result": json.loads(execution.Execution.result) if execution.Execution.result else None,
-                "error": execution.Execution.error,
-                "input_variables": json.loads(execution.Execution.input_variables) if execution.Execution.input_variables else None,
-                "task_params": json.loads(execution.Execution.task_params) if execution.Execution.task_params else None,
-                "created_at": execution.Execution.created_at.isoformat(),
-                "completed_at": execution.Execution.completed_at.isoformat() if execution.Execution.completed_at else None
-            } for execution in executions
-        ]
-    }
+    db.add(batch)
+    await db.flush()
+    db.add_all([
+        DBExecution(
+            crew_id=crew_id,
+            crew_version=definition.version,
+            batch_id=batch.id,
+            status="queued",
+            priority=params.priority,
+            owner=params.owner,
+            worker_id=initial_worker_id(current_worker_id()),
+            heartbeat_at=utcnow(),
+            attempts=0,
+            input_variables=json.dumps(inputs) if inputs else None,
+            task_params=json.dumps(params.allowed_tools) if params.allowed_tools else None
+        ) for inputs in params.items
+    ])
+    await db.commit()
+
+    if not work_queue_enabled():
+        start_batch(batch.id, definition, params.concurrency, params.max_retries)
+    return {"batch_id": batch.id, "status": batch.status, "total_items": batch.total_items}
+
+@router.get("/{crew_id}/executions", response_model=ExecutionList)
+async def list_crew_executions(
+    crew_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    since = listing_since(since)
+    return stream_execution_listing(execution_listing_query(crew_id=crew_id, since=since, until=until, limit=limit), since)
 
 @router.delete("/{crew_id}")
 async def delete_crew(crew_id: int, db: AsyncSession = Depends(get_db)):
@@ -405,8 +858,10 @@ async def delete_crew(crew_id: int, db: AsyncSession = Depends(get_db)):
     if not crew:
         raise HTTPException(status_code=404, detail="Crew not found")
     
+    version = crew.version
     await db.delete(crew)
     await db.commit()
+    await crew_cache.invalidate(crew_id, version)
     return {"message": f"Crew {crew.name} deleted successfully"}
 
 @router.put("/{crew_id}")
@@ -424,62 +879,20 @@ async def update_crew(crew_id: int, crew_config: CrewConfig, db: AsyncSession =
             if result.scalar_one_or_none():
                 raise HTTPException(status_code=400, detail="Crew name already exists")
 
-        # Update crew details
-        db_crew.name = crew_config.name
-        db_crew.description = crew_config.description
-        db_crew.input_variables = json.dumps(crew_config.input_variables) if crew_config.input_variables else None
-        db_crew.output_variables = json.dumps(crew_config.output_variables) if crew_config.output_variables else None
+        previous_version = db_crew.version
+        # Bumped in SQL, so concurrent updates never end up with the same version
+        db_crew.version = func.coalesce(DBCrew.version, 1) + 1
 
         # Delete existing agents and tasks
         await db.execute(text("DELETE FROM crew_agent_association WHERE crew_id = :crew_id"), {"crew_id": crew_id})
         await db.execute(text("DELETE FROM tasks WHERE crew_id = :crew_id"), {"crew_id": crew_id})
         await db.execute(text("DELETE FROM agents WHERE id IN (SELECT agent_id FROM crew_agent_association WHERE crew_id = :crew_id)"), {"crew_id": crew_id})
 
-        # Create new agents
-        agents = {}
-        for agent_config in crew_config.agents:
-            llm_config = agent_config.llm_config or LLMConfig()
-            db_agent = DBAgent(
-                role=agent_config.role,
-                goal=agent_config.goal,
-                backstory=agent_config.backstory,
-                verbose=agent_config.verbose,
-                llm_provider=llm_config.provider,
-                llm_model=llm_config.model,
-                llm_base_url=llm_config.base_url,
-                llm_api_key=llm_config.api_key,
-                llm_api_version=llm_config.api_version,
-                allowed_tools=json.dumps(agent_config.allowed_tools) if agent_config.allowed_tools else None
-            )
-            db.add(db_agent)
-            await db.flush()
-            agents[agent_config.role] = db_agent
-
-        # Create new tasks
-        for task_config in crew_config.tasks:
-            if task_config.agent_role not in agents:
-                raise HTTPException(status_code=400, detail=f"Agent role {task_config.agent_role} not found")
-            
-            db_task = DBTask(
-                description=task_config.description,
-                expected_output=task_config.expected_output,
-                input_parameters=json.dumps(task_config.input_parameters) if task_config.input_parameters else None,
-                context_variables=json.dumps(task_config.context_variables) if task_config.context_variables else None,
-                output_variables=json.dumps(task_config.output_variables) if task_config.output_variables else None,
-                dependencies=json.dumps(task_config.dependencies) if task_config.dependencies else None,
-                crew_id=crew_id,
-                agent_id=agents[task_config.agent_role].id
-            )
-            db.add(db_task)
-
-        # Add agents to crew
-        for agent in agents.values():
-            await db.execute(
-                text("INSERT INTO crew_agent_association (crew_id, agent_id) VALUES (:crew_id, :agent_id)"),
-                {"crew_id": crew_id, "agent_id": agent.id}
-            )
+        # Update crew details and create the new agents and tasks
+        await add_crew_records(db, crew_config, db_crew)
 
         await db.commit()
+        await crew_cache.invalidate(crew_id, previous_version)
         return {"message": f"Crew {crew_config.name} updated successfully"}
 
     except Exception as e:
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import datetime
+
+from app.database import get_db
+from app.rate_limit import admission_controller
+from app.rollups import GRANULARITIES, get_execution_stats
+from app.scheduler import execution_scheduler
+
+router = APIRouter()
+
+@router.get("/stats")
+async def execution_stats(
+    granularity: str = "day",
+    crew_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Granularity must be one of {', '.join(GRANULARITIES)}")
+
+    return await get_execution_stats(db, granularity=granularity, crew_id=crew_id, since=since, until=until)
+
+@router.get("/admission")
+async def admission_status():
+    """Current state of each provider/model/key limiter in this process"""
+    return {"limiters": admission_controller.snapshot()}
+
+@router.get("/queue")
+async def queue_status():
+    """Queue depth, running runs and recent queue wait times per priority lane"""
+    return execution_scheduler.stats()
@@ -0,0 +1,289 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import load_only
+
+from app.database import AsyncSessionLocal, utcnow
+from app.models import Execution as DBExecution, ExecutionBatch as DBExecutionBatch
+from app.rollups import record_execution
+from app.work_queue import work_queue_enabled, requeue_execution
+
+load_dotenv()
+
+# Default budgets, used when neither the run nor its crew sets one (0 = unlimited)
+EXECUTION_TIMEOUT_SECONDS = float(os.getenv("EXECUTION_TIMEOUT_SECONDS", "3600"))
+EXECUTION_MAX_TOKENS = int(os.getenv("EXECUTION_MAX_TOKENS", "0"))
+EXECUTION_HEARTBEAT_INTERVAL = float(os.getenv("EXECUTION_HEARTBEAT_INTERVAL", "15"))
+# Unfinished executions without a heartbeat for this long are marked failed (0 disables the reaper)
+EXECUTION_STALE_AFTER = float(os.getenv("EXECUTION_STALE_AFTER", "120"))
+
+# Identifies this process on the executions it owns
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+def _renew_worker_id() -> None:
+    # Processes forked by app.serve must not share the parent's id
+    global WORKER_ID
+    WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+os.register_at_fork(after_in_child=_renew_worker_id)
+
+def current_worker_id() -> str:
+    return WORKER_ID
+
+ACTIVE_STATUSES = ("queued", "in_progress")
+
+class ExecutionStopped(Exception):
+    """Raised when a run is cancelled or exceeds its wall-clock or token budget"""
+
+    def __init__(self, reason: str, status: str = "failed"):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+
+class RunControl:
+    """
+    Budgets and cancellation for one execution.
+
+    The crew runs in a worker thread that cannot be killed, so stopping is cooperative: the
+    awaiting task is cancelled at once, which frees the scheduler slot, and the thread stops
+    at its next LLM call, which checks the control before and after calling the provider.
+    """
+
+    def __init__(self, execution_id: str, timeout_seconds: Optional[float] = None, max_tokens: Optional[int] = None):
+        self.execution_id = execution_id
+        self.timeout_seconds = timeout_seconds or None
+        self.max_tokens = max_tokens or None
+        self.tokens_used = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0  # prompt tokens read from the provider's prompt cache
+        self.deadline: Optional[float] = None
+        self.stopped: Optional[ExecutionStopped] = None
+        # Released runs are abandoned without recording an outcome, e.g. on shutdown
+        self.released = False
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach(self, task: asyncio.Task) -> None:
+        self._task = task
+        self._loop = task.get_loop()
+
+    def start_clock(self) -> None:
+        if self.timeout_seconds:
+            self.deadline = time.monotonic() + self.timeout_seconds
+
+    def remaining_seconds(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def stop(self, reason: str, status: str = "failed") -> None:
+        """Stop the run from any thread. Only the first reason is kept."""
+        with self._lock:
+            if self.stopped is not None:
+                return
+            self.stopped = ExecutionStopped(reason, status)
+        if self._task is not None and not self._task.done():
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+    def release(self, reason: str) -> None:
+        """Stop the thread at its next LLM call but leave the execution row to whoever hands it back"""
+        with self._lock:
+            if self.stopped is None:
+                self.stopped = ExecutionStopped(reason)
+            self.released = True
+
+    def check(self) -> None:
+        """Raise ExecutionStopped if the run was stopped or has run out of time"""
+        remaining = self.remaining_seconds()
+        if remaining is not None and remaining <= 0:
+            self.stop(f"Timed out after {self.timeout_seconds:g} seconds")
+        if self.stopped is not None:
+            raise ExecutionStopped(self.stopped.reason, self.stopped.status)
+
+    def add_tokens(self, tokens: Optional[int]) -> None:
+        if not tokens:
+            return
+        with self._lock:
+            self.tokens_used += tokens
+            over_budget = self.max_tokens and self.tokens_used > self.max_tokens
+        if over_budget:
+            self.stop(f"Token budget of {self.max_tokens} exceeded")
+
+    def add_prompt_usage(self, prompt_tokens: Optional[int], cached_tokens: Optional[int]) -> None:
+        with self._lock:
+            self.prompt_tokens += prompt_tokens or 0
+            self.cached_prompt_tokens += cached_tokens or 0
+
+_controls: Dict[str, RunControl] = {}
+_controls_lock = threading.Lock()
+# Token usage of released runs, added to their rows when they are handed back
+_released_usage: Dict[str, Tuple[int, int, int]] = {}
+
+def start_run_control(execution_id: str, timeout_seconds: Optional[float] = None, max_tokens: Optional[int] = None) -> RunControl:
+    control = RunControl(
+        execution_id,
+        timeout_seconds=timeout_seconds or EXECUTION_TIMEOUT_SECONDS,
+        max_tokens=max_tokens or EXECUTION_MAX_TOKENS,
+    )
+    with _controls_lock:
+        _controls[execution_id] = control
+    return control
+
+def finish_run_control(execution_id: str) -> None:
+    with _controls_lock:
+        control = _controls.pop(execution_id, None)
+        if control is not None and control.released:
+            # Nobody saves a released run's row, so its usage is kept for _abandon_executions
+            _released_usage[execution_id] = (control.tokens_used, control.prompt_tokens, control.cached_prompt_tokens)
+
+def get_run_control(execution_id: Optional[str]) -> Optional[RunControl]:
+    if execution_id is None:
+        return None
+    with _controls_lock:
+        return _controls.get(execution_id)
+
+def cancel_run(execution_id: str, reason: str = "Cancelled by request") -> bool:
+    """Cancel a run owned by this process. Returns False when the run is not running here."""
+    control = get_run_control(execution_id)
+    if control is None:
+        return False
+    control.stop(reason, status="cancelled")
+    return True
+
+def release_run_controls(reason: str = "Worker shutting down") -> int:
+    """Release every run of this process, see RunControl.release"""
+    with _controls_lock:
+        controls = list(_controls.values())
+    for control in controls:
+        control.release(reason)
+    return len(controls)
+
+async def heartbeat() -> None:
+    """Mark the executions owned by this process as alive and pick up cancellations requested elsewhere"""
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(DBExecution)
+            .where(DBExecution.status.in_(ACTIVE_STATUSES))
+            .where(DBExecution.worker_id == WORKER_ID)
+            .values(heartbeat_at=utcnow())
+        )
+        result = await session.execute(
+            select(DBExecution.id)
+            .where(DBExecution.status.in_(ACTIVE_STATUSES))
+            .where(DBExecution.worker_id == WORKER_ID)
+            .where(DBExecution.cancel_requested.is_(True))
+        )
+        await session.commit()
+    for execution_id in result.scalars().all():
+        cancel_run(execution_id)
+
+# Columns read and written when an execution is requeued or failed for a missing worker
+_ABANDON_COLUMNS = (
+    DBExecution.crew_id, DBExecution.batch_id, DBExecution.status, DBExecution.worker_id,
+    DBExecution.attempts, DBExecution.cancel_requested, DBExecution.heartbeat_at,
+    DBExecution.started_at, DBExecution.created_at, DBExecution.completed_at,
+    DBExecution.total_tokens, DBExecution.prompt_tokens, DBExecution.cached_prompt_tokens
+)
+
+async def reap_orphaned_executions() -> int:
+    """
+    Fail unfinished executions whose worker stopped sending heartbeats, e.g. after a restart.
+    With the database work queue they are put back in the queue instead, up to EXECUTION_QUEUE_MAX_ATTEMPTS.
+    """
+    cutoff = utcnow() - timedelta(seconds=EXECUTION_STALE_AFTER)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(DBExecution)
+            .where(DBExecution.status.in_(ACTIVE_STATUSES))
+            # Executions waiting in the queue have no worker yet and are not orphaned
+            .where(DBExecution.worker_id.isnot(None))
+            .where(func.coalesce(DBExecution.heartbeat_at, DBExecution.created_at) < cutoff)
+            .options(load_only(*_ABANDON_COLUMNS))
+        )
+        executions = result.scalars().all()
+        requeued = await _abandon_executions(session, executions)
+        await session.commit()
+
+    if requeued:
+        print(f"Requeued {requeued} executions abandoned by their worker")
+    if len(executions) > requeued:
+        print(f"Reaped {len(executions) - requeued} orphaned executions")
+    return len(executions)
+
+async def release_owned_executions() -> int:
+    """
+    Hand back the unfinished executions of this process when it shuts down: put back in the
+    queue with the database work queue, otherwise failed so they can be resumed.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(DBExecution)
+            .where(DBExecution.status.in_(ACTIVE_STATUSES))
+            .where(DBExecution.worker_id == WORKER_ID)
+            .options(load_only(*_ABANDON_COLUMNS))
+        )
+        executions = result.scalars().all()
+        requeued = await _abandon_executions(session, executions)
+        await session.commit()
+
+    if executions:
+        print(f"Handed back {len(executions)} unfinished executions ({requeued} requeued)")
+    return len(executions)
+
+async def _abandon_executions(session, executions) -> int:
+    """Requeue or fail executions whose worker is gone and return how many were requeued"""
+    failed_per_batch: Dict[str, int] = {}
+    requeued = 0
+    for execution in executions:
+        with _controls_lock:
+            usage = _released_usage.pop(execution.id, None)
+        if usage is not None:
+            tokens, prompt_tokens, cached_prompt_tokens = usage
+            execution.total_tokens = (execution.total_tokens or 0) + tokens
+            execution.prompt_tokens = (execution.prompt_tokens or 0) + prompt_tokens
+            execution.cached_prompt_tokens = (execution.cached_prompt_tokens or 0) + cached_prompt_tokens
+        if work_queue_enabled() and requeue_execution(execution):
+            requeued += 1
+            continue
+        execution.status = "cancelled" if execution.cancel_requested else "failed"
+        execution.error = f"Worker {execution.worker_id or 'unknown'} stopped before the execution finished"
+        execution.completed_at = utcnow()
+        await record_execution(session, execution)
+        if execution.batch_id:
+            failed_per_batch[execution.batch_id] = failed_per_batch.get(execution.batch_id, 0) + 1
+
+    for batch_id, count in failed_per_batch.items():
+        await session.execute(
+            update(DBExecutionBatch)
+            .where(DBExecutionBatch.id == batch_id)
+            .values(failed_items=DBExecutionBatch.failed_items + count)
+        )
+    if failed_per_batch:
+        # Batches whose runner died are finished once every item is accounted for
+        await session.execute(
+            update(DBExecutionBatch)
+            .where(DBExecutionBatch.id.in_(list(failed_per_batch)))
+            .where(DBExecutionBatch.status != "completed")
+            .where(DBExecutionBatch.completed_items + DBExecutionBatch.failed_items >= DBExecutionBatch.total_items)
+            .values(status="completed", completed_at=utcnow())
+        )
+    return requeued
+
+async def execution_supervisor_loop() -> None:
+    """Send heartbeats for this process's executions and reap orphans left by dead workers"""
+    while True:
+        try:
+            await heartbeat()
+            if EXECUTION_STALE_AFTER:
+                await reap_orphaned_executions()
+        except Exception as e:
+            print(f"Error supervising executions: {str(e)}")
+        await asyncio.sleep(EXECUTION_HEARTBEAT_INTERVAL)
@@ -0,0 +1,196 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Lanes in priority order. Frontend runs are interactive, batch items default to the batch lane.
+PRIORITIES = ("interactive", "normal", "batch")
+
+EXECUTION_MAX_CONCURRENCY = int(os.getenv("EXECUTION_MAX_CONCURRENCY", "8"))
+EXECUTION_MAX_PER_CREW = int(os.getenv("EXECUTION_MAX_PER_CREW", "4"))  # 0 disables the per-crew cap
+# Slots only interactive runs may use, so bulk work never fills the whole pool
+EXECUTION_INTERACTIVE_RESERVED = int(os.getenv("EXECUTION_INTERACTIVE_RESERVED", "2"))
+# Relative share of each owner within a lane, e.g. {"team-a": 3, "team-b": 1}. Unlisted owners get 1.
+EXECUTION_OWNER_WEIGHTS = json.loads(os.getenv("EXECUTION_OWNER_WEIGHTS", "{}"))
+
+DEFAULT_OWNER = "default"
+
+@dataclass
+class _Waiter:
+    crew_id: int
+    owner: str
+    priority: str
+    start_tag: float
+    finish_tag: float
+    enqueued_at: float
+    future: asyncio.Future
+    granted_at: Optional[float] = None
+
+@dataclass
+class _Lane:
+    # One heap per crew so a crew at its cap never blocks the others
+    crews: Dict[int, List] = field(default_factory=dict)
+    virtual_time: float = 0.0
+    owner_finish: Dict[str, float] = field(default_factory=dict)
+    depth: Counter = field(default_factory=Counter)  # waiting runs per owner
+    waits: deque = field(default_factory=lambda: deque(maxlen=1000))  # recent queue waits in seconds
+
+def _percentile(values: List[float], percentile: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * percentile))], 3)
+
+class ExecutionScheduler:
+    """
+    Admits crew runs into a bounded pool of execution slots.
+
+    Lanes are served in strict priority order. Within a lane, owners share the slots by
+    weighted fair queuing (start-time tags), and no crew runs more than max_per_crew at once.
+    """
+
+    def __init__(self, max_concurrency: int = EXECUTION_MAX_CONCURRENCY, max_per_crew: int = EXECUTION_MAX_PER_CREW,
+                 interactive_reserved: int = EXECUTION_INTERACTIVE_RESERVED, owner_weights: Optional[Dict[str, float]] = None):
+        self.max_concurrency = max_concurrency
+        self.max_per_crew = max_per_crew
+        self.interactive_reserved = min(interactive_reserved, max_concurrency - 1)
+        self.owner_weights = owner_weights if owner_weights is not None else EXECUTION_OWNER_WEIGHTS
+        self.lanes = {priority: _Lane() for priority in PRIORITIES}
+        self.running = 0
+        self.running_per_crew: Counter = Counter()
+        self.running_per_lane: Counter = Counter()
+        self._sequence = itertools.count()
+
+    def split(self, processes: int) -> None:
+        """Keep this process to its share of the slots, when that many processes run executions"""
+        if processes <= 1:
+            return
+        self.max_concurrency = max(1, self.max_concurrency // processes)
+        if self.max_per_crew:
+            self.max_per_crew = max(1, self.max_per_crew // processes)
+        if self.interactive_reserved > 0:
+            self.interactive_reserved = min(max(1, self.interactive_reserved // processes), self.max_concurrency - 1)
+
+    def _has_capacity(self, priority: str) -> bool:
+        limit = self.max_concurrency
+        if priority != "interactive":
+            limit -= self.interactive_reserved
+        return self.running < limit
+
+    def _crew_has_capacity(self, crew_id: int) -> bool:
+        return not self.max_per_crew or self.running_per_crew[crew_id] < self.max_per_crew
+
+    def _dispatch(self) -> None:
+        for priority in PRIORITIES:
+            lane = self.lanes[priority]
+            while self._has_capacity(priority):
+                best = None
+                for crew_id, heap in list(lane.crews.items()):
+                    # Drop runs whose caller stopped waiting
+                    while heap and heap[0][2].future.done():
+                        heapq.heappop(heap)
+                    if not heap:
+                        del lane.crews[crew_id]
+                    elif self._crew_has_capacity(crew_id) and (best is None or heap[0] < best[0]):
+                        best = (heap[0], heap)
+                if best is None:
+                    break
+
+                _, _, waiter = heapq.heappop(best[1])
+                lane.virtual_time = max(lane.virtual_time, waiter.start_tag)
+                lane.depth[waiter.owner] -= 1
+                if not lane.depth[waiter.owner]:
+                    del lane.depth[waiter.owner]
+                waiter.granted_at = time.monotonic()
+                lane.waits.append(waiter.granted_at - waiter.enqueued_at)
+                self.running += 1
+                self.running_per_crew[waiter.crew_id] += 1
+                self.running_per_lane[priority] += 1
+                waiter.future.set_result(None)
+
+    async def acquire(self, crew_id: int, owner: Optional[str] = None, priority: str = "normal") -> _Waiter:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Priority must be one of {', '.join(PRIORITIES)}")
+        owner = owner or DEFAULT_OWNER
+        lane = self.lanes[priority]
+
+        start_tag = max(lane.virtual_time, lane.owner_finish.get(owner, 0.0))
+        finish_tag = start_tag + 1.0 / float(self.owner_weights.get(owner, 1) or 1)
+        lane.owner_finish[owner] = finish_tag
+        waiter = _Waiter(
+            crew_id=crew_id,
+            owner=owner,
+            priority=priority,
+            start_tag=start_tag,
+            finish_tag=finish_tag,
+            enqueued_at=time.monotonic(),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(lane.crews.setdefault(crew_id, []), (start_tag, next(self._sequence), waiter))
+        lane.depth[owner] += 1
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.granted_at is not None:
+                self.release(waiter)
+            else:
+                lane.depth[owner] -= 1
+                if not lane.depth[owner]:
+                    del lane.depth[owner]
+            raise
+        return waiter
+
+    def release(self, waiter: _Waiter) -> None:
+        self.running -= 1
+        self.running_per_crew[waiter.crew_id] -= 1
+        if not self.running_per_crew[waiter.crew_id]:
+            del self.running_per_crew[waiter.crew_id]
+        self.running_per_lane[waiter.priority] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, crew_id: int, owner: Optional[str] = None, priority: str = "normal"):
+        """Wait for an execution slot and hold it for the duration of the block"""
+        waiter = await self.acquire(crew_id, owner, priority)
+        try:
+            yield waiter
+        finally:
+            self.release(waiter)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        lanes = {}
+        for priority, lane in self.lanes.items():
+            waiting = [entry[2] for heap in lane.crews.values() for entry in heap if not entry[2].future.done()]
+            waits = list(lane.waits)
+            lanes[priority] = {
+                "queued": len(waiting),
+                "running": self.running_per_lane[priority],
+                "queued_by_owner": dict(lane.depth),
+                "oldest_wait_seconds": round(max((now - waiter.enqueued_at for waiter in waiting), default=0.0), 3),
+                "wait_p50_seconds": _percentile(waits, 0.5),
+                "wait_p95_seconds": _percentile(waits, 0.95),
+                "wait_max_seconds": round(max(waits), 3) if waits else None,
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_per_crew": self.max_per_crew,
+            "interactive_reserved": self.interactive_reserved,
+            "running": self.running,
+            "running_by_crew": dict(self.running_per_crew),
+            "lanes": lanes,
+        }
+
+execution_scheduler = ExecutionScheduler()
@@ -0,0 +1,155 @@
+"""
+Production launcher. The application, crewai and the tool registry are imported once, then
+worker processes are forked that share this memory copy-on-write and accept connections
+on the same socket:
+
+    python -m app.serve --workers 4 --port 8000
+
+SIGTERM or SIGINT stops the workers gracefully. Executions still running after
+SERVE_DRAIN_TIMEOUT seconds are handed back: requeued with EXECUTION_QUEUE=database,
+failed and resumable otherwise.
+"""
+import argparse
+import asyncio
+import gc
+import os
+import signal
+import socket
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SERVE_HOST = os.getenv("SERVE_HOST", "0.0.0.0")
+SERVE_PORT = int(os.getenv("SERVE_PORT", "8000"))
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", "0")) or os.cpu_count() or 1  # 0 = one per core
+# Seconds a stopping worker waits for in-flight requests before handing their executions back
+SERVE_DRAIN_TIMEOUT = float(os.getenv("SERVE_DRAIN_TIMEOUT", "30"))
+# Workers still alive this long after the drain timeout are killed
+SERVE_KILL_GRACE = float(os.getenv("SERVE_KILL_GRACE", "30"))
+SERVE_LOG_LEVEL = os.getenv("SERVE_LOG_LEVEL", "info")
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(sock: socket.socket, index: int) -> None:
+    """Body of a forked worker process"""
+    import uvicorn
+    from app.main import app
+
+    # Partition maintenance, retention and the mirrors only run in the first worker
+    app.state.background_jobs = index == 0
+    config = uvicorn.Config(
+        app,
+        lifespan="on",
+        log_level=SERVE_LOG_LEVEL,
+        timeout_graceful_shutdown=SERVE_DRAIN_TIMEOUT or None
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+def prepare_schema() -> None:
+    """Migrate once here, so the workers do not all try at startup"""
+    from app.database import engine, init_db
+
+    async def run():
+        try:
+            await init_db()
+        finally:
+            # The connections belong to this event loop, the workers open their own
+            await engine.dispose()
+
+    asyncio.run(run())
+
+def serve(workers: int, host: str, port: int) -> None:
+    # Everything imported here is shared with the workers until one of them writes to it
+    from app.main import app
+    from app.database import DB_AUTO_CREATE
+    from app.cache import LocalCache, crew_cache
+    from app.execution import preload_execution_modules
+    from app.rate_limit import admission_controller
+    from app.scheduler import execution_scheduler
+
+    if workers > 1 and isinstance(crew_cache.backend, LocalCache):
+        # Every worker would keep and fill its own copy, CREW_CACHE_URL gives them one to share
+        print("Crew cache disabled for several workers, set CREW_CACHE_URL to share one")
+        crew_cache.backend = None
+    # Each worker admits LLM calls and executions on its own, so each gets its share of the limits
+    admission_controller.split(workers)
+    execution_scheduler.split(workers)
+
+    if DB_AUTO_CREATE:
+        prepare_schema()
+        app.state.schema_ready = True
+
+    preload_execution_modules()
+    gc.collect()
+    # Keep the workers' garbage collector from touching, and so copying, the preloaded objects
+    gc.freeze()
+
+    sock = bind_socket(host, port)
+    children = {}  # pid -> worker index
+    stopping = False
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                run_worker(sock, index)
+            finally:
+                os._exit(0)
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(workers):
+        spawn(index)
+    print(f"Serving on http://{host}:{port} with {workers} workers (pid {os.getpid()})")
+
+    kill_at = None
+    while children:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if stopping and kill_at is None:
+                kill_at = time.monotonic() + SERVE_DRAIN_TIMEOUT + SERVE_KILL_GRACE
+            if kill_at is not None and time.monotonic() > kill_at:
+                print(f"Killing {len(children)} workers that did not stop in time")
+                for child in children:
+                    os.kill(child, signal.SIGKILL)
+                kill_at = float("inf")
+            time.sleep(0.5)
+            continue
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"Worker {pid} exited with code {os.waitstatus_to_exitcode(status)}, restarting")
+            time.sleep(1)
+            spawn(index)
+    sock.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the API from pre-forked worker processes")
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS, help="worker processes (default: one per core)")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    args = parser.parse_args()
+    serve(args.workers, args.host, args.port)
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,32 @@
-from app.tools.web_search import search_tool
-from app.tools.weather import weather_tool
-from app.tools.news import news_tool
-from app.tools.confluence import (
-    create_page_tool,
-    update_page_tool,
-    delete_page_tool,
-    get_page_tool,
-    search_pages_tool
-)
-from app.tools.jira import (
-    create_issue_tool,
-    update_issue_tool,
-    delete_issue_tool,
-    add_comment_tool,
-    get_issue_tool,
-    search_issues_tool
-)
+import os
+from importlib import import_module
 
-# Dictionary of all available tools
-TOOLS = {
-    "WebSearch": search_tool,
-    "Weather": weather_tool,
-    "News": news_tool,
-    "CreateJiraIssue": create_issue_tool,
-    "UpdateJiraIssue": update_issue_tool,
-    "DeleteJiraIssue": delete_issue_tool,
-    "AddJiraComment": add_comment_tool,
-    "GetJiraIssue": get_issue_tool,
-    "SearchJiraIssues": search_issues_tool,
-    "CreateConfluencePage": create_page_tool,
-    "UpdateConfluencePage": update_page_tool,
-    "DeleteConfluencePage": delete_page_tool,
-    "GetConfluencePage": get_page_tool,
-    "SearchConfluencePages": search_pages_tool
+from dotenv import load_dotenv
+
+from app.cassette import install_http_cassette
+
+load_dotenv()
+
+# The Python tool runs agent code on this host, outside any security boundary, so it is opt-in
+PYTHON_TOOL_ENABLED = os.getenv("PYTHON_TOOL_ENABLED", "false").lower() == "true"
+
+# Module and instance of every tool. Tools are imported on first use, as their clients
+# (langchain, atlassian) are slow to import and Jira/Confluence need credentials.
+TOOL_LOCATIONS = {
+    "WebSearch": ("app.tools.web_search", "search_tool"),
+    "Weather": ("app.tools.weather", "weather_tool"),
+    "News": ("app.tools.news", "news_tool"),
+    "CreateJiraIssue": ("app.tools.jira", "create_issue_tool"),
+    "UpdateJiraIssue": ("app.tools.jira", "update_issue_tool"),
+    "DeleteJiraIssue": ("app.tools.jira", "delete_issue_tool"),
+    "AddJiraComment": ("app.tools.jira", "add_comment_tool"),
+    "GetJiraIssue": ("app.tools.jira", "get_issue_tool"),
+    "SearchJiraIssues": ("app.tools.jira", "search_issues_tool"),
+    "CreateConfluencePage": ("app.tools.confluence", "create_page_tool"),
+    "UpdateConfluencePage": ("app.tools.confluence", "update_page_tool"),
+    "DeleteConfluencePage": ("app.tools.confluence", "delete_page_tool"),
+    "GetConfluencePage": ("app.tools.confluence", "get_page_tool"),
+    "SearchConfluencePages": ("app.tools.confluence", "search_pages_tool")
 }
 
 # Tool descriptions for documentation
@@ -53,6 +47,17 @@ TOOL_DESCRIPTIONS = {
     "SearchConfluencePages": "Search for Confluence pages using CQL"
 }
 
+if PYTHON_TOOL_ENABLED:
+    TOOL_LOCATIONS["Python"] = ("app.tools.python_repl", "python_tool")
+    TOOL_DESCRIPTIONS["Python"] = "Run Python code for data analysis in a sandboxed process"
+
+def get_tool(name: str):
+    """Import a tool's module on first use and return the tool instance"""
+    # With CASSETTE_MODE set, the HTTP requests of every tool are recorded or replayed
+    install_http_cassette()
+    module_name, attribute = TOOL_LOCATIONS[name]
+    return getattr(import_module(module_name), attribute)
+
 def get_available_tools(tool_names: list = None) -> dict:
     """
     Get a dictionary of available tools, optionally filtered by name.
@@ -64,6 +69,6 @@ def get_available_tools(tool_names: list = None) -> dict:
         dict: Dictionary of tool name to Tool object
     """
     if tool_names is None:
-        return TOOLS
+        tool_names = list(TOOL_LOCATIONS)
     
-    return {name: TOOLS[name] for name in tool_names if name in TOOLS} 
\ No newline at end of file
+    return {name: get_tool(name) for name in tool_names if name in TOOL_LOCATIONS}
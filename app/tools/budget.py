@@ -0,0 +1,127 @@
+"""
+Output budgets for tools.
+
+Whatever a tool returns goes into the agent's prompt and is paid for on every later LLM turn,
+so outputs over budget are cut to a head and a tail window. The full output is kept in the
+tool output namespace of the blob store under its content hash, for TOOL_OUTPUT_RETENTION_HOURS,
+and the agent can read the omitted part page by page with the ReadToolOutput tool.
+"""
+import asyncio
+import json
+import os
+import re
+from typing import Any, Optional, Type
+
+from dotenv import load_dotenv
+from langchain.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from app.blob_store import TOOL_OUTPUT_NAMESPACE, get_blob_store
+from app.rate_limit import estimate_tokens
+
+load_dotenv()
+
+# Default budget of every tool in estimated tokens (0 = unlimited)
+TOOL_OUTPUT_MAX_TOKENS = int(os.getenv("TOOL_OUTPUT_MAX_TOKENS", "2000"))
+# Budgets of single tools by registry name, e.g. {"GetConfluencePage": 4000, "WebSearch": 3000}
+TOOL_OUTPUT_BUDGETS = json.loads(os.getenv("TOOL_OUTPUT_BUDGETS", "{}"))
+# Share of the budget given to the end of the output
+TOOL_OUTPUT_TAIL_FRACTION = float(os.getenv("TOOL_OUTPUT_TAIL_FRACTION", "0.2"))
+# Keep cut outputs in the blob store and give agents the ReadToolOutput tool to page through them
+TOOL_OUTPUT_HANDLES = os.getenv("TOOL_OUTPUT_HANDLES", "true").lower() == "true"
+
+# Same estimate as app.rate_limit.estimate_tokens
+CHARS_PER_TOKEN = 4
+
+def resolve_budget(tool_name: str, agent_budget: Optional[int] = None) -> Optional[int]:
+    """The tool's budget (or the default), capped by the agent's budget. None means unlimited."""
+    budgets = [budget for budget in (TOOL_OUTPUT_BUDGETS.get(tool_name, TOOL_OUTPUT_MAX_TOKENS), agent_budget) if budget]
+    return min(budgets) if budgets else None
+
+def _slack(size: int) -> int:
+    # How far a cut may move to land on a line or word boundary, so no token is split in half
+    return min(max(size // 10, 16), size // 2)
+
+def _head(text: str, size: int) -> str:
+    head = text[:size]
+    boundary = max(head.rfind("\n"), head.rfind(" "))
+    return head[:boundary + 1] if boundary >= size - _slack(size) else head
+
+def _tail(text: str, size: int) -> str:
+    if size <= 0:
+        return ""
+    tail = text[-size:]
+    match = re.search(r"\s", tail)
+    return tail[match.end():] if match and match.start() < _slack(size) else tail
+
+def limit_output(output: Any, max_tokens: Optional[int], keep_handle: bool = TOOL_OUTPUT_HANDLES) -> str:
+    """Cut an output over budget to its head and tail, with a note on how to read the rest"""
+    text = output if isinstance(output, str) else str(output)
+    if not max_tokens or estimate_tokens(text) <= max_tokens:
+        return text
+
+    size = max_tokens * CHARS_PER_TOKEN
+    tail_size = int(size * TOOL_OUTPUT_TAIL_FRACTION)
+    head = _head(text, size - tail_size)
+    tail = _tail(text, tail_size)
+    omitted = len(text) - len(head) - len(tail)
+    note = f"[... {omitted} characters (about {estimate_tokens(text[len(head):len(text) - len(tail)])} tokens) omitted"
+    if keep_handle:
+        handle = get_blob_store(TOOL_OUTPUT_NAMESPACE).put(text.encode("utf-8"))
+        note += f", read them with ReadToolOutput using handle {handle} and start {len(head)}"
+    return f"{head}\n\n{note} ...]\n\n{tail}"
+
+class BudgetedTool(BaseTool):
+    """A tool whose outputs are kept within a token budget"""
+
+    tool: Any
+    max_tokens: int
+
+    def _run(self, *args, **kwargs) -> str:
+        return limit_output(self.tool._run(*args, **kwargs), self.max_tokens)
+
+    async def _arun(self, *args, **kwargs) -> str:
+        return await asyncio.to_thread(self._run, *args, **kwargs)
+
+def budget_tool(tool: BaseTool, tool_name: str, agent_budget: Optional[int] = None) -> BaseTool:
+    """Wrap a shared tool instance for one agent, or return it as is when it has no budget"""
+    max_tokens = resolve_budget(tool_name, agent_budget)
+    if max_tokens is None:
+        return tool
+    return BudgetedTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        tool=tool,
+        max_tokens=max_tokens
+    )
+
+class ReadToolOutputInput(BaseModel):
+    handle: str = Field(description="The handle given in the note of a cut tool output")
+    start: int = Field(default=0, description="Character offset to read from, as given in the note")
+
+class ReadToolOutputTool(BaseTool):
+    name: str = "ReadToolOutput"
+    description: str = "Read the part of a long tool output that was omitted, one page at a time"
+    args_schema: Type[BaseModel] = ReadToolOutputInput
+    return_direct: bool = False
+    page_tokens: int = TOOL_OUTPUT_MAX_TOKENS or 2000
+
+    def _run(self, handle: str, start: int = 0) -> str:
+        handle = handle.strip().lower()
+        if not re.fullmatch(r"[0-9a-f]{64}", handle):
+            return "Error: not a tool output handle"
+        try:
+            # Only tool outputs can be read, not execution results or other payloads
+            text = get_blob_store(TOOL_OUTPUT_NAMESPACE).get(handle).decode("utf-8")
+        except Exception:
+            return f"Error: no tool output with handle {handle}"
+        start = max(0, start)
+        end = min(len(text), start + self.page_tokens * CHARS_PER_TOKEN)
+        page = text[start:end]
+        if end < len(text):
+            page += f"\n\n[... {len(text) - end} more characters, continue with start {end} ...]"
+        return page
+
+    async def _arun(self, handle: str, start: int = 0) -> str:
+        return await asyncio.to_thread(self._run, handle, start)
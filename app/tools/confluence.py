@@ -5,6 +5,7 @@ from typing import Optional, Dict, Any, Type
 from pydantic import BaseModel, Field
 import requests
 from datetime import datetime
+from app.tools.confluence_mirror import cql_text_search, refresh_page, search_mirror
 
 class CreateConfluencePageInput(BaseModel):
     space_key: str = Field(description="The Confluence space key")
@@ -54,6 +55,7 @@ class ConfluenceAPI:
                 parent_id=parent_id,
                 representation='storage'
             )
+            refresh_page(self.confluence, page['id'])
             return f"Successfully created page: {page['_links']['webui']}"
         except Exception as e:
             return f"Error creating page: {str(e)}"
@@ -73,6 +75,7 @@ class ConfluenceAPI:
                 version=version,
                 representation='storage'
             )
+            refresh_page(self.confluence, page_id)
             return f"Successfully updated page: {updated_page['_links']['webui']}"
         except Exception as e:
             return f"Error updating page: {str(e)}"
@@ -81,6 +84,7 @@ class ConfluenceAPI:
         """Delete a Confluence page"""
         try:
             self.confluence.remove_page(page_id)
+            refresh_page(self.confluence, page_id)
             return f"Successfully deleted page {page_id}"
         except Exception as e:
             return f"Error deleting page: {str(e)}"
@@ -94,8 +98,19 @@ class ConfluenceAPI:
             return f"Error getting page: {str(e)}"
     
     def search_pages(self, query: str, space_key: Optional[str] = None) -> str:
-        """Search for Confluence pages"""
+        """Search for Confluence pages with CQL, from the local mirror for plain text searches in a mirrored space"""
         try:
+            text_search = cql_text_search(query)
+            mirrored = None
+            if text_search is not None and (space_key is None or text_search[1] in (None, space_key)):
+                mirrored = search_mirror(text_search[0], text_search[1] or space_key, limit=10)
+            if mirrored is not None:
+                pages = [
+                    f"Title: {page['title']}\nID: {page['id']}\nURL: {page['url']}\nSnippet: {page['snippet']}"
+                    for page in mirrored
+                ]
+                return "\n\n".join(pages) if pages else "No pages found"
+
             results = self.confluence.cql(
                 query,
                 limit=10,
@@ -181,6 +196,7 @@ search_pages_tool = SearchConfluencePagesTool()
 class ConfluenceInput(BaseModel):
     query: str = Field(description="The search query to find Confluence pages")
     max_results: Optional[int] = Field(5, description="Maximum number of results to return")
+    space_key: Optional[str] = Field(None, description="Only search pages in this space")
 
 class ConfluenceTool(BaseTool):
     name: str = "Confluence"
@@ -188,8 +204,24 @@ class ConfluenceTool(BaseTool):
     args_schema: Type[BaseModel] = ConfluenceInput
     return_direct: bool = False
     
-    def _run(self, query: str, max_results: int = 5) -> str:
-        """Search Confluence using CQL query"""
+    def _run(self, query: str, max_results: int = 5, space_key: Optional[str] = None) -> str:
+        """
+        Search the local Confluence mirror when the search is confined to a mirrored space,
+        otherwise Confluence itself using a CQL query
+        """
+        mirrored = search_mirror(query, space_key, limit=max_results)
+        if mirrored is not None:
+            if not mirrored:
+                return "No pages found matching the query."
+            return "\n".join(
+                f"Title: {page['title']}\n"
+                f"Space: {page['space_name']}\n"
+                f"URL: {page['url']}\n"
+                f"Last Updated: {datetime.fromisoformat(page['last_modified'].replace('Z', '+00:00')).strftime('%Y-%m-%d %H:%M:%S')}\n"
+                f"Snippet: {page['snippet']}\n"
+                for page in mirrored
+            )
+
         confluence_url = os.getenv("CONFLUENCE_URL")
         confluence_email = os.getenv("CONFLUENCE_EMAIL")
         confluence_token = os.getenv("CONFLUENCE_API_TOKEN")
@@ -211,7 +243,7 @@ class ConfluenceTool(BaseTool):
                 headers=headers,
                 auth=auth,
                 params={
-                    "cql": f'text ~ "{query}"',
+                    "cql": f'text ~ "{query}"' + (f' and space = "{space_key}"' if space_key else ""),
                     "limit": max_results,
                     "expand": "version,space"
                 }
@@ -238,7 +270,7 @@ class ConfluenceTool(BaseTool):
         except Exception as e:
             return f"Error accessing Confluence: {str(e)}"
     
-    async def _arun(self, query: str, max_results: int = 5) -> str:
-        return self._run(query, max_results)
+    async def _arun(self, query: str, max_results: int = 5, space_key: Optional[str] = None) -> str:
+        return self._run(query, max_results, space_key)
 
 confluence_tool = ConfluenceTool() 
\ No newline at end of file
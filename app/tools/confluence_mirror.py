@@ -0,0 +1,231 @@
+"""
+Local full-text mirror of selected Confluence spaces.
+
+Pages are synced incrementally by last-modified date into an SQLite FTS5 index, so the
+search tools answer from it in milliseconds and only call Confluence while it is stale.
+Run a one-off sync with `python -m app.tools.confluence_mirror [--full]`.
+"""
+import argparse
+import asyncio
+import html
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.tools.mirror import connect_mirror, fts_query, get_watermark, is_fresh, set_watermark
+
+load_dotenv()
+
+# Comma-separated space keys to mirror (unset disables the mirror)
+CONFLUENCE_MIRROR_SPACES = [space.strip() for space in os.getenv("CONFLUENCE_MIRROR_SPACES", "").split(",") if space.strip()]
+CONFLUENCE_MIRROR_INTERVAL = int(os.getenv("CONFLUENCE_MIRROR_INTERVAL", "900"))  # seconds between syncs
+# Searches fall back to Confluence when a space was not synced for this long
+CONFLUENCE_MIRROR_MAX_AGE = int(os.getenv("CONFLUENCE_MIRROR_MAX_AGE", "3600"))
+# CQL dates are minute-precise and in the user's time zone, so each sync re-reads this much history
+CONFLUENCE_MIRROR_OVERLAP_MINUTES = int(os.getenv("CONFLUENCE_MIRROR_OVERLAP_MINUTES", "1440"))
+CONFLUENCE_MIRROR_PAGE_SIZE = int(os.getenv("CONFLUENCE_MIRROR_PAGE_SIZE", "50"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS confluence_pages (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    space_key TEXT,
+    space_name TEXT,
+    title TEXT,
+    url TEXT,
+    last_modified TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_confluence_pages_space_key ON confluence_pages (space_key);
+CREATE VIRTUAL TABLE IF NOT EXISTS confluence_pages_fts USING fts5(title, body);
+"""
+
+def mirror_enabled() -> bool:
+    return bool(CONFLUENCE_MIRROR_SPACES)
+
+def storage_to_text(storage: str) -> str:
+    """Plain text of a page body in Confluence storage format"""
+    text = re.sub(r"<[^>]+>", " ", storage or "")
+    return re.sub(r"\s+", " ", html.unescape(text)).strip()
+
+def _upsert_page(conn, page: dict, base_url: str) -> None:
+    rowid = conn.execute(
+        "INSERT INTO confluence_pages (id, space_key, space_name, title, url, last_modified) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (id) DO UPDATE SET space_key = excluded.space_key, space_name = excluded.space_name, "
+        "title = excluded.title, url = excluded.url, last_modified = excluded.last_modified "
+        "RETURNING rowid",
+        (
+            page["id"],
+            page.get("space", {}).get("key"),
+            page.get("space", {}).get("name"),
+            page["title"],
+            base_url + page.get("_links", {}).get("webui", ""),
+            page.get("version", {}).get("when"),
+        )
+    ).fetchone()[0]
+    body = storage_to_text(page.get("body", {}).get("storage", {}).get("value", ""))
+    conn.execute("DELETE FROM confluence_pages_fts WHERE rowid = ?", (rowid,))
+    conn.execute("INSERT INTO confluence_pages_fts (rowid, title, body) VALUES (?, ?, ?)", (rowid, page["title"], body))
+
+def _delete_pages(conn, rowids: List[int]) -> None:
+    for rowid in rowids:
+        conn.execute("DELETE FROM confluence_pages_fts WHERE rowid = ?", (rowid,))
+        conn.execute("DELETE FROM confluence_pages WHERE rowid = ?", (rowid,))
+
+def sync_space(client, space_key: str, full: bool = False) -> int:
+    """
+    Mirror the pages of one space changed since the last sync and return how many were written.
+    A full sync re-reads every page and drops mirrored pages that no longer exist.
+    """
+    conn = connect_mirror(SCHEMA)
+    try:
+        watermark = None if full else get_watermark(conn, "confluence", space_key)
+        cql = f'space = "{space_key}" and type = page'
+        if watermark:
+            since = datetime.fromisoformat(watermark.replace("Z", "+00:00")) - timedelta(minutes=CONFLUENCE_MIRROR_OVERLAP_MINUTES)
+            cql += f' and lastmodified >= "{since:%Y-%m-%d %H:%M}"'
+        cql += " order by lastmodified asc"
+
+        newest = watermark
+        seen = set()
+        start = 0
+        while True:
+            data = client.get("rest/api/content/search", params={
+                "cql": cql,
+                "start": start,
+                "limit": CONFLUENCE_MIRROR_PAGE_SIZE,
+                "expand": "body.storage,version,space",
+            })
+            results = data.get("results", [])
+            base_url = data.get("_links", {}).get("base", "")
+            for page in results:
+                _upsert_page(conn, page, base_url)
+                seen.add(page["id"])
+                when = page.get("version", {}).get("when")
+                if when and (newest is None or when > newest):
+                    newest = when
+            conn.commit()
+            if len(results) < CONFLUENCE_MIRROR_PAGE_SIZE:
+                break
+            start += len(results)
+
+        if full:
+            rows = conn.execute("SELECT rowid, id FROM confluence_pages WHERE space_key = ?", (space_key,)).fetchall()
+            _delete_pages(conn, [row["rowid"] for row in rows if row["id"] not in seen])
+        set_watermark(conn, "confluence", space_key, newest)
+        conn.commit()
+        return len(seen)
+    finally:
+        conn.close()
+
+def sync_spaces(client, full: bool = False) -> Dict[str, int]:
+    return {space_key: sync_space(client, space_key, full) for space_key in CONFLUENCE_MIRROR_SPACES}
+
+def search_mirror(query: str, space_key: Optional[str], limit: int = 10) -> Optional[List[dict]]:
+    """
+    Ranked matches with highlighted snippets, or None when the mirror cannot answer: it is
+    disabled, the search is not confined to a mirrored space (without a space key it covers
+    every space in Confluence), or the space was not synced within CONFLUENCE_MIRROR_MAX_AGE.
+    """
+    if space_key not in CONFLUENCE_MIRROR_SPACES:
+        return None
+    match = fts_query(query)
+    if match is None:
+        return None
+
+    conn = connect_mirror(SCHEMA)
+    try:
+        if not is_fresh(conn, "confluence", space_key, CONFLUENCE_MIRROR_MAX_AGE):
+            return None
+        # Title matches weigh five times as much as body matches
+        sql = (
+            "SELECT p.id, p.title, p.space_key, p.space_name, p.url, p.last_modified, "
+            "snippet(confluence_pages_fts, 1, '[', ']', '...', 24) AS snippet "
+            "FROM confluence_pages_fts JOIN confluence_pages p ON p.rowid = confluence_pages_fts.rowid "
+            "WHERE confluence_pages_fts MATCH ? AND p.space_key = ? "
+            "ORDER BY bm25(confluence_pages_fts, 5.0, 1.0) LIMIT ?"
+        )
+        return [dict(row) for row in conn.execute(sql, (match, space_key, limit)).fetchall()]
+    finally:
+        conn.close()
+
+def refresh_page(client, page_id: str) -> None:
+    """
+    Re-read a page written by our own tools so the mirror never serves the old version.
+    The page is dropped if it cannot be read or left the mirrored spaces.
+    """
+    if not mirror_enabled():
+        return
+    conn = connect_mirror(SCHEMA)
+    try:
+        try:
+            page = client.get_page_by_id(str(page_id), expand="body.storage,version,space")
+        except Exception:
+            page = None
+        if page and page.get("space", {}).get("key") in CONFLUENCE_MIRROR_SPACES:
+            _upsert_page(conn, page, page.get("_links", {}).get("base", ""))
+        else:
+            rows = conn.execute("SELECT rowid FROM confluence_pages WHERE id = ?", (str(page_id),)).fetchall()
+            _delete_pages(conn, [row["rowid"] for row in rows])
+        conn.commit()
+    finally:
+        conn.close()
+
+# CQL answered from the mirror: a text search, optionally narrowed to a space and to pages
+_CQL_CLAUSE = re.compile(
+    r'\s*(?:(?:text|sitesearch)\s*~\s*"((?:[^"\\]|\\.)*)"|space\s*=\s*"?([\w~-]+)"?|(type\s*=\s*"?page"?))\s*',
+    re.IGNORECASE
+)
+
+def cql_text_search(cql: str) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    The text and space key of a CQL query such as `text ~ "deploy" and space = ENG`, or None
+    when the query uses anything else, in which case it goes to Confluence.
+    """
+    text, space_key = None, None
+    position = 0
+    while True:
+        match = _CQL_CLAUSE.match(cql, position)
+        if not match or match.end() == position:
+            return None
+        words, space, is_type = match.groups()
+        if words is not None:
+            if text is not None:
+                return None
+            text = words.replace('\\"', '"')
+        elif space is not None:
+            if space_key is not None:
+                return None
+            space_key = space
+        position = match.end()
+        if position == len(cql):
+            break
+        conjunction = re.compile(r"and\b", re.IGNORECASE).match(cql, position)
+        if not conjunction:
+            return None
+        position = conjunction.end()
+    if text is None:
+        return None
+    return text, space_key
+
+async def confluence_mirror_loop():
+    """Background job started by the application when CONFLUENCE_MIRROR_SPACES is set"""
+    from app.tools.confluence import confluence_api
+
+    while True:
+        try:
+            synced = await asyncio.to_thread(sync_spaces, confluence_api.confluence)
+            print(f"Confluence mirror synced: {synced}")
+        except Exception as e:
+            print(f"Error syncing Confluence mirror: {str(e)}")
+        await asyncio.sleep(CONFLUENCE_MIRROR_INTERVAL)
+
+if __name__ == "__main__":
+    from app.tools.confluence import confluence_api
+
+    parser = argparse.ArgumentParser(description="Sync the local Confluence mirror")
+    parser.add_argument("--full", action="store_true", help="re-read every page and drop deleted ones")
+    args = parser.parse_args()
+    print(sync_spaces(confluence_api.confluence, full=args.full))
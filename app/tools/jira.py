@@ -5,6 +5,7 @@ from typing import Optional, Dict, Any, Type
 from pydantic import BaseModel, Field
 import requests
 from datetime import datetime
+from app.tools.jira_mirror import get_mirrored_issue, search_mirror, refresh_issue
 
 class CreateJiraIssueInput(BaseModel):
     project_key: str = Field(description="The Jira project key (e.g., 'PROJ')")
@@ -58,6 +59,7 @@ class JiraAPI:
                     "issuetype": {"name": issue_type}
                 }
             )
+            refresh_issue(self.jira, issue['key'])
             return f"Successfully created issue: {issue['key']}"
         except Exception as e:
             return f"Error creating issue: {str(e)}"
@@ -72,6 +74,7 @@ class JiraAPI:
                 fields["description"] = description
             
             self.jira.issue_update(issue_key, fields=fields)
+            refresh_issue(self.jira, issue_key)
             return f"Successfully updated issue {issue_key}"
         except Exception as e:
             return f"Error updating issue: {str(e)}"
@@ -80,6 +83,7 @@ class JiraAPI:
         """Delete a Jira issue"""
         try:
             self.jira.issue_delete(issue_key)
+            refresh_issue(self.jira, issue_key)
             return f"Successfully deleted issue {issue_key}"
         except Exception as e:
             return f"Error deleting issue: {str(e)}"
@@ -88,21 +92,29 @@ class JiraAPI:
         """Add a comment to a Jira issue"""
         try:
             self.jira.issue_add_comment(issue_key, comment)
+            refresh_issue(self.jira, issue_key)
             return f"Successfully added comment to issue {issue_key}"
         except Exception as e:
             return f"Error adding comment: {str(e)}"
     
     def get_issue(self, issue_key: str) -> str:
-        """Get a Jira issue by key"""
+        """Get a Jira issue by key, from the local mirror when it is fresh"""
         try:
+            mirrored = get_mirrored_issue(issue_key)
+            if mirrored is not None:
+                return f"Issue: {mirrored['key']}\nSummary: {mirrored['summary']}\nDescription: {mirrored['description']}"
             issue = self.jira.issue(issue_key)
             return f"Issue: {issue['key']}\nSummary: {issue['fields']['summary']}\nDescription: {issue['fields']['description']}"
         except Exception as e:
             return f"Error getting issue: {str(e)}"
     
     def search_issues(self, jql: str) -> str:
-        """Search for Jira issues using JQL"""
+        """Search for Jira issues using JQL, from the local mirror for simple queries"""
         try:
+            mirrored = search_mirror(jql)
+            if mirrored is not None:
+                results = [f"Issue: {issue['key']}\nSummary: {issue['summary']}" for issue in mirrored]
+                return "\n\n".join(results) if results else "No issues found"
             issues = self.jira.jql(jql)
             results = []
             for issue in issues['issues']:
@@ -205,7 +217,21 @@ class JiraTool(BaseTool):
     return_direct: bool = False
     
     def _run(self, query: str, max_results: int = 5) -> str:
-        """Search Jira using JQL query"""
+        """Search Jira using JQL query, answering simple queries from the local mirror"""
+        mirrored = search_mirror(query, limit=max_results)
+        if mirrored is not None:
+            if not mirrored:
+                return "No issues found matching the query."
+            return "\n".join(
+                f"Key: {issue['key']}\n"
+                f"Summary: {issue['summary']}\n"
+                f"Status: {issue['status']}\n"
+                f"Assignee: {issue['assignee'] or 'Unassigned'}\n"
+                f"Created: {datetime.strptime(issue['created'], '%Y-%m-%dT%H:%M:%S.%f%z').strftime('%Y-%m-%d %H:%M:%S')}\n"
+                f"Updated: {datetime.strptime(issue['updated'], '%Y-%m-%dT%H:%M:%S.%f%z').strftime('%Y-%m-%d %H:%M:%S')}\n"
+                for issue in mirrored
+            )
+
         jira_url = os.getenv("JIRA_URL")
         jira_email = os.getenv("JIRA_EMAIL")
         jira_token = os.getenv("JIRA_API_TOKEN")
@@ -0,0 +1,365 @@
+"""
+Local mirror of selected Jira projects.
+
+Issues updated since the last sync are fetched with `updated >= watermark` JQL and kept
+as compact rows, so repeated issue lookups and simple searches in a run never leave the
+process. Run a one-off sync with `python -m app.tools.jira_mirror [--full]`.
+"""
+import argparse
+import asyncio
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.tools.mirror import connect_mirror, get_watermark, is_fresh, set_watermark
+
+load_dotenv()
+
+# Comma-separated project keys to mirror (unset disables the mirror)
+JIRA_MIRROR_PROJECTS = [project.strip().upper() for project in os.getenv("JIRA_MIRROR_PROJECTS", "").split(",") if project.strip()]
+JIRA_MIRROR_INTERVAL = int(os.getenv("JIRA_MIRROR_INTERVAL", "300"))  # seconds between syncs
+# Lookups fall back to Jira when a project was not synced for this long
+JIRA_MIRROR_MAX_AGE = int(os.getenv("JIRA_MIRROR_MAX_AGE", "900"))
+# JQL dates are minute-precise and in the user's time zone, so each sync re-reads this much history
+JIRA_MIRROR_OVERLAP_MINUTES = int(os.getenv("JIRA_MIRROR_OVERLAP_MINUTES", "1440"))
+JIRA_MIRROR_PAGE_SIZE = int(os.getenv("JIRA_MIRROR_PAGE_SIZE", "100"))
+
+# Only these fields are fetched and stored
+MIRRORED_FIELDS = "summary,description,status,assignee,issuetype,priority,created,updated"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jira_issues (
+    key TEXT PRIMARY KEY,
+    project TEXT NOT NULL,
+    summary TEXT,
+    description TEXT,
+    status TEXT,
+    assignee TEXT,
+    assignee_id TEXT,
+    issue_type TEXT,
+    priority TEXT,
+    created TEXT,
+    updated TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jira_issues_project_updated ON jira_issues (project, updated);
+"""
+
+def mirror_enabled() -> bool:
+    return bool(JIRA_MIRROR_PROJECTS)
+
+def _project_of(issue_key: str) -> str:
+    return issue_key.rsplit("-", 1)[0].upper()
+
+def _upsert_issue(conn, issue: dict) -> None:
+    fields = issue.get("fields", {})
+    assignee = fields.get("assignee") or {}
+    conn.execute(
+        "INSERT INTO jira_issues (key, project, summary, description, status, assignee, assignee_id, issue_type, priority, created, updated) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (key) DO UPDATE SET project = excluded.project, summary = excluded.summary, "
+        "description = excluded.description, status = excluded.status, assignee = excluded.assignee, "
+        "assignee_id = excluded.assignee_id, issue_type = excluded.issue_type, priority = excluded.priority, "
+        "created = excluded.created, updated = excluded.updated",
+        (
+            issue["key"],
+            _project_of(issue["key"]),
+            fields.get("summary"),
+            fields.get("description"),
+            (fields.get("status") or {}).get("name"),
+            assignee.get("displayName"),
+            assignee.get("accountId") or assignee.get("name"),
+            (fields.get("issuetype") or {}).get("name"),
+            (fields.get("priority") or {}).get("name"),
+            fields.get("created"),
+            fields.get("updated"),
+        )
+    )
+
+def sync_project(client, project: str, full: bool = False) -> int:
+    """
+    Mirror the issues of one project updated since the last sync and return how many were written.
+    A full sync re-reads every issue and drops mirrored issues that no longer exist.
+    """
+    conn = connect_mirror(SCHEMA)
+    try:
+        watermark = None if full else get_watermark(conn, "jira", project)
+        jql = f'project = "{project}"'
+        if watermark:
+            since = datetime.fromisoformat(watermark) - timedelta(minutes=JIRA_MIRROR_OVERLAP_MINUTES)
+            jql += f' AND updated >= "{since:%Y-%m-%d %H:%M}"'
+        jql += " ORDER BY updated ASC"
+
+        newest = watermark
+        seen = set()
+        start = 0
+        while True:
+            data = client.jql(jql, fields=MIRRORED_FIELDS, start=start, limit=JIRA_MIRROR_PAGE_SIZE)
+            issues = data.get("issues", [])
+            for issue in issues:
+                _upsert_issue(conn, issue)
+                seen.add(issue["key"])
+                updated = issue.get("fields", {}).get("updated")
+                if updated:
+                    # Jira timestamps look like 2024-01-02T03:04:05.000+0000
+                    updated = datetime.strptime(updated, "%Y-%m-%dT%H:%M:%S.%f%z").isoformat()
+                    if newest is None or datetime.fromisoformat(updated) > datetime.fromisoformat(newest):
+                        newest = updated
+            conn.commit()
+            if len(issues) < JIRA_MIRROR_PAGE_SIZE:
+                break
+            start += len(issues)
+
+        if full:
+            keys = [row["key"] for row in conn.execute("SELECT key FROM jira_issues WHERE project = ?", (project,))]
+            conn.executemany("DELETE FROM jira_issues WHERE key = ?", [(key,) for key in keys if key not in seen])
+        set_watermark(conn, "jira", project, newest)
+        conn.commit()
+        return len(seen)
+    finally:
+        conn.close()
+
+def sync_projects(client, full: bool = False) -> Dict[str, int]:
+    return {project: sync_project(client, project, full) for project in JIRA_MIRROR_PROJECTS}
+
+def _fresh(conn, projects) -> bool:
+    return all(
+        project in JIRA_MIRROR_PROJECTS and is_fresh(conn, "jira", project, JIRA_MIRROR_MAX_AGE)
+        for project in projects
+    )
+
+def get_mirrored_issue(issue_key: str) -> Optional[dict]:
+    """The mirrored issue, or None when it is not mirrored or its project is stale"""
+    if not mirror_enabled():
+        return None
+    conn = connect_mirror(SCHEMA)
+    try:
+        if not _fresh(conn, [_project_of(issue_key)]):
+            return None
+        row = conn.execute("SELECT * FROM jira_issues WHERE key = ?", (issue_key.upper(),)).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+def refresh_issue(client, issue_key: str) -> None:
+    """
+    Re-read an issue written by our own tools so the mirror never serves the old version.
+    The issue is dropped if it cannot be read, and is fetched again with the next sync.
+    """
+    if not mirror_enabled() or _project_of(issue_key) not in JIRA_MIRROR_PROJECTS:
+        return
+    conn = connect_mirror(SCHEMA)
+    try:
+        try:
+            _upsert_issue(conn, client.issue(issue_key, fields=MIRRORED_FIELDS))
+        except Exception:
+            conn.execute("DELETE FROM jira_issues WHERE key = ?", (issue_key.upper(),))
+        conn.commit()
+    finally:
+        conn.close()
+
+# JQL subset served locally: clauses joined by AND, plus an optional single-field ORDER BY
+JQL_COLUMNS = {
+    "project": "project",
+    "key": "key",
+    "issuekey": "key",
+    "summary": "summary",
+    "description": "description",
+    "status": "status",
+    "assignee": "assignee",
+    "type": "issue_type",
+    "issuetype": "issue_type",
+    "priority": "priority",
+    "created": "created",
+    "updated": "updated",
+}
+_JQL_TOKEN = re.compile(r'\s*(?:"((?:[^"\\]|\\.)*)"|\'([^\']*)\'|(!=|=|~|\(|\)|,)|([^\s=!~(),"\']+))')
+
+def _tokenize(jql: str) -> Optional[List[Tuple[str, str]]]:
+    tokens = []
+    position = 0
+    jql = jql.strip()
+    while position < len(jql):
+        match = _JQL_TOKEN.match(jql, position)
+        if not match or match.end() == position:
+            return None
+        double_quoted, single_quoted, symbol, word = match.groups()
+        if double_quoted is not None or single_quoted is not None:
+            tokens.append(("value", double_quoted if double_quoted is not None else single_quoted))
+        elif symbol is not None:
+            tokens.append(("symbol", symbol))
+        else:
+            tokens.append(("word", word))
+        position = match.end()
+    return tokens
+
+def _is_empty(token: Tuple[str, str]) -> bool:
+    # Unquoted EMPTY and NULL mean "no value" after =, != and in, as after is
+    return token[0] == "word" and token[1].upper() in ("EMPTY", "NULL")
+
+# Jira also accepts the numeric ids of these, which the mirror does not store
+_NAMED_COLUMNS = ("status", "priority", "issue_type")
+
+def _column_match(column: str, value: str, empty: bool = False) -> Tuple[str, list]:
+    if empty:
+        return f"{column} IS NULL", []
+    if column == "assignee":
+        return "(lower(assignee) = lower(?) OR assignee_id = ?)", [value, value]
+    return f"lower({column}) = lower(?)", [value]
+
+def translate_jql(jql: str) -> Optional[Tuple[str, list, List[str]]]:
+    """
+    Translate a simple JQL query to an SQL condition and ordering over jira_issues.
+    Returns (sql, params, projects), or None for anything outside the supported subset,
+    in which case the query goes to Jira.
+    """
+    tokens = _tokenize(jql)
+    if not tokens:
+        return None
+
+    def value_at(i):
+        if i < len(tokens) and tokens[i][0] in ("value", "word"):
+            return tokens[i][1]
+        return None
+
+    conditions, params, projects = [], [], []
+    order = "updated DESC"
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        if kind == "word" and text.lower() == "order":
+            if value_at(i + 1) is None or tokens[i + 1][1].lower() != "by":
+                return None
+            # Other orderings follow Jira's own rank of statuses and priorities
+            column = (value_at(i + 2) or "").lower()
+            direction = (value_at(i + 3) or "asc").upper()
+            if column not in ("created", "updated") or direction not in ("ASC", "DESC") or i + 3 + (value_at(i + 3) is not None) < len(tokens):
+                return None
+            order = f"{column} {direction}"
+            break
+        if conditions:
+            if kind != "word" or text.lower() != "and":
+                return None
+            i += 1
+        if i >= len(tokens) or tokens[i][0] != "word":
+            return None
+        field = tokens[i][1].lower()
+        column = JQL_COLUMNS.get(field, "text" if field == "text" else None)
+        if column is None:
+            return None
+        i += 1
+
+        operator = tokens[i][1].lower() if i < len(tokens) else None
+        if operator == "not" and value_at(i + 1) and tokens[i + 1][1].lower() == "in":
+            operator, i = "not in", i + 1
+        elif operator == "is" and value_at(i + 1) and tokens[i + 1][1].lower() == "not":
+            operator, i = "is not", i + 1
+        i += 1
+
+        if operator in ("in", "not in"):
+            if i >= len(tokens) or tokens[i] != ("symbol", "("):
+                return None
+            values = []
+            i += 1
+            while i < len(tokens) and tokens[i] != ("symbol", ")"):
+                if tokens[i] == ("symbol", ","):
+                    i += 1
+                    continue
+                if value_at(i) is None:
+                    return None
+                values.append((value_at(i), _is_empty(tokens[i])))
+                i += 1
+            if i >= len(tokens) or not values or column in ("text", "created", "updated"):
+                return None
+            if column in ("project", "key") and any(empty for _, empty in values):
+                return None
+            if column in _NAMED_COLUMNS and any(value.isdigit() for value, _ in values):
+                return None
+            i += 1
+            matches = [_column_match(column, value, empty) for value, empty in values]
+            condition = "(" + " OR ".join(sql for sql, _ in matches) + ")"
+            conditions.append(condition if operator == "in" else f"NOT {condition}")
+            params += [param for _, match_params in matches for param in match_params]
+            if column == "project" and operator == "in":
+                projects.append([value.upper() for value, _ in values])
+        elif operator in ("is", "is not"):
+            if (value_at(i) or "").upper() not in ("EMPTY", "NULL") or column in ("project", "key", "text"):
+                return None
+            i += 1
+            conditions.append(f"{column} IS NULL" if operator == "is" else f"{column} IS NOT NULL")
+        elif operator in ("=", "!="):
+            value = value_at(i)
+            # Functions such as currentUser() and date comparisons need Jira
+            if value is None or column in ("text", "created", "updated") or (i + 1 < len(tokens) and tokens[i + 1] == ("symbol", "(")):
+                return None
+            empty = _is_empty(tokens[i])
+            if empty and column in ("project", "key"):
+                return None
+            if column in _NAMED_COLUMNS and value.isdigit():
+                return None
+            i += 1
+            sql, match_params = _column_match(column, value, empty)
+            conditions.append(sql if operator == "=" else f"NOT {sql}")
+            params += match_params
+            if column == "project" and operator == "=":
+                projects.append([value.upper()])
+        elif operator == "~":
+            value = value_at(i)
+            # Jira matches several words, phrases and wildcards in its own way, only one word is matched here
+            if value is None or column not in ("summary", "description", "text") or not re.fullmatch(r"\w+\*?", value):
+                return None
+            i += 1
+            like = "%" + re.sub(r"([\\%_])", r"\\\1", value.rstrip("*")) + "%"
+            if column == "text":
+                conditions.append("(summary LIKE ? ESCAPE '\\' OR description LIKE ? ESCAPE '\\')")
+                params += [like, like]
+            else:
+                conditions.append(f"{column} LIKE ? ESCAPE '\\'")
+                params.append(like)
+        else:
+            return None
+
+    # Only queries confined to mirrored projects can be answered from the mirror
+    if not conditions or not projects:
+        return None
+    return " AND ".join(conditions) + f" ORDER BY {order}", params, projects[0]
+
+def search_mirror(jql: str, limit: int = 50) -> Optional[List[dict]]:
+    """Issues matching a simple JQL query, or None when the mirror cannot answer it"""
+    if not mirror_enabled():
+        return None
+    translated = translate_jql(jql)
+    if translated is None:
+        return None
+    condition, params, projects = translated
+
+    conn = connect_mirror(SCHEMA)
+    try:
+        if not _fresh(conn, projects):
+            return None
+        rows = conn.execute(f"SELECT * FROM jira_issues WHERE {condition} LIMIT ?", params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+async def jira_mirror_loop():
+    """Background job started by the application when JIRA_MIRROR_PROJECTS is set"""
+    from app.tools.jira import jira_api
+
+    while True:
+        try:
+            synced = await asyncio.to_thread(sync_projects, jira_api.jira)
+            print(f"Jira mirror synced: {synced}")
+        except Exception as e:
+            print(f"Error syncing Jira mirror: {str(e)}")
+        await asyncio.sleep(JIRA_MIRROR_INTERVAL)
+
+if __name__ == "__main__":
+    from app.tools.jira import jira_api
+
+    parser = argparse.ArgumentParser(description="Sync the local Jira mirror")
+    parser.add_argument("--full", action="store_true", help="re-read every issue and drop deleted ones")
+    args = parser.parse_args()
+    print(sync_projects(jira_api.jira, full=args.full))
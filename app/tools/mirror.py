@@ -0,0 +1,67 @@
+import os
+import re
+import sqlite3
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Local SQLite file holding the Confluence and Jira mirrors, separate from the application database
+TOOL_MIRROR_PATH = os.getenv(
+    "TOOL_MIRROR_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "mirror.db"))
+)
+
+SYNC_STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    source TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    watermark TEXT,
+    synced_at REAL,
+    PRIMARY KEY (source, scope)
+);
+"""
+
+def connect_mirror(schema: str) -> sqlite3.Connection:
+    """
+    Open the mirror database and create the given tables if needed.
+
+    Tools run in worker threads, so every call opens its own short-lived connection.
+    """
+    conn = sqlite3.connect(TOOL_MIRROR_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SYNC_STATE_SCHEMA + schema)
+    return conn
+
+def get_watermark(conn: sqlite3.Connection, source: str, scope: str) -> Optional[str]:
+    row = conn.execute(
+        "SELECT watermark FROM sync_state WHERE source = ? AND scope = ?", (source, scope)
+    ).fetchone()
+    return row["watermark"] if row else None
+
+def set_watermark(conn: sqlite3.Connection, source: str, scope: str, watermark: Optional[str]) -> None:
+    conn.execute(
+        "INSERT INTO sync_state (source, scope, watermark, synced_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (source, scope) DO UPDATE SET watermark = excluded.watermark, synced_at = excluded.synced_at",
+        (source, scope, watermark, time.time())
+    )
+
+def is_fresh(conn: sqlite3.Connection, source: str, scope: str, max_age: float) -> bool:
+    """Whether the scope was synced within the last max_age seconds"""
+    row = conn.execute(
+        "SELECT synced_at FROM sync_state WHERE source = ? AND scope = ?", (source, scope)
+    ).fetchone()
+    return bool(row and row["synced_at"] and time.time() - row["synced_at"] <= max_age)
+
+def fts_query(text: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query matching any of its words, so bm25 ranks pages
+    containing more of them first. Words are quoted, so FTS5 syntax in the text is inert.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " OR ".join('"' + word + '"' for word in words)
@@ -1,29 +1,37 @@
 from langchain.tools import BaseTool
-from langchain.tools import PythonREPL
 from typing import Optional, Type
 from pydantic import BaseModel, Field
+import asyncio
+from app.tools.sandbox import sandbox_pool
 
 class PythonREPLInput(BaseModel):
     code: str = Field(description="The Python code to execute")
 
 class PythonREPLTool(BaseTool):
     name: str = "Python"
-    description: str = "Run Python code for data analysis and processing"
+    description: str = (
+        "Run Python code for data analysis and processing. pandas and numpy are available. "
+        "Each call starts with a fresh namespace, print the values you need."
+    )
     args_schema: Type[BaseModel] = PythonREPLInput
     return_direct: bool = False
-    
-    def __init__(self):
-        super().__init__()
-        self.python_repl = PythonREPL()
+    execution_id: Optional[str] = None
+
+    def for_execution(self, execution_id: Optional[str]) -> "PythonREPLTool":
+        """An instance whose calls only share sandboxes with the same execution"""
+        return PythonREPLTool(execution_id=execution_id)
     
     def _run(self, code: str) -> str:
-        """Execute Python code"""
+        """Execute Python code in a sandbox process from the pool"""
         try:
-            return self.python_repl.run(code)
+            result = sandbox_pool.run(code, execution_id=self.execution_id)
         except Exception as e:
             return f"Error executing Python code: {str(e)}"
+        if result["error"]:
+            return f"{result['output']}\nError executing Python code: {result['error']}".lstrip()
+        return result["output"] or "Code ran without printing anything"
     
     async def _arun(self, code: str) -> str:
-        return self._run(code)
+        return await asyncio.to_thread(self._run, code)
 
-python_tool = PythonREPLTool() 
\ No newline at end of file
+python_tool = PythonREPLTool()
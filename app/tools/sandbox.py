@@ -0,0 +1,180 @@
+"""
+Pool of warm sandbox processes for the Python tool.
+
+Each sandbox is a separate interpreter that has already imported the data-analysis modules
+and runs code sent over a pipe with a CPU, memory and wall-clock limit. Runs never block the
+event loop, several agents run code at once, and code that crashes or hangs only costs its
+sandbox, which is replaced. The limits guard against runaway code, they are not a security
+boundary for hostile code.
+"""
+import atexit
+import json
+import os
+import queue
+import select
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SANDBOX_POOL_SIZE = int(os.getenv("SANDBOX_POOL_SIZE", "2"))
+# Modules imported when a sandbox starts, so calls do not pay for them
+SANDBOX_PREIMPORT = [name.strip() for name in os.getenv("SANDBOX_PREIMPORT", "numpy,pandas").split(",") if name.strip()]
+SANDBOX_TIMEOUT = float(os.getenv("SANDBOX_TIMEOUT", "30"))  # wall-clock seconds per call
+SANDBOX_CPU_SECONDS = float(os.getenv("SANDBOX_CPU_SECONDS", "20"))  # per call
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "1024"))  # per sandbox, on top of the preimported modules
+SANDBOX_MAX_USES = int(os.getenv("SANDBOX_MAX_USES", "50"))  # calls before a sandbox is replaced
+SANDBOX_MAX_OUTPUT_CHARS = int(os.getenv("SANDBOX_MAX_OUTPUT_CHARS", "10000"))
+SANDBOX_START_TIMEOUT = float(os.getenv("SANDBOX_START_TIMEOUT", "60"))
+# Seconds a call waits for an idle sandbox before failing
+SANDBOX_WAIT_TIMEOUT = float(os.getenv("SANDBOX_WAIT_TIMEOUT", "60"))
+
+WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+# The only variables passed on, so code in a sandbox cannot read the API keys
+SANDBOX_ENV_KEYS = ("PATH", "LANG", "LC_ALL", "TZ")
+
+class SandboxError(Exception):
+    pass
+
+class Sandbox:
+    """One sandbox process and the pipes to it"""
+
+    def __init__(self):
+        env = {key: os.environ[key] for key in SANDBOX_ENV_KEYS if key in os.environ}
+        # One BLAS thread per sandbox, the pool provides the parallelism
+        env.update(OPENBLAS_NUM_THREADS="1", OMP_NUM_THREADS="1", MKL_NUM_THREADS="1")
+        self.workdir = tempfile.TemporaryDirectory(prefix="sandbox-")
+        self.process = subprocess.Popen(
+            [sys.executable, "-I", WORKER_PATH, str(SANDBOX_MEMORY_MB), ",".join(SANDBOX_PREIMPORT)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self.workdir.name,
+            env=env,
+        )
+        self.uses = 0
+        self.execution_id: Optional[str] = None  # run the sandbox serves, set by its first call
+        self._buffer = b""
+        if self._read_line(SANDBOX_START_TIMEOUT) is None:
+            self.close()
+            raise SandboxError("Sandbox did not start")
+
+    def _read_line(self, timeout: float) -> Optional[dict]:
+        """Next response, or None when the sandbox died or did not answer in time"""
+        deadline = time.monotonic() + timeout
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                return None
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                return None
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def execute(self, code: str, timeout: float, cpu_seconds: float) -> dict:
+        self.uses += 1
+        request = {"code": code, "cpu_seconds": cpu_seconds, "max_output": SANDBOX_MAX_OUTPUT_CHARS}
+        try:
+            self.process.stdin.write((json.dumps(request) + "\n").encode())
+            self.process.stdin.flush()
+        except OSError:
+            return {"output": "", "error": "Sandbox process died", "recycle": True}
+        response = self._read_line(timeout)
+        if response is None:
+            if self.process.poll() is None:
+                return {"output": "", "error": f"Timed out after {timeout:g} seconds", "recycle": True}
+            return {"output": "", "error": "Sandbox process died, possibly out of memory", "recycle": True}
+        return response
+
+    def close(self) -> None:
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.workdir.cleanup()
+
+class SandboxPool:
+    """
+    Fixed number of sandboxes, started on first use. A call waits for an idle sandbox, and
+    sandboxes that hit a limit or SANDBOX_MAX_USES are replaced in the background. A sandbox
+    only serves one execution: modules the code imported or patched stay loaded between calls,
+    so a sandbox used by another execution is replaced instead of reused.
+    """
+
+    def __init__(self, size: int = SANDBOX_POOL_SIZE):
+        self.size = size
+        self._idle: "queue.Queue" = queue.Queue()
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _spawn(self) -> None:
+        try:
+            self._idle.put(Sandbox())
+        except Exception as e:
+            print(f"Error starting sandbox: {str(e)}")
+            # Handed to the next caller, which fails and spawns a replacement
+            self._idle.put(e)
+
+    def _replace(self, sandbox: Optional[Sandbox] = None) -> None:
+        if sandbox is not None:
+            threading.Thread(target=sandbox.close, daemon=True).start()
+        threading.Thread(target=self._spawn, daemon=True).start()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.size):
+            self._replace()
+
+    def _acquire(self, execution_id: Optional[str]) -> Sandbox:
+        deadline = time.monotonic() + SANDBOX_WAIT_TIMEOUT
+        while True:
+            try:
+                sandbox = self._idle.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise SandboxError(f"No sandbox free after {SANDBOX_WAIT_TIMEOUT:g} seconds")
+            if isinstance(sandbox, Exception):
+                self._replace()
+                raise SandboxError(f"Sandbox unavailable: {str(sandbox)}")
+            if sandbox.uses and sandbox.execution_id != execution_id:
+                self._replace(sandbox)
+                continue
+            sandbox.execution_id = execution_id
+            return sandbox
+
+    def run(self, code: str, timeout: float = SANDBOX_TIMEOUT, cpu_seconds: float = SANDBOX_CPU_SECONDS,
+            execution_id: Optional[str] = None) -> dict:
+        self.start()
+        sandbox = self._acquire(execution_id)
+        try:
+            response = sandbox.execute(code, timeout, cpu_seconds)
+        except Exception:
+            self._replace(sandbox)
+            raise
+        if response.get("recycle") or sandbox.uses >= SANDBOX_MAX_USES:
+            self._replace(sandbox)
+        else:
+            self._idle.put(sandbox)
+        return response
+
+    def close(self) -> None:
+        while True:
+            try:
+                sandbox = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(sandbox, Sandbox):
+                sandbox.close()
+
+sandbox_pool = SandboxPool()
+atexit.register(sandbox_pool.close)
@@ -0,0 +1,113 @@
+"""
+Sandbox process for the Python tool, started and fed by app.tools.sandbox.
+
+It is run by path with `python -I`, so it only uses the standard library and never loads the
+application or its .env. Requests are read one JSON object per line from the original stdin
+and answered one JSON object per line on the original stdout. The code itself sees /dev/null
+on both, and everything it prints is captured.
+
+    python -I sandbox_worker.py <memory_mb> <module,module,...>
+"""
+import contextlib
+import importlib
+import io
+import json
+import os
+import resource
+import shutil
+import signal
+import sys
+import tempfile
+import traceback
+
+class CPULimitExceeded(BaseException):
+    # Not an Exception, so a bare `except Exception` in the code cannot swallow it
+    pass
+
+def _cpu_limit_exceeded(signum, frame):
+    raise CPULimitExceeded()
+
+def _set_cpu_limit(seconds):
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = hard
+    if seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # The limit counts the process's whole CPU time, so it is set relative to what was used so far
+        soft = int(usage.ru_utime + usage.ru_stime + seconds) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+def _address_space():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+def run(code, cpu_seconds, max_output):
+    """
+    Run code in a fresh namespace and a fresh working directory, and return what it printed
+    and the error that stopped it. The directory is removed afterwards, so nothing a call
+    writes there is seen by the next call, which may belong to another run.
+    """
+    output = io.StringIO()
+    error = None
+    recycle = False
+    home = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="call-", dir=home)
+    os.chdir(workdir)
+    _set_cpu_limit(cpu_seconds)
+    try:
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            exec(compile(code, "<sandbox>", "exec"), {"__name__": "__main__"})
+    except CPULimitExceeded:
+        error = f"CPU time limit of {cpu_seconds:g} seconds exceeded"
+        recycle = True
+    except MemoryError:
+        error = "Memory limit exceeded"
+        recycle = True
+    except BaseException as e:
+        # SystemExit and KeyboardInterrupt included, the code must not end the sandbox.
+        # The traceback starts at the code, not at this function.
+        error = "".join(traceback.format_exception(type(e), e, e.__traceback__.tb_next))
+    finally:
+        _set_cpu_limit(None)
+        os.chdir(home)
+        shutil.rmtree(workdir, ignore_errors=True)
+    text = output.getvalue()
+    if len(text) > max_output:
+        text = text[:max_output] + f"\n... output truncated at {max_output} characters"
+    return {"output": text, "error": error, "recycle": recycle}
+
+def main():
+    memory_mb = int(sys.argv[1])
+    preimport = [name for name in sys.argv[2].split(",") if name] if len(sys.argv) > 2 else []
+
+    # Keep the protocol pipes for ourselves before the code can write to them
+    requests = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    responses = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+
+    for name in preimport:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    if memory_mb:
+        # On top of what the imports mapped, which is often more than the code itself needs
+        resource.setrlimit(resource.RLIMIT_AS, (_address_space() + memory_mb * 1024 * 1024,) * 2)
+    signal.signal(signal.SIGXCPU, _cpu_limit_exceeded)
+
+    responses.write(json.dumps({"ready": True}) + "\n")
+    responses.flush()
+    for line in requests:
+        request = json.loads(line)
+        response = run(request["code"], request.get("cpu_seconds"), request.get("max_output", 10000))
+        responses.write(json.dumps(response) + "\n")
+        responses.flush()
+
+if __name__ == "__main__":
+    main()
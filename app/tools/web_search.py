@@ -1,23 +1,271 @@
-from langchain_community.tools import DuckDuckGoSearchRun
+from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
 from langchain.tools import BaseTool
-from typing import Optional, Type, Any, Dict
+from typing import Optional, Type, Dict, List
 from pydantic import BaseModel, Field
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from dotenv import load_dotenv
+import asyncio
+import html
+import ipaddress
+import os
+import re
+import socket
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from app.cassette import CASSETTE_MODE, cassette_call
+
+load_dotenv()
+
+WEB_SEARCH_MAX_QUERIES = int(os.getenv("WEB_SEARCH_MAX_QUERIES", "5"))  # per call
+WEB_SEARCH_MAX_RESULTS = int(os.getenv("WEB_SEARCH_MAX_RESULTS", "5"))  # per query
+WEB_SEARCH_CONCURRENCY = int(os.getenv("WEB_SEARCH_CONCURRENCY", "4"))  # searches and page fetches at once
+WEB_SEARCH_CACHE_TTL = int(os.getenv("WEB_SEARCH_CACHE_TTL", "900"))  # seconds, 0 disables the cache
+WEB_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("WEB_SEARCH_CACHE_MAX_ENTRIES", "1024"))
+WEB_SEARCH_FETCH_PAGES = int(os.getenv("WEB_SEARCH_FETCH_PAGES", "3"))  # top pages fetched when asked to
+WEB_SEARCH_PAGE_TIMEOUT = float(os.getenv("WEB_SEARCH_PAGE_TIMEOUT", "10"))  # seconds
+WEB_SEARCH_PAGE_MAX_BYTES = int(os.getenv("WEB_SEARCH_PAGE_MAX_BYTES", "1000000"))  # read from each page
+WEB_SEARCH_PAGE_MAX_CHARS = int(os.getenv("WEB_SEARCH_PAGE_MAX_CHARS", "3000"))  # extracted text kept per page
+WEB_SEARCH_PAGE_MAX_REDIRECTS = int(os.getenv("WEB_SEARCH_PAGE_MAX_REDIRECTS", "5"))
+
+# Query parameters that only track the click and do not change the page
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|ref|ref_src)$", re.IGNORECASE)
+
+# Shared by every call and every run in the process
+_search = DuckDuckGoSearchAPIWrapper(max_results=WEB_SEARCH_MAX_RESULTS)
+_executor = ThreadPoolExecutor(max_workers=WEB_SEARCH_CONCURRENCY, thread_name_prefix="web-search")
+_session = requests.Session()
+_session.headers["User-Agent"] = "Mozilla/5.0 (compatible; agent-workforce)"
+
+class SearchCache:
+    """Search results by normalized query, kept for WEB_SEARCH_CACHE_TTL seconds"""
+
+    def __init__(self, ttl: int = WEB_SEARCH_CACHE_TTL, max_entries: int = WEB_SEARCH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[Dict[str, str]]]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[0] < time.monotonic():
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key: str, results: List[Dict[str, str]]) -> None:
+        if not self.ttl:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+search_cache = SearchCache()
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+def normalize_url(url: str) -> str:
+    """Key for spotting the same page under different URLs"""
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not TRACKING_PARAMS.match(k)))
+    host = parts.netloc.lower().removeprefix("www.")
+    return urlunsplit(("https" if parts.scheme in ("http", "https") else parts.scheme, host, parts.path.rstrip("/"), query, ""))
+
+def html_to_text(page: str) -> str:
+    page = re.sub(r"(?is)<(script|style|noscript|svg|head)\b.*?</\1>", " ", page)
+    text = re.sub(r"<[^>]+>", " ", page)
+    return re.sub(r"\s+", " ", html.unescape(text)).strip()
+
+def search_query(query: str, max_results: int = WEB_SEARCH_MAX_RESULTS) -> List[Dict[str, str]]:
+    """Results of one query as dicts with title, link and snippet, cached by normalized query"""
+    key = f"{normalize_query(query)}|{max_results}"
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+    # DuckDuckGo is not reached through `requests`, so searches are recorded here
+    results = cassette_call(
+        "tool",
+        {"tool": "WebSearch", "query": normalize_query(query), "max_results": max_results},
+        lambda: _search.results(query, max_results)
+    )
+    # The wrapper reports "No good DuckDuckGo Search Result was found" as a result without a link
+    results = [result for result in results if result.get("link")]
+    search_cache.set(key, results)
+    return results
+
+def _is_public(address: str) -> bool:
+    address = ipaddress.ip_address(address.split("%")[0])
+    return address.is_global and not address.is_multicast
+
+def check_public_url(url: str) -> None:
+    """
+    Raise ValueError unless the URL is http(s) and its host resolves to public addresses only,
+    so search results cannot point the fetcher at internal services.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"not an http(s) URL: {url}")
+    if CASSETTE_MODE == "replay":
+        # Answered from the cassette, nothing is connected to
+        return
+    try:
+        addresses = socket.getaddrinfo(parts.hostname, parts.port or 443, proto=socket.IPPROTO_TCP)
+    except socket.gaierror as e:
+        raise ValueError(f"cannot resolve {parts.hostname}: {e}")
+    for *_, sockaddr in addresses:
+        if not _is_public(sockaddr[0]):
+            raise ValueError(f"{parts.hostname} resolves to the non-public address {sockaddr[0]}")
+
+class _PublicHTTPConnection(HTTPConnection):
+    """
+    Refuses to connect to a non-public address. The host is resolved again on connecting and
+    may then answer with another address than check_public_url was given (DNS rebinding).
+    """
+
+    def _new_conn(self):
+        sock = super()._new_conn()
+        peer = sock.getpeername()[0]
+        if not _is_public(peer):
+            sock.close()
+            raise ValueError(f"{self.host} resolved to the non-public address {peer} on connecting")
+        return sock
+
+class _PublicHTTPSConnection(_PublicHTTPConnection, HTTPSConnection):
+    pass
+
+class _PublicHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("PublicHTTPConnectionPool", (HTTPConnectionPool,), {"ConnectionCls": _PublicHTTPConnection}),
+            "https": type("PublicHTTPSConnectionPool", (HTTPSConnectionPool,), {"ConnectionCls": _PublicHTTPSConnection}),
+        }
+
+_session.mount("http://", _PublicHTTPAdapter())
+_session.mount("https://", _PublicHTTPAdapter())
+
+def open_page(url: str) -> requests.Response:
+    """
+    GET a public page, checking the target of every redirect before following it and the
+    address actually connected to before sending the request
+    """
+    for _ in range(WEB_SEARCH_PAGE_MAX_REDIRECTS + 1):
+        check_public_url(url)
+        response = _session.get(url, timeout=WEB_SEARCH_PAGE_TIMEOUT, stream=True, allow_redirects=False)
+        if not response.is_redirect:
+            return response
+        response.close()
+        url = urljoin(url, response.headers["Location"])
+    raise ValueError(f"more than {WEB_SEARCH_PAGE_MAX_REDIRECTS} redirects")
+
+def fetch_page_text(url: str) -> str:
+    """Readable text of a public page, reading at most WEB_SEARCH_PAGE_MAX_BYTES"""
+    with open_page(url) as response:
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "")
+        if "html" not in content_type and "text" not in content_type:
+            return f"(not a text page: {content_type or 'unknown type'})"
+        body = b""
+        for chunk in response.iter_content(64 * 1024):
+            body += chunk
+            if len(body) >= WEB_SEARCH_PAGE_MAX_BYTES:
+                break
+        text = body[:WEB_SEARCH_PAGE_MAX_BYTES].decode(response.encoding or "utf-8", errors="replace")
+    text = html_to_text(text) if "html" in content_type else text
+    if len(text) > WEB_SEARCH_PAGE_MAX_CHARS:
+        text = text[:WEB_SEARCH_PAGE_MAX_CHARS] + " ..."
+    return text
+
+def multi_search(queries: List[str], fetch_pages: bool = False, max_results: int = WEB_SEARCH_MAX_RESULTS) -> str:
+    """Run the queries concurrently, merge the results without duplicate pages and optionally read the top pages"""
+    queries = list(dict.fromkeys(query.strip() for query in queries if query and query.strip()))[:WEB_SEARCH_MAX_QUERIES]
+    if not queries:
+        return "No search query given"
+
+    def run(query: str):
+        try:
+            return search_query(query, max_results), None
+        except Exception as e:
+            return [], str(e)
+
+    merged: "OrderedDict[str, dict]" = OrderedDict()
+    errors = []
+    # Results are merged round-robin, so every query's best results come first
+    per_query = list(_executor.map(run, queries))
+    for query, (_, error) in zip(queries, per_query):
+        if error:
+            errors.append(f"Search for '{query}' failed: {error}")
+    for rank in range(max_results):
+        for query, (results, _) in zip(queries, per_query):
+            if rank >= len(results):
+                continue
+            result = results[rank]
+            key = normalize_url(result["link"])
+            if key in merged:
+                merged[key]["queries"].append(query)
+            else:
+                merged[key] = {**result, "queries": [query]}
+
+    if not merged:
+        return "\n".join(errors) or "No results found"
+
+    results = list(merged.values())
+    if fetch_pages:
+        top = results[:WEB_SEARCH_FETCH_PAGES]
+
+        def fetch(result: dict) -> str:
+            try:
+                return fetch_page_text(result["link"])
+            except Exception as e:
+                return f"(could not fetch the page: {str(e)})"
+
+        for result, content in zip(top, _executor.map(fetch, top)):
+            result["content"] = content
+
+    lines = []
+    for index, result in enumerate(results, start=1):
+        entry = f"[{index}] {result.get('title', '')}\nURL: {result['link']}\n{result.get('snippet', '')}"
+        if len(queries) > 1:
+            entry += f"\nFound by: {', '.join(result['queries'])}"
+        if "content" in result:
+            entry += f"\nPage content: {result['content']}"
+        lines.append(entry)
+    return "\n\n".join(lines + errors)
 
 class WebSearchInput(BaseModel):
-    query: str = Field(description="The search query to look up on the web")
+    query: Optional[str] = Field(default=None, description="The search query to look up on the web")
+    queries: Optional[List[str]] = Field(
+        default=None,
+        description=f"Several related search queries to run at once (up to {WEB_SEARCH_MAX_QUERIES}), instead of one query per call"
+    )
+    fetch_pages: bool = Field(
+        default=False,
+        description=f"Also read the text of the top {WEB_SEARCH_FETCH_PAGES} pages, not just the search snippets"
+    )
 
 class WebSearchTool(BaseTool):
     name: str = "Web Search"
-    description: str = "Search the web for current information on a topic"
+    description: str = (
+        "Search the web for current information on a topic. Pass several queries at once to cover a topic "
+        "in one call; duplicate pages are merged. Set fetch_pages to read the top pages."
+    )
     args_schema: Type[BaseModel] = WebSearchInput
     return_direct: bool = False
-    
-    def _run(self, query: str) -> str:
-        search = DuckDuckGoSearchRun()
-        return search.run(query)
-    
-    async def _arun(self, query: str) -> str:
-        search = DuckDuckGoSearchRun()
-        return await search.arun(query)
-
-search_tool = WebSearchTool() 
\ No newline at end of file
+
+    def _run(self, query: Optional[str] = None, queries: Optional[List[str]] = None, fetch_pages: bool = False) -> str:
+        return multi_search(([query] if query else []) + list(queries or []), fetch_pages=fetch_pages)
+
+    async def _arun(self, query: Optional[str] = None, queries: Optional[List[str]] = None, fetch_pages: bool = False) -> str:
+        return await asyncio.to_thread(self._run, query, queries, fetch_pages)
+
+search_tool = WebSearchTool()
@@ -0,0 +1,75 @@
+import os
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select, update, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import utcnow
+from app.models import Execution as DBExecution
+from app.scheduler import PRIORITIES
+
+load_dotenv()
+
+# "local" runs executions in the API process that received them, "database" leaves them
+# in the executions table for `python -m app.worker` processes to claim
+EXECUTION_QUEUE = os.getenv("EXECUTION_QUEUE", "local").lower()
+# Abandoned claims are put back in the queue until the execution was started this many times
+EXECUTION_QUEUE_MAX_ATTEMPTS = int(os.getenv("EXECUTION_QUEUE_MAX_ATTEMPTS", "3"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1.0"))  # seconds
+# Seconds a stopping worker waits for its runs before handing them back to the queue (0 = wait for all)
+WORKER_DRAIN_TIMEOUT = float(os.getenv("WORKER_DRAIN_TIMEOUT", "0"))
+
+def work_queue_enabled() -> bool:
+    return EXECUTION_QUEUE == "database"
+
+def initial_worker_id(worker_id: str) -> Optional[str]:
+    """Owner of a new execution: the creating process, or nobody when it goes through the queue"""
+    return None if work_queue_enabled() else worker_id
+
+async def claim_executions(db: AsyncSession, worker_id: str, limit: int) -> List[str]:
+    """
+    Claim up to `limit` queued executions for a worker, most urgent lane first, and commit the claim.
+
+    On PostgreSQL the candidates are locked with FOR UPDATE SKIP LOCKED, so concurrent workers
+    claim disjoint rows without waiting on each other. SQLite runs one write at a time, so the
+    single UPDATE ... RETURNING statement claims atomically there as well.
+    """
+    lane = case(
+        *[(DBExecution.priority == priority, rank) for rank, priority in enumerate(PRIORITIES)],
+        else_=len(PRIORITIES)
+    )
+    candidates = (
+        select(DBExecution.id)
+        .where(DBExecution.status == "queued")
+        .where(DBExecution.worker_id.is_(None))
+        .order_by(lane, DBExecution.created_at)
+        .limit(limit)
+    )
+    if db.bind.dialect.name == "postgresql":
+        candidates = candidates.with_for_update(skip_locked=True)
+
+    result = await db.execute(
+        update(DBExecution)
+        .where(DBExecution.id.in_(candidates.scalar_subquery()))
+        .values(worker_id=worker_id, heartbeat_at=utcnow())
+        .returning(DBExecution.id)
+        .execution_options(synchronize_session=False)
+    )
+    claimed = result.scalars().all()
+    await db.commit()
+    return claimed
+
+def requeue_execution(execution: DBExecution) -> bool:
+    """
+    Put an execution whose worker died back in the queue. Returns False once it has
+    used up EXECUTION_QUEUE_MAX_ATTEMPTS, in which case the caller fails it.
+    """
+    if execution.cancel_requested or (execution.attempts or 0) >= EXECUTION_QUEUE_MAX_ATTEMPTS:
+        return False
+    execution.status = "queued"
+    execution.worker_id = None
+    execution.heartbeat_at = None
+    execution.started_at = None
+    return True
@@ -0,0 +1,135 @@
+"""
+Execution worker for the database work queue.
+
+Run any number of these, on any number of hosts, next to API processes started with
+EXECUTION_QUEUE=database:
+
+    python -m app.worker --concurrency 4
+"""
+import argparse
+import asyncio
+import json
+import signal
+
+from sqlalchemy import update
+
+from app.batches import run_batch_item
+from app.checkpoints import load_completed_tasks
+from app.database import AsyncSessionLocal
+from app.execution import load_crew_definition, execute_run, complete_execution, fail_execution, preload_execution_modules
+from app.models import Execution as DBExecution, ExecutionBatch as DBExecutionBatch
+from app.run_control import (
+    ExecutionStopped, current_worker_id, execution_supervisor_loop, release_owned_executions, release_run_controls
+)
+from app.work_queue import WORKER_CONCURRENCY, WORKER_DRAIN_TIMEOUT, WORKER_POLL_INTERVAL, claim_executions
+
+async def run_claimed_execution(execution_id: str) -> None:
+    """Run an execution this worker claimed and record how it ended"""
+    async with AsyncSessionLocal() as session:
+        execution = await session.get(DBExecution, execution_id)
+        definition = await load_crew_definition(session, execution.crew_id)
+        if not definition:
+            await fail_execution(session, execution, "Crew not found")
+            await session.commit()
+            return
+
+        if execution.batch_id:
+            batch = await session.get(DBExecutionBatch, execution.batch_id)
+            await session.execute(
+                update(DBExecutionBatch)
+                .where(DBExecutionBatch.id == batch.id)
+                .where(DBExecutionBatch.status == "queued")
+                .values(status="in_progress")
+            )
+            await session.commit()
+            await run_batch_item(batch.id, definition, execution_id, batch.max_retries)
+            return
+
+        if execution.cancel_requested:
+            await fail_execution(session, execution, "Cancelled by request", status="cancelled")
+            await session.commit()
+            return
+
+        # Resumed runs and runs requeued after their worker died skip the checkpointed tasks
+        completed_tasks = []
+        if execution.attempts:
+            completed_tasks = await load_completed_tasks(session, execution_id, [task.id for task in definition.tasks])
+        execution.attempts = (execution.attempts or 0) + 1
+        inputs = json.loads(execution.input_variables) if execution.input_variables else None
+
+        try:
+            result = await execute_run(
+                session, execution, definition, inputs, completed_tasks,
+                execution.timeout_seconds, execution.max_tokens
+            )
+        except ExecutionStopped as e:
+            await fail_execution(session, execution, e.reason, status=e.status)
+        except Exception as e:
+            await fail_execution(session, execution, str(e))
+        else:
+            await complete_execution(session, execution, result, completed_tasks)
+        await session.commit()
+
+async def run_worker(concurrency: int = WORKER_CONCURRENCY, drain_timeout: float = WORKER_DRAIN_TIMEOUT) -> None:
+    """
+    Claim and run queued executions until SIGINT or SIGTERM, then finish the running ones.
+    Runs still going after `drain_timeout` seconds are handed back to the queue.
+    """
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    supervisor = asyncio.create_task(execution_supervisor_loop())
+    running = set()
+    worker_id = current_worker_id()
+    print(f"Worker {worker_id} started with concurrency {concurrency}")
+
+    async def run(execution_id: str):
+        try:
+            await run_claimed_execution(execution_id)
+        except Exception as e:
+            print(f"Error running execution {execution_id}: {str(e)}")
+
+    while not stopping.is_set():
+        claimed = []
+        if len(running) < concurrency:
+            try:
+                async with AsyncSessionLocal() as session:
+                    claimed = await claim_executions(session, worker_id, concurrency - len(running))
+            except Exception as e:
+                print(f"Error claiming executions: {str(e)}")
+        for execution_id in claimed:
+            task = asyncio.create_task(run(execution_id))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+        if not claimed:
+            # Wake up early when a slot frees or a stop is requested
+            waiters = [asyncio.create_task(stopping.wait()), *running]
+            await asyncio.wait(waiters, timeout=WORKER_POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+            waiters[0].cancel()
+
+    print(f"Worker {worker_id} stopping, waiting for {len(running)} executions")
+    if running:
+        await asyncio.wait(running, timeout=drain_timeout or None)
+    if running:
+        # Leave the rows alone while cancelling, then put them back in the queue in one go
+        release_run_controls()
+        for task in running:
+            task.cancel()
+        await asyncio.wait(running)
+        await release_owned_executions()
+    supervisor.cancel()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run executions from the database work queue")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="executions run at once")
+    parser.add_argument("--drain-timeout", type=float, default=WORKER_DRAIN_TIMEOUT, help="seconds to wait for running executions on shutdown")
+    args = parser.parse_args()
+    # Pay for the slow imports before claiming work, not during the first run
+    preload_execution_modules()
+    asyncio.run(run_worker(args.concurrency, args.drain_timeout))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Measure how long a fresh process takes to import the application.
+
+    python benchmark_startup.py                   # import app.main
+    python benchmark_startup.py --preload         # also import what the first run needs
+    python benchmark_startup.py --runs 10 --top 20
+
+Each run is a new interpreter started with `-X importtime`. The report shows the median
+wall time and the modules with the largest cumulative import time in the last run.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+def measure(code: str):
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    elapsed = time.perf_counter() - started
+
+    modules = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # import time: self [us] | cumulative | imported package
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((int(cumulative), name.rstrip()))
+    return elapsed, modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark application import time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--preload", action="store_true", help="also preload crewai, the LLM and the tools")
+    args = parser.parse_args()
+
+    code = "import app.main"
+    if args.preload:
+        code += "; from app.execution import preload_execution_modules; preload_execution_modules()"
+
+    timings = []
+    modules = []
+    for _ in range(args.runs):
+        elapsed, modules = measure(code)
+        timings.append(elapsed)
+
+    print(f"{code}")
+    print(f"median {statistics.median(timings) * 1000:.0f} ms, min {min(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms over {args.runs} runs")
+    print("\nSlowest modules (cumulative):")
+    for cumulative, name in sorted(modules, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:10.1f} ms  {name}")
+
+if __name__ == "__main__":
+    main()
@@ -48,9 +48,21 @@ function CrewExecutions() {
     }
   };
 
-  const handleViewDetails = (execution) => {
+  const handleViewDetails = async (execution) => {
     setSelectedExecution(execution);
     setShowDetailsDialog(true);
+    // Rows from before result digests may still hold a result, so completed ones are fetched too
+    if (!execution.result_digest && execution.status !== 'completed') {
+      return;
+    }
+    // Listings only carry a preview, the full result is fetched on demand
+    try {
+      const response = await axios.get(`${API_URL}/crews/executions/${execution.id}/result`);
+      setSelectedExecution({ ...execution, result: response.data });
+    } catch (err) {
+      console.error('Error fetching execution result:', err);
+      setSelectedExecution({ ...execution, result: execution.result_preview });
+    }
   };
 
   const getStatusColor = (status) => {
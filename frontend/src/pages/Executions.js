@@ -31,6 +31,7 @@ const API_URL = 'http://localhost:8000/api';
 
 function Executions() {
   const [executions, setExecutions] = useState([]);
+  const [listingSince, setListingSince] = useState(null);
   const [crews, setCrews] = useState([]);
   const [selectedCrew, setSelectedCrew] = useState('');
   const [loading, setLoading] = useState(true);
@@ -63,6 +64,7 @@ function Executions() {
     try {
       const response = await axios.get(`${API_URL}/crews/executions`);
       setExecutions(response.data.executions || []);
+      setListingSince(response.data.since || null);
       setLoading(false);
     } catch (err) {
       console.error('Error fetching executions:', err);
@@ -74,6 +76,7 @@ function Executions() {
     try {
       const response = await axios.get(`${API_URL}/crews/${crewId}/executions`);
       setExecutions(response.data.executions || []);
+      setListingSince(response.data.since || null);
       setLoading(false);
     } catch (err) {
       console.error('Error fetching crew executions:', err);
@@ -123,9 +126,21 @@ function Executions() {
     }
   };
 
-  const handleViewDetails = (execution) => {
+  const handleViewDetails = async (execution) => {
     setSelectedExecution(execution);
     setShowDetailsDialog(true);
+    // Rows from before result digests may still hold a result, so completed ones are fetched too
+    if (!execution.result_digest && execution.status !== 'completed') {
+      return;
+    }
+    // Listings only carry a preview, the full result is fetched on demand
+    try {
+      const response = await axios.get(`${API_URL}/crews/executions/${execution.id}/result`);
+      setSelectedExecution({ ...execution, result: response.data });
+    } catch (err) {
+      console.error('Error fetching execution result:', err);
+      setSelectedExecution({ ...execution, result: execution.result_preview });
+    }
   };
 
   const getStatusColor = (status) => {
@@ -176,6 +191,12 @@ function Executions() {
         </FormControl>
       </Box>
 
+      {listingSince && (
+        <Typography variant="body2" color="text.secondary" mb={2}>
+          Showing executions since {new Date(listingSince).toLocaleDateString()}
+        </Typography>
+      )}
+
       {executions.length === 0 ? (
         <Paper sx={{ p: 3, textAlign: 'center' }}>
           <Typography variant="body1" color="text.secondary">
@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("langchain")
+
+from app import blob_store
+from app.blob_store import TOOL_OUTPUT_NAMESPACE, LocalBlobStore
+from app.tools.budget import ReadToolOutputTool, limit_output
+
+@pytest.fixture
+def tool_outputs(tmp_path, monkeypatch):
+    store = LocalBlobStore(root=str(tmp_path), namespace=TOOL_OUTPUT_NAMESPACE)
+    monkeypatch.setitem(blob_store._blob_stores, TOOL_OUTPUT_NAMESPACE, store)
+    return store
+
+def words(count: int) -> str:
+    return " ".join(f"word{index:04d}" for index in range(count))
+
+def test_output_within_budget_is_unchanged(tool_outputs):
+    assert limit_output("short output", 100) == "short output"
+    assert limit_output(words(1000), None) == words(1000)
+    assert limit_output({"a": 1}, 100) == "{'a': 1}"
+
+def test_output_over_budget_keeps_head_and_tail():
+    text = words(1000)
+    limited = limit_output(text, 100, keep_handle=False)
+    assert len(limited) < 600
+    assert limited.startswith("word0000 ") and limited.endswith(" word0999")
+    assert "characters (about" in limited and "handle" not in limited
+    # Cut at word boundaries
+    head, _, tail = limited.partition("\n\n[...")
+    assert head.split()[-1].startswith("word") and len(head.split()[-1]) == 8
+
+def test_omitted_part_can_be_read_with_the_handle(tool_outputs):
+    text = words(1000)
+    limited = limit_output(text, 100, keep_handle=True)
+    note = limited.split("\n\n")[1]
+    handle = note.split("handle ")[1].split()[0]
+    start = int(note.split("start ")[1].split()[0])
+
+    reader = ReadToolOutputTool(page_tokens=50)
+    page = reader._run(handle, start)
+    assert page.startswith(text[start:start + 200])
+    assert f"continue with start {start + 200}" in page
+
+    pages, position = [], 0
+    while True:
+        page = reader._run(handle.upper(), position)
+        if "continue with start" not in page:
+            pages.append(page)
+            break
+        body, _, rest = page.rpartition("\n\n[...")
+        pages.append(body)
+        position = int(rest.split("continue with start ")[1].split()[0])
+    assert "".join(pages) == text
+
+def test_read_rejects_unknown_handles(tool_outputs):
+    reader = ReadToolOutputTool()
+    assert reader._run("../../etc/passwd") == "Error: not a tool output handle"
+    assert reader._run("0" * 64).startswith("Error: no tool output")
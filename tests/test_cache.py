@@ -0,0 +1,13 @@
+from app.cache import etag_matches, make_entry
+
+def test_etag_matches_listed_values_only():
+    etag = make_entry(b'{"id": 1}')["etag"]
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag, f'"other", {etag}')
+    assert etag_matches(etag, f"W/{etag}")
+    assert etag_matches(etag, "*")
+    assert not etag_matches(etag, None)
+    assert not etag_matches(etag, "")
+    # A value containing the ETag is not the ETag
+    assert not etag_matches(etag, f'"x{etag[1:-1]}x"')
+    assert not etag_matches(etag, etag[1:-1])
@@ -0,0 +1,18 @@
+from app.cassette import _strip_secrets, fingerprint
+
+def test_fingerprint_ignores_key_order_and_whitespace():
+    request = {"model": "gpt-4o", "messages": [{"role": "user", "content": "Hello   world"}]}
+    reordered = {"messages": [{"content": "Hello world", "role": "user"}], "model": "gpt-4o"}
+    assert fingerprint("llm", request) == fingerprint("llm", reordered)
+
+def test_fingerprint_depends_on_kind_and_content():
+    request = {"query": "crewai"}
+    assert fingerprint("search", request) != fingerprint("page", request)
+    assert fingerprint("search", request) != fingerprint("search", {"query": "crew ai"})
+
+def test_strip_secrets_drops_credentials_and_fragment():
+    url = "https://api.example.com/data?q=x&apikey=s1&Token=s2&access_token=s3&b=2#section"
+    assert _strip_secrets(url) == "https://api.example.com/data?b=2&q=x"
+
+def test_strip_secrets_sorts_query():
+    assert _strip_secrets("https://example.com/?b=2&a=1") == _strip_secrets("https://example.com/?a=1&b=2")
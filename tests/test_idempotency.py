@@ -0,0 +1,82 @@
+import asyncio
+import os
+
+import pytest
+
+os.environ.setdefault("DATABASE_TYPE", "sqlite")
+
+from app.idempotency import FlightAbandoned, SingleFlight
+
+def test_followers_share_the_leaders_result():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flights.do("key", work) for _ in range(3)))
+        assert results == ["result"] * 3
+        assert len(calls) == 1 and flights.coalesced == 2
+        assert not flights.in_flight("key")
+
+    asyncio.run(scenario())
+
+def test_followers_share_the_leaders_error():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("failed")
+
+        results = await asyncio.gather(*(flights.do("key", work) for _ in range(2)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(scenario())
+
+def test_cancelled_leader_abandons_the_flight():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(10)
+
+        async def fallback():
+            return "from fallback"
+
+        leader = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0)
+        plain = asyncio.create_task(flights.do("key", work))
+        with_fallback = asyncio.create_task(flights.do("key", work, fallback))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # Followers are not cancelled along with the leader
+        with pytest.raises(FlightAbandoned):
+            await plain
+        assert await with_fallback == "from fallback"
+        assert not flights.in_flight("key")
+
+    asyncio.run(scenario())
+
+def test_follower_going_away_leaves_the_call_running():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0)
+        follower.cancel()
+        assert await leader == "done"
+
+    asyncio.run(scenario())
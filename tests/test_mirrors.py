@@ -0,0 +1,57 @@
+from app.tools import confluence_mirror
+from app.tools.confluence_mirror import cql_text_search
+from app.tools.jira_mirror import translate_jql
+from app.tools.mirror import fts_query
+
+def test_fts_query_quotes_each_word():
+    assert fts_query("deploy the API") == '"deploy" OR "the" OR "API"'
+    assert fts_query('title:"x" OR NEAR(a b)') == '"title" OR "x" OR "OR" OR "NEAR" OR "a" OR "b"'
+    assert fts_query("  ?! ") is None
+
+def test_cql_text_search():
+    assert cql_text_search('text ~ "deploy guide"') == ("deploy guide", None)
+    assert cql_text_search('siteSearch ~ "on call" and space = ENG and type = page') == ("on call", "ENG")
+    assert cql_text_search('text ~ "say \\"hi\\""') == ('say "hi"', None)
+
+def test_cql_outside_the_subset_goes_to_confluence():
+    assert cql_text_search('space = ENG') is None
+    assert cql_text_search('text ~ "a" or space = ENG') is None
+    assert cql_text_search('text ~ "a" and text ~ "b"') is None
+    assert cql_text_search('text ~ "a" and label = runbook') is None
+    assert cql_text_search('text ~ "a" order by created') is None
+
+def test_translate_jql_confined_to_projects():
+    sql, params, projects = translate_jql('project = eng AND status = "In Progress"')
+    assert sql == "lower(project) = lower(?) AND lower(status) = lower(?) ORDER BY updated DESC"
+    assert params == ["eng", "In Progress"] and projects == ["ENG"]
+
+    sql, params, projects = translate_jql("project in (ENG, OPS) AND assignee is EMPTY order by created desc")
+    assert sql.endswith("assignee IS NULL ORDER BY created DESC")
+    assert projects == ["ENG", "OPS"]
+
+def test_translate_jql_text_search():
+    sql, params, _ = translate_jql('project = ENG AND summary ~ "deploy"')
+    assert "summary LIKE ?" in sql and params[-1] == "%deploy%"
+    _, params, _ = translate_jql('project = ENG AND text ~ "foo_bar*"')
+    assert params[-2:] == ["%foo\\_bar%", "%foo\\_bar%"]
+
+def test_jql_outside_the_subset_goes_to_jira():
+    for jql in (
+        "status = Done",
+        "project = ENG OR project = OPS",
+        "project = ENG AND assignee = currentUser()",
+        "project = ENG AND created >= -7d",
+        "project = ENG AND labels = backend",
+        "project = ENG order by priority",
+        "project is EMPTY",
+        'project = ENG AND summary ~ "deploy failure"',
+        'project = ENG AND summary ~ "de?loy"',
+        "project = ENG AND status = 3",
+        "project = ENG AND priority in (High, 2)",
+    ):
+        assert translate_jql(jql) is None, jql
+
+def test_confluence_mirror_only_answers_searches_in_a_mirrored_space(monkeypatch):
+    monkeypatch.setattr(confluence_mirror, "CONFLUENCE_MIRROR_SPACES", ["ENG"])
+    assert confluence_mirror.search_mirror("deploy", None) is None
+    assert confluence_mirror.search_mirror("deploy", "OPS") is None
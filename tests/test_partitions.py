@@ -0,0 +1,24 @@
+import os
+from datetime import date
+
+os.environ.setdefault("DATABASE_TYPE", "sqlite")
+
+from app.partitions import create_partition_sql, month_start, partition_name, partition_range
+
+def test_month_start_crosses_years():
+    assert month_start(date(2026, 12, 15)) == date(2026, 12, 1)
+    assert month_start(date(2026, 12, 15), 1) == date(2027, 1, 1)
+    assert month_start(date(2026, 1, 31), -1) == date(2025, 12, 1)
+    assert month_start(date(2026, 3, 1), 14) == date(2027, 5, 1)
+
+def test_partition_name_and_bounds():
+    assert partition_name(date(2026, 3, 9)) == "executions_y2026m03"
+    sql = create_partition_sql(date(2026, 12, 20))
+    assert "executions_y2026m12 PARTITION OF executions" in sql
+    assert "FROM ('2026-12-01') TO ('2027-01-01')" in sql
+
+def test_partition_range_is_inclusive():
+    assert partition_range(date(2026, 11, 20), date(2027, 2, 1)) == [
+        date(2026, 11, 1), date(2026, 12, 1), date(2027, 1, 1), date(2027, 2, 1)
+    ]
+    assert partition_range(date(2026, 5, 1), date(2026, 4, 1)) == []
@@ -0,0 +1,55 @@
+import asyncio
+import os
+
+os.environ.setdefault("DATABASE_TYPE", "sqlite")
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.database import Base
+from app.models import Agent, Crew, Task
+from app.queries import load_crew_graph
+
+async def count_load_statements(agent_count: int, task_count: int) -> int:
+    """Build a crew in an in-memory database and count the statements that load its graph"""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        agents = [Agent(role=f"Agent {index}", goal="goal", backstory="backstory") for index in range(agent_count)]
+        crew = Crew(name="crew", description="crew", agents=agents)
+        db.add(crew)
+        await db.flush()
+        for index in range(task_count):
+            db.add(Task(description=f"Task {index}", crew_id=crew.id, agent_id=agents[index % agent_count].id))
+        await db.commit()
+        crew_id = crew.id
+
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    async with AsyncSession(engine) as db:
+        graph = await load_crew_graph(db, crew_id)
+        assert len(graph.agents) == agent_count
+        assert len(graph.tasks) == task_count
+        for task in graph.tasks:
+            assert graph.agent_for(task).id == task.agent_id
+    await engine.dispose()
+    return len(statements)
+
+def test_load_crew_graph_uses_constant_statement_count():
+    small = asyncio.run(count_load_statements(agent_count=1, task_count=1))
+    large = asyncio.run(count_load_statements(agent_count=20, task_count=200))
+    assert small == large == 3
+
+def test_load_crew_graph_of_missing_crew():
+    async def load():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        async with AsyncSession(engine) as db:
+            graph = await load_crew_graph(db, 1)
+        await engine.dispose()
+        return graph
+
+    assert asyncio.run(load()) is None
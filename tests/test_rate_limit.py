@@ -0,0 +1,109 @@
+import threading
+import time
+
+from app.rate_limit import ProviderLimiter, RateLimits, TokenBucket, estimate_tokens, limiter_key
+
+def test_token_bucket_refills_at_its_rate_up_to_capacity():
+    bucket = TokenBucket(60)
+    bucket.tokens = 0.0
+    bucket.refill(bucket.updated + 10)
+    assert bucket.tokens == 10.0
+    bucket.refill(bucket.updated + 1000)
+    assert bucket.tokens == 60.0
+
+def test_token_bucket_wait_time():
+    bucket = TokenBucket(60)
+    bucket.tokens = 5.0
+    assert bucket.wait_time(5) == 0.0
+    assert bucket.wait_time(15) == 10.0
+    assert bucket.wait_time(15, scale=0.5) == 20.0
+    # More than the bucket holds waits for a full bucket, not forever
+    assert bucket.wait_time(1000) == 55.0
+
+def test_limiter_key_and_estimates():
+    assert limiter_key("openai", "gpt-4o", None) == "openai/gpt-4o/default"
+    key = limiter_key("openai", "gpt-4o", "sk-secret")
+    assert "sk-secret" not in key and key != limiter_key("openai", "gpt-4o", "sk-other")
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("x" * 400) == 100
+
+def test_acquire_takes_tokens_and_release_corrects_them():
+    limiter = ProviderLimiter(RateLimits(requests_per_minute=10, tokens_per_minute=1000))
+    limiter.acquire("run-1", 100)
+    assert limiter.requests.tokens < 10 and round(limiter.tokens.tokens) == 900
+    limiter.release(100, actual_tokens=300)
+    assert round(limiter.tokens.tokens) == 700
+    assert limiter.snapshot()["in_flight"] == 0
+
+def test_rate_limited_release_blocks_and_slows_down():
+    limiter = ProviderLimiter(RateLimits(requests_per_minute=10))
+    limiter.acquire("run-1", 1)
+    backoff = limiter.release(1, rate_limited=True, retry_after=0.2)
+    assert backoff == 0.2
+    assert limiter.scale == 0.5
+    assert limiter.snapshot()["blocked_for_seconds"] > 0
+
+    started = time.monotonic()
+    limiter.acquire("run-1", 1)
+    assert time.monotonic() - started >= 0.15
+    limiter.release(1)
+    assert limiter.scale == 0.55
+
+def test_concurrency_limit_round_robin_across_executions():
+    limiter = ProviderLimiter(RateLimits(max_concurrency=1))
+    limiter.acquire("holder", 1)
+    granted = []
+
+    def call(execution_id):
+        limiter.acquire(execution_id, 1)
+        granted.append(execution_id)
+        limiter.release(1)
+
+    threads = []
+    for execution_id in ("busy", "busy", "quiet"):
+        thread = threading.Thread(target=call, args=(execution_id,))
+        thread.start()
+        threads.append(thread)
+        while limiter.snapshot()["waiting"] < len(threads):
+            time.sleep(0.01)
+
+    limiter.release(1)
+    for thread in threads:
+        thread.join(timeout=10)
+    # The quiet execution gets the slot after one busy call, not after all of them
+    assert granted == ["busy", "quiet", "busy"]
+
+def test_update_keeps_the_bucket_level_in_proportion():
+    limiter = ProviderLimiter(RateLimits(requests_per_minute=10, tokens_per_minute=1000))
+    limiter.acquire("run-1", 500)
+    limiter.release(500)
+    limiter.update(RateLimits(requests_per_minute=20, tokens_per_minute=2000))
+    assert round(limiter.tokens.tokens) == 1000 and limiter.tokens.capacity == 2000
+    assert round(limiter.requests.tokens) == 18
+    limiter.update(RateLimits(requests_per_minute=10, tokens_per_minute=1000))
+    assert round(limiter.tokens.tokens) == 500
+
+def test_check_stops_a_blocked_acquire():
+    limiter = ProviderLimiter(RateLimits(max_concurrency=1))
+    limiter.acquire("holder", 1)
+    cancelled = threading.Event()
+    errors = []
+
+    def check():
+        if cancelled.is_set():
+            raise RuntimeError("cancelled")
+
+    def call():
+        try:
+            limiter.acquire("run-1", 1, check)
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    while not limiter.snapshot()["waiting"]:
+        time.sleep(0.01)
+    cancelled.set()
+    thread.join(timeout=5)
+    assert not thread.is_alive() and len(errors) == 1
+    assert limiter.snapshot()["waiting"] == 0 and limiter.snapshot()["in_flight"] == 1
@@ -0,0 +1,19 @@
+import os
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_TYPE", "sqlite")
+
+from app.models import Execution
+from app.rollups import bucket_start, execution_duration
+
+def test_duration_excludes_time_spent_queued():
+    created = datetime(2026, 10, 1, 12)
+    execution = Execution(created_at=created, started_at=created + timedelta(minutes=5),
+                          completed_at=created + timedelta(minutes=5, seconds=30))
+    assert execution_duration(execution) == 30.0
+    assert execution_duration(Execution(created_at=created, completed_at=created + timedelta(minutes=1))) == 0.0
+
+def test_bucket_start():
+    value = datetime(2026, 10, 1, 12, 34, 56)
+    assert bucket_start(value, "hour") == datetime(2026, 10, 1, 12)
+    assert bucket_start(value, "day") == datetime(2026, 10, 1)
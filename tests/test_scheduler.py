@@ -0,0 +1,94 @@
+import asyncio
+
+from app.scheduler import ExecutionScheduler
+
+async def grant_order(scheduler: ExecutionScheduler, requests: list) -> list:
+    """Queue runs behind a full pool, then free it and return the order the runs start in"""
+    blockers = [await scheduler.acquire(0, priority="interactive") for _ in range(scheduler.max_concurrency)]
+    order = []
+
+    async def run(label, crew_id, owner, priority):
+        async with scheduler.slot(crew_id, owner, priority):
+            order.append(label)
+            await asyncio.sleep(0)
+
+    tasks = [asyncio.create_task(run(*request)) for request in requests]
+    await asyncio.sleep(0)
+    for blocker in blockers:
+        scheduler.release(blocker)
+    await asyncio.wait_for(asyncio.gather(*tasks), timeout=5)
+    return order
+
+def test_owners_share_a_lane_by_weight():
+    scheduler = ExecutionScheduler(max_concurrency=1, max_per_crew=0, interactive_reserved=0,
+                                   owner_weights={"a": 2, "b": 1})
+    requests = [(f"a{index}", index, "a", "normal") for index in range(4)]
+    requests += [(f"b{index}", 10 + index, "b", "normal") for index in range(2)]
+    order = asyncio.run(grant_order(scheduler, requests))
+    assert order == ["a0", "b0", "a1", "a2", "b1", "a3"]
+
+def test_lanes_are_served_in_priority_order():
+    scheduler = ExecutionScheduler(max_concurrency=1, max_per_crew=0, interactive_reserved=0)
+    requests = [("batch", 1, None, "batch"), ("normal", 2, None, "normal"), ("interactive", 3, None, "interactive")]
+    order = asyncio.run(grant_order(scheduler, requests))
+    assert order == ["interactive", "normal", "batch"]
+
+def test_crew_cap_lets_other_crews_through():
+    async def scenario():
+        scheduler = ExecutionScheduler(max_concurrency=3, max_per_crew=1, interactive_reserved=0)
+        first = await scheduler.acquire(1)
+        capped = asyncio.create_task(scheduler.acquire(1))
+        await asyncio.sleep(0)
+        other = await asyncio.wait_for(scheduler.acquire(2), timeout=1)
+        assert not capped.done()
+        assert scheduler.running_per_crew == {1: 1, 2: 1}
+
+        scheduler.release(first)
+        second = await asyncio.wait_for(capped, timeout=1)
+        assert scheduler.running_per_crew == {1: 1, 2: 1}
+        scheduler.release(second)
+        scheduler.release(other)
+        assert scheduler.running == 0
+
+    asyncio.run(scenario())
+
+def test_reserved_slots_are_kept_for_interactive_runs():
+    async def scenario():
+        scheduler = ExecutionScheduler(max_concurrency=3, max_per_crew=0, interactive_reserved=1)
+        normal = [await scheduler.acquire(index) for index in range(2)]
+        queued = asyncio.create_task(scheduler.acquire(5, priority="batch"))
+        await asyncio.sleep(0)
+        assert not queued.done()
+
+        interactive = await asyncio.wait_for(scheduler.acquire(9, priority="interactive"), timeout=1)
+        assert scheduler.running == 3
+
+        # The batch run starts once a normal slot is free, not when the reserved one is
+        scheduler.release(interactive)
+        await asyncio.sleep(0)
+        assert not queued.done()
+        scheduler.release(normal[0])
+        batch = await asyncio.wait_for(queued, timeout=1)
+        scheduler.release(batch)
+        scheduler.release(normal[1])
+        assert scheduler.running == 0
+
+    asyncio.run(scenario())
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def scenario():
+        scheduler = ExecutionScheduler(max_concurrency=1, max_per_crew=0, interactive_reserved=0)
+        holder = await scheduler.acquire(1)
+        cancelled = asyncio.create_task(scheduler.acquire(2))
+        waiting = asyncio.create_task(scheduler.acquire(3))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+
+        scheduler.release(holder)
+        waiter = await asyncio.wait_for(waiting, timeout=1)
+        assert waiter.crew_id == 3
+        assert scheduler.stats()["lanes"]["normal"]["queued_by_owner"] == {}
+        scheduler.release(waiter)
+
+    asyncio.run(scenario())
@@ -0,0 +1,50 @@
+import socket
+import threading
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from app.tools import web_search
+from app.tools.web_search import check_public_url, normalize_url
+
+def resolve_to(monkeypatch, *addresses):
+    def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET6 if ":" in address else socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))
+                for address in addresses]
+    monkeypatch.setattr(web_search, "CASSETTE_MODE", "off")
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+
+def test_normalize_url():
+    assert normalize_url("http://www.Example.com/docs/?utm_source=x&b=2&a=1#top") == "https://example.com/docs?a=1&b=2"
+    assert normalize_url("https://example.com/docs") == normalize_url("http://example.com/docs/?fbclid=abc")
+    assert normalize_url("https://example.com/a?page=2") != normalize_url("https://example.com/a?page=3")
+
+def test_public_addresses_are_allowed(monkeypatch):
+    resolve_to(monkeypatch, "93.184.216.34", "2606:2800:220:1:248:1893:25c8:1946")
+    check_public_url("https://example.com/page")
+
+@pytest.mark.parametrize("address", ["127.0.0.1", "10.0.0.5", "169.254.169.254", "192.168.1.1", "::1", "fd00::1", "224.0.0.1"])
+def test_internal_addresses_are_refused(monkeypatch, address):
+    resolve_to(monkeypatch, "93.184.216.34", address)
+    with pytest.raises(ValueError):
+        check_public_url("http://example.com/")
+
+@pytest.mark.parametrize("url", ["file:///etc/passwd", "ftp://example.com/", "http:///path", "gopher://example.com"])
+def test_non_http_urls_are_refused(url):
+    with pytest.raises(ValueError):
+        check_public_url(url)
+
+def test_page_from_an_address_that_changed_after_the_check_is_refused(monkeypatch):
+    # Stands in for a host that resolved to a public address when checked and a local one on connecting
+    server = HTTPServer(("127.0.0.1", 0), SimpleHTTPRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(web_search, "CASSETTE_MODE", "off")
+    monkeypatch.setattr(web_search, "check_public_url", lambda url: None)
+    try:
+        with pytest.raises(ValueError, match="non-public address 127.0.0.1 on connecting"):
+            web_search.open_page(f"http://127.0.0.1:{server.server_port}/")
+    finally:
+        server.shutdown()